@@ -0,0 +1,100 @@
+"""Time POST /analytics' in-memory work for users with many expenses.
+
+    python backend/bench/bench_analytics.py [--sizes 10000 50000 200000] [--months 12]
+
+Items are shaped like the userId-date-index query returns them (Decimal amounts, ISO
+dates), spread over the window with a few categories dominating and a handful of large
+one-off expenses. For each size it reports the column build (items -> arrays), the
+vectorized analyze() and, for reference, a plain-Python loop computing the same monthly
+totals, budget burn and z-scores one item at a time. DynamoDB paging is not included; at
+these sizes it is the larger cost (about 1 MB per page).
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda", "expenses-api-py"))
+
+import analytics  # noqa: E402
+
+AS_OF = date(2024, 5, 20)
+CATEGORIES = ["Food", "Travel", "Shopping", "Utilities", "Housing", "Healthcare", "Entertainment", "Education",
+              "Personal", "Investment", "Loans", "Insurance", "Gifts", "Pets", "Taxes", "Other"]
+BUDGETS = {"Food": 12000, "Travel": 6000, "Shopping": 8000, "Utilities": 4000, "Entertainment": 3000}
+
+
+def make_items(n, months, rng):
+    first, _ = analytics.window_bounds(AS_OF, months)
+    span = (AS_OF - first).days + 1
+    weights = [1 / (i + 1) for i in range(len(CATEGORIES))]
+    items = []
+    for i in range(n):
+        cat = rng.choices(CATEGORIES, weights)[0]
+        amount = rng.lognormvariate(5.5, 0.6) * (40 if rng.random() < 0.001 else 1)
+        items.append({
+            "expenseId": f"e{i}",
+            "date": (first + timedelta(days=rng.randrange(span))).isoformat(),
+            "category": cat,
+            "amount": Decimal(str(round(amount, 2))),
+            "rawText": f"{cat.lower()} {i}",
+        })
+    return items
+
+
+def python_baseline(items):
+    # What a client did after downloading the raw items
+    ym = AS_OF.strftime("%Y-%m")
+    totals, sums, sq, n, spent = {}, {}, {}, {}, {}
+    for it in items:
+        amt = float(it["amount"])
+        cat = it["category"]
+        key = (cat, it["date"][:7])
+        totals[key] = totals.get(key, 0.0) + amt
+        sums[cat] = sums.get(cat, 0.0) + amt
+        sq[cat] = sq.get(cat, 0.0) + amt * amt
+        n[cat] = n.get(cat, 0) + 1
+        if it["date"][:7] == ym:
+            spent[cat] = spent.get(cat, 0.0) + amt
+    std = {c: math.sqrt(max(sq[c] / n[c] - (sums[c] / n[c]) ** 2, 0.0)) for c in n}
+    outliers = [it for it in items
+                if std[it["category"]] and (float(it["amount"]) - sums[it["category"]] / n[it["category"]])
+                / std[it["category"]] >= analytics.DEFAULT_Z]
+    burn = {c: spent.get(c, 0.0) / AS_OF.day * 31 for c in BUDGETS}
+    return totals, outliers, burn
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--months", type=int, default=12)
+    args = parser.parse_args()
+    rng = random.Random(7)
+    print(f"{'expenses':>9} {'columns ms':>11} {'analyze ms':>11} {'total ms':>9} {'python loop ms':>15} "
+          f"{'outliers':>9} {'payload KB':>11}")
+    for size in args.sizes:
+        items = make_items(size, args.months, rng)
+        build_ms, cols = timed(lambda: analytics.Columns(items))
+        analyze_ms, result = timed(lambda: analytics.analyze(cols, AS_OF, args.months, BUDGETS))
+        loop_ms, _ = timed(lambda: python_baseline(items))
+        payload = len(json.dumps(result, separators=(",", ":"))) / 1024
+        print(f"{size:>9,} {build_ms:>11.1f} {analyze_ms:>11.1f} {build_ms + analyze_ms:>9.1f} {loop_ms:>15.1f} "
+              f"{len(result['outliers']):>9} {payload:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
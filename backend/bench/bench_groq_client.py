@@ -0,0 +1,76 @@
+"""Exercise GroqClient against the local stub: keep-alive vs one-connection-per-call urllib,
+then retry and circuit-breaker behaviour under injected 503s and stalls.
+
+    python backend/bench/bench_groq_client.py [--calls 200] [--latency-ms 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from urllib import request as urlrequest
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda", "expenses-api-py"))
+
+from groq_client import CircuitBreaker, GroqClient, UpstreamError  # noqa: E402
+from groq_stub import start_stub  # noqa: E402
+
+PATH = "/openai/v1/chat/completions"
+PAYLOAD = {"messages": [{"role": "user", "content": "coffee 120"}]}
+
+
+def timed(fn, calls):
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) / calls * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    _, config, url = start_stub(latency_ms=args.latency_ms)
+
+    def per_call():
+        req = urlrequest.Request(url + PATH, data=json.dumps(PAYLOAD).encode(), method="POST",
+                                 headers={"Content-Type": "application/json"})
+        with urlrequest.urlopen(req, timeout=10) as resp:
+            json.loads(resp.read())
+
+    client = GroqClient(url, read_timeout=2)
+    print(f"urlopen per call : {timed(per_call, args.calls):6.2f} ms/call")
+    print(f"pooled keep-alive: {timed(lambda: client.post_json(PATH, PAYLOAD), args.calls):6.2f} ms/call "
+          f"({client.stats['connects']} connection(s))")
+
+    # Upstream outage: retries with jitter, then the breaker opens and calls fail fast
+    config.error_rate = 1.0
+    client = GroqClient(url, read_timeout=2, backoff_base=0.01, breaker=CircuitBreaker(threshold=3, cooldown=1.0))
+    outcomes = []
+    t0 = time.perf_counter()
+    for _ in range(10):
+        try:
+            client.post_json(PATH, PAYLOAD)
+        except UpstreamError as e:
+            outcomes.append(e.reason)
+    print(f"503 outage       : {outcomes} in {(time.perf_counter() - t0) * 1000:.0f} ms, stats {client.stats}")
+
+    # Recovery: after the cooldown one half-open trial closes the circuit again
+    config.error_rate = 0.0
+    time.sleep(1.05)
+    client.post_json(PATH, PAYLOAD)
+    print(f"after cooldown   : breaker {client.breaker.state}")
+
+    # Stalled upstream: a read timeout is reported without retrying it
+    config.hang_rate = 1.0
+    t0 = time.perf_counter()
+    try:
+        client.post_json(PATH, PAYLOAD, read_timeout=0.2)
+    except UpstreamError as e:
+        print(f"stalled upstream : {e.reason} after {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""Load test for the expenses-api handler: seeded tables, stubbed Groq, concurrent replay.
+
+    python backend/bench/bench_load.py [--requests 2000] [--concurrency 8] [--json out.json]
+    python backend/bench/bench_load.py --mix "POST /add=5,POST /list=5" --groq-latency-ms 300
+    python backend/bench/bench_load.py --compare before.json --json after.json
+
+Tables (Expenses, CategoryRules, UserBudgets, ExpenseRollups, InvestApp) are created and
+seeded with users x months x expenses, learned rules, budgets and portfolios, either in
+process with moto (`--dynamodb moto`, needs `pip install moto`) or on DynamoDB Local
+(`--dynamodb local`, DYNAMODB_ENDPOINT_URL=http://localhost:8000). Groq calls go to
+groq_stub.py with the given latency. A weighted mix of API Gateway v2 events is replayed
+through index.handler on a thread pool; per-route latency percentiles, throughput and
+DynamoDB RCU/WCU (from the handler's EMF records) are reported as JSON with sorted keys,
+so two runs can be diffed. moto answers from Python in the same process, so absolute
+latencies are a CPU-bound floor; compare runs made on the same backend.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda", "expenses-api-py"))
+
+from groq_stub import start_stub  # noqa: E402
+
+TABLES = {
+    "Expenses": {
+        "keys": [("expenseId", "HASH")],
+        "attrs": ["expenseId", "userId", "date"],
+        "gsi": [("userId-date-index", "userId", "date")],
+    },
+    "CategoryRules": {"keys": [("rule", "HASH")], "attrs": ["rule"]},
+    "UserBudgets": {"keys": [("userId", "HASH")], "attrs": ["userId"]},
+    "ExpenseRollups": {"keys": [("userId", "HASH"), ("bucket", "RANGE")], "attrs": ["userId", "bucket"]},
+    "InvestApp": {
+        "keys": [("pk", "HASH"), ("sk", "RANGE")],
+        "attrs": ["pk", "sk", "GSI1PK", "GSI1SK"],
+        "gsi": [("GSI1", "GSI1PK", "GSI1SK")],
+    },
+}
+
+SYNONYM_TEXTS = ["coffee", "uber to office", "netflix", "groceries", "petrol", "electricity bill", "pharmacy"]
+RULE_WORDS = ["laptop", "repair", "dog", "food", "car", "wash", "gym", "school", "fees", "tax", "gift", "salon",
+              "insurance", "premium", "loan", "emi", "tea", "snacks", "rent", "water"]
+UNKNOWN_WORDS = ["zephyr", "quokka", "lumen", "brio", "kestrel", "nimbus", "orchid", "vortex", "tandem", "fjord"]
+CATEGORIES = ["Food", "Travel", "Shopping", "Utilities", "Housing", "Healthcare", "Entertainment", "Other"]
+CLASSES = ["Stocks", "Mutual Funds", "Debt", "Gold", "Liquid"]
+
+DEFAULT_MIX = {
+    "POST /add": 20, "PUT /add": 15, "POST /list": 20, "POST /summary/monthly": 10, "POST /summary/category": 5,
+    "GET /budgets": 5, "GET /portfolio": 5, "GET /holdings": 5, "GET /transactions": 5,
+    "GET /portfolio/{id}/dashboard": 10,
+}
+
+
+def parse_mix(spec):
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in spec.split(","):
+        route, _, weight = part.rpartition("=")
+        mix[route.strip()] = float(weight)
+    unknown = [r for r in mix if r not in DEFAULT_MIX]
+    if unknown:
+        raise SystemExit(f"Unknown routes in --mix: {unknown}; choose from {sorted(DEFAULT_MIX)}")
+    return mix
+
+
+def create_tables(dynamodb):
+    existing = set(dynamodb.meta.client.list_tables().get("TableNames", []))
+    for name, spec in TABLES.items():
+        if name in existing:
+            continue
+        params = {
+            "TableName": name,
+            "KeySchema": [{"AttributeName": a, "KeyType": k} for a, k in spec["keys"]],
+            "AttributeDefinitions": [{"AttributeName": a, "AttributeType": "S"} for a in spec["attrs"]],
+            "BillingMode": "PAY_PER_REQUEST",
+        }
+        if spec.get("gsi"):
+            params["GlobalSecondaryIndexes"] = [{
+                "IndexName": idx,
+                "KeySchema": [{"AttributeName": h, "KeyType": "HASH"}, {"AttributeName": r, "KeyType": "RANGE"}],
+                "Projection": {"ProjectionType": "ALL"},
+            } for idx, h, r in spec["gsi"]]
+        dynamodb.create_table(**params).wait_until_exists()
+
+
+def rule_term(rng):
+    return " ".join(rng.sample(RULE_WORDS, 2))
+
+
+def seed(dynamodb, args, rng):
+    """Write the synthetic dataset; returns the ids the event generators draw from."""
+    import rollups
+
+    users = [f"bench-user-{u}" for u in range(args.users)]
+    months = [f"2025-{m:02d}" for m in range(12 - args.months + 1, 13)]
+    with dynamodb.Table("CategoryRules").batch_writer() as batch:
+        for _ in range(args.rules):
+            batch.put_item(Item={"rule": rule_term(rng), "category": rng.choice(CATEGORIES)})
+    expenses = dynamodb.Table("Expenses")
+    for user in users:
+        items = []
+        for month in months:
+            for i in range(args.expenses):
+                text = rng.choice(SYNONYM_TEXTS) if rng.random() < 0.5 else rule_term(rng)
+                items.append({
+                    "expenseId": f"{user}-{month}-{i}", "userId": user, "date": f"{month}-{rng.randint(1, 28):02d}",
+                    "amount": Decimal(rng.randint(50, 5000)), "category": rng.choice(CATEGORIES), "rawText": text,
+                    "createdAt": f"{month}-01T00:00:00",
+                })
+        with expenses.batch_writer() as batch:
+            for it in items:
+                batch.put_item(Item=it)
+        rollups.record_many(dynamodb.Table("ExpenseRollups"), items)
+        dynamodb.Table("UserBudgets").put_item(Item={
+            "userId": user, "budgets": {c: Decimal(rng.randint(2, 20) * 1000) for c in CATEGORIES},
+        })
+    portfolios = []
+    invest = dynamodb.Table("InvestApp")
+    with invest.batch_writer() as batch:
+        for user in users:
+            for p in range(args.portfolios):
+                pid = f"{user}-p{p}"
+                pk = f"USER#{user}"
+                portfolios.append((user, pid))
+                batch.put_item(Item={"pk": pk, "sk": f"PORTFOLIO#{pid}", "entityType": "PORTFOLIO", "name": f"P{p}",
+                                     "createdAt": "2025-01-01T00:00:00", "GSI1PK": f"PORTFOLIO#{pid}",
+                                     "GSI1SK": "2025-01-01T00:00:00"})
+                batch.put_item(Item={"pk": pk, "sk": f"ALLOCATION#{pid}", "entityType": "ALLOCATION",
+                                     "plan": {"buckets": [{"class": c, "pct": 20} for c in CLASSES]},
+                                     "GSI1PK": f"PORTFOLIO#{pid}", "GSI1SK": "ALLOCATION#2025-01-01T00:00:00"})
+                for h in range(args.holdings):
+                    units = Decimal(rng.randint(1, 200))
+                    price = Decimal(rng.randint(10, 3000))
+                    batch.put_item(Item={
+                        "pk": pk, "sk": f"HOLDING#{pid}#h{h}", "entityType": "HOLDING", "portfolioId": pid,
+                        "holdingId": f"h{h}", "GSI1PK": f"PORTFOLIO#{pid}", "GSI1SK": f"HOLDING#h{h}",
+                        "data": {"instrumentClass": rng.choice(CLASSES), "name": f"Holding {h}", "units": units,
+                                 "price": price, "investedAmount": units * price},
+                    })
+                for t in range(args.transactions):
+                    date = f"{rng.choice(months)}-{rng.randint(1, 28):02d}"
+                    batch.put_item(Item={
+                        "pk": pk, "sk": f"TRANSACTION#{pid}#{date}#t{t}", "entityType": "TRANSACTION",
+                        "portfolioId": pid, "transactionId": f"t{t}", "GSI1PK": f"PORTFOLIO#{pid}",
+                        "GSI1SK": f"TRANSACTION#{date}#t{t}",
+                        "data": {"type": "buy", "date": date, "amount": Decimal(rng.randint(100, 10000))},
+                    })
+    return {"users": users, "months": months, "portfolios": portfolios}
+
+
+def _event(route, body=None, qs=None, sub=None, params=None):
+    method = route.split()[0]
+    ctx = {"routeKey": route, "http": {"method": method}}
+    if sub:
+        ctx["authorizer"] = {"jwt": {"claims": {"sub": sub}}}
+    return {"requestContext": ctx, "rawPath": route.split()[1], "headers": {},
+            "body": json.dumps(body) if body is not None else None,
+            "queryStringParameters": qs, "pathParameters": params}
+
+
+def make_event(route, data, rng):
+    user = rng.choice(data["users"])
+    month = rng.choice(data["months"])
+    sub, pid = rng.choice(data["portfolios"]) if data["portfolios"] else (user, "none")
+    if route == "POST /add":
+        roll = rng.random()
+        text = rng.choice(SYNONYM_TEXTS) if roll < 0.4 else rule_term(rng) if roll < 0.8 else \
+            " ".join(rng.sample(UNKNOWN_WORDS, 2))
+        return _event(route, {"userId": user, "rawText": f"{text} {rng.randint(50, 900)}"})
+    if route == "PUT /add":
+        return _event(route, {"userId": user, "rawText": rule_term(rng), "category": rng.choice(CATEGORIES),
+                              "amount": rng.randint(50, 5000), "date": f"{month}-{rng.randint(1, 28):02d}"})
+    if route == "POST /list":
+        return _event(route, {"userId": user, "start": f"{month}-01", "end": f"{month}-31", "limit": 50})
+    if route == "POST /summary/monthly":
+        return _event(route, {"userId": user, "month": month})
+    if route == "POST /summary/category":
+        return _event(route, {"userId": user, "category": rng.choice(CATEGORIES), "limit": 20})
+    if route == "GET /budgets":
+        return _event(route, qs={"userId": user})
+    if route == "GET /portfolio":
+        return _event(route, sub=sub)
+    if route == "GET /holdings":
+        return _event(route, qs={"portfolioId": pid, "limit": "50"}, sub=sub)
+    if route == "GET /transactions":
+        return _event(route, qs={"portfolioId": pid, "start": month, "end": month}, sub=sub)
+    if route == "GET /portfolio/{id}/dashboard":
+        return _event(route, qs={"recent": "20"}, sub=sub, params={"id": pid})
+    raise ValueError(route)
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank, so small samples report an observed value
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def summarize(records, wall_s):
+    by_route = {}
+    for rec in records:
+        by_route.setdefault(rec["Route"], []).append(rec)
+    routes = {}
+    for route, recs in sorted(by_route.items()):
+        lat = sorted(r["Latency"] for r in recs)
+        n = len(recs)
+        rcu = sum(r["ReadCapacityUnits"] for r in recs)
+        wcu = sum(r["WriteCapacityUnits"] for r in recs)
+        routes[route] = {
+            "requests": n,
+            "errors": sum(1 for r in recs if r["Status"] >= 500),
+            "status": {str(s): sum(1 for r in recs if r["Status"] == s) for s in sorted({r["Status"] for r in recs})},
+            "p50Ms": round(percentile(lat, 50), 2),
+            "p95Ms": round(percentile(lat, 95), 2),
+            "p99Ms": round(percentile(lat, 99), 2),
+            "meanMs": round(sum(lat) / n, 2),
+            "dynamoDbMsMean": round(sum(r["DynamoDBTime"] for r in recs) / n, 2),
+            "dynamoDbCallsMean": round(sum(r["DynamoDBCalls"] for r in recs) / n, 2),
+            "groqMsMean": round(sum(r["GroqTime"] for r in recs) / n, 2),
+            "rcuPerRequest": round(rcu / n, 3),
+            "wcuPerRequest": round(wcu / n, 3),
+            "rcuTotal": round(rcu, 2),
+            "wcuTotal": round(wcu, 2),
+        }
+    lat = sorted(r["Latency"] for r in records)
+    return {
+        "routes": routes,
+        "overall": {
+            "requests": len(records),
+            "seconds": round(wall_s, 3),
+            "throughputRps": round(len(records) / wall_s, 1) if wall_s else None,
+            "p50Ms": round(percentile(lat, 50), 2) if lat else None,
+            "p95Ms": round(percentile(lat, 95), 2) if lat else None,
+            "p99Ms": round(percentile(lat, 99), 2) if lat else None,
+            "rcuTotal": round(sum(r["ReadCapacityUnits"] for r in records), 2),
+            "wcuTotal": round(sum(r["WriteCapacityUnits"] for r in records), 2),
+        },
+    }
+
+
+def compare(before, after):
+    """Print per-route deltas of the headline numbers between two reports."""
+    keys = ["p50Ms", "p95Ms", "p99Ms", "rcuPerRequest", "wcuPerRequest"]
+    print(f"{'route':32}" + "".join(f"{k:>26}" for k in keys))
+    for route in sorted(set(before["routes"]) | set(after["routes"])):
+        b, a = before["routes"].get(route, {}), after["routes"].get(route, {})
+        cells = []
+        for k in keys:
+            if k in a and k in b:
+                delta = a[k] - b[k]
+                pct = f" ({delta / b[k] * 100:+.0f}%)" if b[k] else ""
+                cells.append(f"{b[k]} -> {a[k]}{pct}")
+            else:
+                cells.append("n/a")
+        print(f"{route:32}" + "".join(f"{c:>26}" for c in cells))
+    b, a = before["overall"]["throughputRps"], after["overall"]["throughputRps"]
+    print(f"throughput {b} -> {a} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dynamodb", choices=["moto", "local"], default="moto")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--months", type=int, default=6, choices=range(1, 13), metavar="1-12")
+    parser.add_argument("--expenses", type=int, default=30, help="expenses per user per month")
+    parser.add_argument("--rules", type=int, default=2000, help="learned CategoryRules items")
+    parser.add_argument("--portfolios", type=int, default=1, help="portfolios per user")
+    parser.add_argument("--holdings", type=int, default=20, help="holdings per portfolio")
+    parser.add_argument("--transactions", type=int, default=50, help="transactions per portfolio")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100, help="requests replayed before measuring")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mix", help='weights, e.g. "POST /add=5,POST /list=3" (default: a mixed workload)')
+    parser.add_argument("--groq-latency-ms", type=float, default=150.0)
+    parser.add_argument("--groq-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write the report here (stdout otherwise)")
+    parser.add_argument("--compare", help="earlier report to diff against")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+
+    _, groq, groq_url = start_stub(latency_ms=args.groq_latency_ms, jitter_ms=args.groq_jitter_ms)
+    # index reads its configuration at import time
+    os.environ.update({
+        "GROQ_BASE_URL": groq_url, "GROQ_API_KEY": "stub", "AI_CACHE_TABLE": "", "METRICS_ENABLED": "0",
+        "AWS_DEFAULT_REGION": os.environ.get("AWS_DEFAULT_REGION", "us-east-1"),
+    })
+    if args.dynamodb == "moto":
+        try:
+            from moto import mock_aws
+        except ImportError:
+            raise SystemExit("--dynamodb moto needs `pip install moto`; or run DynamoDB Local with --dynamodb local")
+        os.environ.pop("DYNAMODB_ENDPOINT_URL", None)
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+        mock_aws().start()
+    elif not os.environ.get("DYNAMODB_ENDPOINT_URL"):
+        raise SystemExit("--dynamodb local needs DYNAMODB_ENDPOINT_URL (e.g. http://localhost:8000)")
+
+    import index
+    import metrics
+
+    t0 = time.perf_counter()
+    create_tables(index._ddb())
+    data = seed(index._ddb(), args, rng)
+    seed_s = time.perf_counter() - t0
+
+    records = []
+    lock = threading.Lock()
+    end = metrics.end
+
+    def capture(status):
+        record = end(status)
+        if record is not None:
+            with lock:
+                records.append(record)
+        return record
+
+    metrics.end = capture
+    routes, weights = list(mix), list(mix.values())
+    warmup = [make_event(r, data, rng) for r in rng.choices(routes, weights, k=args.warmup)]
+    events = [make_event(r, data, rng) for r in rng.choices(routes, weights, k=args.requests)]
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda e: index.handler(e, None), warmup))
+        records.clear()
+        groq_before = groq.requests
+        t0 = time.perf_counter()
+        list(pool.map(lambda e: index.handler(e, None), events))
+        wall_s = time.perf_counter() - t0
+    metrics.end = end
+
+    report = summarize(records, wall_s)
+    report["config"] = {
+        "dynamodb": args.dynamodb, "users": args.users, "months": args.months, "expensesPerUserMonth": args.expenses,
+        "rules": args.rules, "portfolios": args.portfolios, "holdings": args.holdings,
+        "transactions": args.transactions, "requests": args.requests, "concurrency": args.concurrency,
+        "groqLatencyMs": args.groq_latency_ms, "mix": mix, "seed": args.seed,
+    }
+    report["overall"]["groqRequests"] = groq.requests - groq_before
+    report["overall"]["seedSeconds"] = round(seed_s, 2)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            compare(json.load(fh), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compare CategoryRules fuzzy matching: the old linear substring scan vs RuleIndex.
+
+    python backend/bench/bench_rule_index.py [--sizes 10000 100000 1000000] [--queries 2000]
+
+The scan baseline runs over an in-memory list, so it measures only the matching loop
+(the old path also paid a DynamoDB Scan of the whole table on every miss).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda", "expenses-api-py"))
+
+from rule_index import RuleIndex  # noqa: E402
+
+WORDS = [
+    "laptop", "repair", "dog", "food", "cat", "grooming", "car", "wash", "phone", "recharge", "gym",
+    "membership", "school", "fees", "movie", "ticket", "electric", "bill", "water", "tax", "gift",
+    "coffee", "tea", "snacks", "rent", "insurance", "premium", "loan", "emi", "salon", "spa",
+]
+CATEGORIES = ["Food", "Travel", "Shopping", "Utilities", "Housing", "Healthcare", "Other"]
+
+
+def make_vocab(n, rng):
+    # Common spend words plus a long tail of merchant-like tokens, as learned rules look
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    tail = {"".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(max(1000, n // 20))}
+    return WORDS + sorted(tail)
+
+
+def make_rules(n, rng):
+    vocab = make_vocab(n, rng)
+    rules = {}
+    while len(rules) < n:
+        # Zipf-ish: half the words come from the common head
+        words = [rng.choice(WORDS) if rng.random() < 0.5 else rng.choice(vocab) for _ in range(rng.randint(2, 3))]
+        rules[" ".join(dict.fromkeys(words))] = rng.choice(CATEGORIES)
+    return list(rules.items())
+
+
+def scan_lookup(rules, term):
+    w = term.split()
+    for rule, category in rules:
+        if w[0] in rule and w[1] in rule:
+            return category
+    return None
+
+
+def bench(n, queries, rng):
+    rules = make_rules(n, rng)
+    # Half hits with reversed word order, half misses (the scan's worst case: it reads every rule)
+    sample = [rng.choice(rules)[0].split() for _ in range(queries)]
+    terms = [
+        " ".join(reversed(w[:2])) if i % 2 == 0 or len(w) < 2 else f"{w[0]} zzmiss{i}"
+        for i, w in enumerate(sample)
+    ]
+
+    t0 = time.perf_counter()
+    idx = RuleIndex(rules)
+    build_s = time.perf_counter() - t0
+
+    scan_terms = terms[: max(10, queries // 50)]  # the scan is slow; sample fewer queries
+    t0 = time.perf_counter()
+    for t in scan_terms:
+        scan_lookup(rules, t)
+    scan_us = (time.perf_counter() - t0) / len(scan_terms) * 1e6
+
+    t0 = time.perf_counter()
+    for t in terms:
+        idx.lookup(t)
+    idx_us = (time.perf_counter() - t0) / len(terms) * 1e6
+    print(f"{n:>9,} rules  build {build_s:7.2f}s  scan {scan_us:12.1f} us/q  index {idx_us:8.1f} us/q  "
+          f"speedup {scan_us / idx_us:8.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    for n in args.sizes:
+        bench(n, args.queries, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Cold-start benchmark for the expenses-api Lambda: module import time and first-invocation
+latency per route, each measured in a fresh interpreter (what a new container pays).
+
+    python backend/bench/bench_startup.py [--runs 5] [--json out.json]
+
+Routes that touch DynamoDB need a reachable endpoint: real AWS credentials, or DynamoDB
+Local via DYNAMODB_ENDPOINT_URL=http://localhost:8000 (plus dummy AWS_ACCESS_KEY_ID /
+AWS_SECRET_ACCESS_KEY). Their status code is reported alongside the timings either way.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+LAMBDA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "lambda", "expenses-api-py"))
+
+JWT = {"authorizer": {"jwt": {"claims": {"sub": "bench-user"}}}}
+EVENTS = {
+    "OPTIONS": {"requestContext": {"http": {"method": "OPTIONS"}}, "rawPath": "/add"},
+    "POST /add (synonym)": {"requestContext": {"routeKey": "POST /add", "http": {"method": "POST"}},
+                            "body": json.dumps({"userId": "bench", "rawText": "coffee 120"})},
+    "PUT /add": {"requestContext": {"routeKey": "PUT /add", "http": {"method": "PUT"}},
+                 "body": json.dumps({"userId": "bench", "rawText": "coffee 120", "category": "Food", "amount": 120})},
+    "POST /list": {"requestContext": {"routeKey": "POST /list", "http": {"method": "POST"}},
+                   "body": json.dumps({"userId": "bench", "limit": 50})},
+    "POST /summary/monthly": {"requestContext": {"routeKey": "POST /summary/monthly", "http": {"method": "POST"}},
+                              "body": json.dumps({"userId": "bench"})},
+    "GET /budgets": {"requestContext": {"routeKey": "GET /budgets", "http": {"method": "GET"}},
+                     "queryStringParameters": {"userId": "bench"}},
+    "GET /portfolio": {"requestContext": {"routeKey": "GET /portfolio", "http": {"method": "GET"}, **JWT}},
+}
+
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import index
+t1 = time.perf_counter()
+res = index.handler(json.loads(sys.argv[1]), None)
+t2 = time.perf_counter()
+res2 = index.handler(json.loads(sys.argv[1]), None)
+t3 = time.perf_counter()
+print(json.dumps({"importMs": (t1 - t0) * 1000, "firstMs": (t2 - t1) * 1000, "warmMs": (t3 - t2) * 1000,
+                  "status": res.get("statusCode"), "modules": len(sys.modules)}))
+"""
+
+
+def probe(event):
+    out = subprocess.run([sys.executable, "-c", PROBE, json.dumps(event)], cwd=LAMBDA_DIR,
+                         capture_output=True, text=True, timeout=120)
+    lines = [l for l in out.stdout.splitlines() if l.startswith("{")]
+    if out.returncode != 0 or not lines:
+        return {"error": (out.stderr.strip().splitlines() or ["failed"])[-1]}
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per route (median reported)")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+    results = {}
+    for name, event in EVENTS.items():
+        samples = [probe(event) for _ in range(args.runs)]
+        ok = [s for s in samples if "error" not in s]
+        if not ok:
+            results[name] = {"error": samples[0]["error"]}
+            print(f"{name:<24} error: {samples[0]['error']}")
+            continue
+        row = {k: round(statistics.median(s[k] for s in ok), 2) for k in ("importMs", "firstMs", "warmMs")}
+        row.update(status=ok[-1]["status"], modules=ok[-1]["modules"])
+        results[name] = row
+        print(f"{name:<24} import {row['importMs']:7.1f} ms  first call {row['firstMs']:7.1f} ms  "
+              f"warm {row['warmMs']:6.1f} ms  status {row['status']}  modules {row['modules']}")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Compare synonym matching: the old per-key substring loop vs the compiled KeywordMatcher.
+
+    python backend/bench/bench_synonyms.py [--merchants 0 1000 5000] [--texts 20000]
+
+Keyword and category data come from index.SYNONYMS, read from the source without
+importing index (so boto3 is not needed here).
+"""
+import argparse
+import ast
+import os
+import random
+import sys
+import time
+
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), "..", "lambda", "expenses-api-py")
+sys.path.insert(0, LAMBDA_DIR)
+
+from keyword_matcher import KeywordMatcher  # noqa: E402
+
+
+def load_synonyms():
+    with open(os.path.join(LAMBDA_DIR, "index.py"), encoding="utf-8") as fh:
+        tree = ast.parse(fh.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], "id", None) == "SYNONYMS":
+            return ast.literal_eval(node.value)
+    raise SystemExit("SYNONYMS not found in index.py")
+
+
+def old_match(synonyms, raw_text):
+    lower = raw_text.lower()
+    k = next((k for k in synonyms.keys() if k in lower), None)
+    return synonyms.get(k) if k else None
+
+
+def make_texts(keywords, n, rng):
+    fillers = ["paid", "for", "spent", "on", "today", "yesterday", "at", "the", "cash", "upi"]
+    out = []
+    for i in range(n):
+        words = rng.sample(fillers, 3)
+        if i % 3:
+            words.insert(rng.randint(0, 3), rng.choice(keywords))
+        out.append(f"{rng.randint(10, 5000)} " + " ".join(words))
+    return out
+
+
+def bench(synonyms, texts):
+    t0 = time.perf_counter()
+    matcher = KeywordMatcher(synonyms)
+    build_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    for t in texts:
+        old_match(synonyms, t)
+    old_us = (time.perf_counter() - t0) / len(texts) * 1e6
+
+    t0 = time.perf_counter()
+    for t in texts:
+        matcher.match(t)
+    new_us = (time.perf_counter() - t0) / len(texts) * 1e6
+    print(f"{len(synonyms):>6} keywords  build {build_ms:7.1f} ms  loop {old_us:8.2f} us/text  "
+          f"matcher {new_us:6.2f} us/text  speedup {old_us / new_us:6.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--merchants", type=int, nargs="+", default=[0, 1000, 5000])
+    parser.add_argument("--texts", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    base = load_synonyms()
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    for extra in args.merchants:
+        synonyms = dict(base)
+        while len(synonyms) < len(base) + extra:
+            synonyms["".join(rng.choice(letters) for _ in range(rng.randint(4, 10)))] = "Shopping"
+        # The old loop was also paying to rebuild this dict literal per request; not counted here
+        bench(synonyms, make_texts(list(synonyms), args.texts, rng))
+
+
+if __name__ == "__main__":
+    main()
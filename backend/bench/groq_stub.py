@@ -0,0 +1,111 @@
+"""Local stand-in for the Groq chat-completions endpoint with injectable latency and errors.
+
+    python backend/bench/groq_stub.py --port 8787 --latency-ms 300 --error-rate 0.2
+    GROQ_BASE_URL=http://127.0.0.1:8787 GROQ_API_KEY=stub python ...
+
+Speaks HTTP/1.1 keep-alive like the real API, answers single prompts with
+{"category", "confidence"} and batch prompts (a JSON array of {"id", "text"}) with an
+array, guessing the category from a few keywords.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+KEYWORDS = {
+    "coffee": "Food", "lunch": "Food", "dinner": "Food", "grocer": "Food", "cab": "Travel", "fuel": "Travel",
+    "rent": "Housing", "doctor": "Healthcare", "medicine": "Healthcare", "netflix": "Subscription",
+    "shirt": "Shopping", "movie": "Entertainment", "salon": "Grooming", "vet": "Pet Care", "tax": "Taxes",
+    "fees": "Education", "emi": "Loans", "insurance": "Insurance", "sip": "Investment", "gift": "Gifts",
+}
+
+
+def guess(text):
+    lower = str(text).lower()
+    return next((c for k, c in KEYWORDS.items() if k in lower), "Other")
+
+
+class StubConfig:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=503, hang_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.hang_rate = hang_rate  # fraction of requests that stall for 30 s (exercise read timeouts)
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            req = json.loads(self.rfile.read(length) or b"{}")
+            with config.lock:
+                config.requests += 1
+            delay = config.latency_ms + random.uniform(0, config.jitter_ms)
+            if config.hang_rate and random.random() < config.hang_rate:
+                delay = 30_000
+            time.sleep(delay / 1000.0)
+            if config.error_rate and random.random() < config.error_rate:
+                return self._send(config.error_status, {"error": {"message": "injected failure"}})
+            user = next((m["content"] for m in req.get("messages", []) if m.get("role") == "user"), "")
+            try:
+                batch = json.loads(user)
+            except ValueError:
+                batch = None
+            if isinstance(batch, list):
+                content = json.dumps([{"id": b.get("id"), "category": guess(b.get("text")), "confidence": 0.8}
+                                      for b in batch])
+            else:
+                content = json.dumps({"category": guess(user), "confidence": 0.8})
+            self._send(200, {"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+    return Handler
+
+
+def start_stub(port=0, **config_kwargs):
+    """Start the stub on a daemon thread; returns (server, config, base_url)."""
+    config = StubConfig(**config_kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, config, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server, _, url = start_stub(args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                error_rate=args.error_rate, error_status=args.error_status, hang_rate=args.hang_rate)
+    print("Groq stub listening on", url)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
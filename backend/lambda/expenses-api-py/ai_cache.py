@@ -0,0 +1,187 @@
+"""Two-tier cache for AI categorization results.
+
+Tier 1 is an in-process LRU with a TTL and size bound (per warm container). Tier 2 is a
+DynamoDB table shared by all containers, keyed by a hash of the normalized term, whose
+items expire through DynamoDB TTL on `expiresAt`. Failed upstream calls are cached
+negatively in tier 1 only, for a short TTL, so a Groq outage costs one timeout per term
+per container rather than one per request.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+
+class LRUCache:
+    def __init__(self, maxsize=2048, ttl=3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._data)
+
+
+def term_hash(term: str) -> str:
+    normalized = " ".join(str(term or "").lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class CategorizationCache:
+    def __init__(self, table_getter, maxsize=2048, ttl=3600.0, shared_ttl=30 * 86400, negative_ttl=60.0):
+        self._table_getter = table_getter
+        self.local = LRUCache(maxsize, ttl)
+        self.shared_ttl = shared_ttl
+        self.negative_ttl = negative_ttl
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.shared_errors = 0
+        self.negative_hits = 0
+        self.upstream_calls = 0
+
+    def record_upstream_call(self):
+        self.upstream_calls += 1
+
+    def get(self, term: str):
+        """Return a cached {"category", "confidence", "model", "cachedAt"} dict, a
+        {"negative": True} marker for a recent upstream failure, or None."""
+        key = term_hash(term)
+        hit = self.local.get(key)
+        if hit is not None:
+            if hit.get("negative"):
+                self.negative_hits += 1
+            return hit
+        table = self._table_getter()
+        if table is None:
+            return None
+        try:
+            item = table.get_item(Key={"termHash": key}).get("Item")
+        except Exception as e:
+            self.shared_errors += 1
+            print("AI_CACHE_SHARED_GET_ERROR", str(e))
+            return None
+        return self._shared_value(key, item, int(time.time()))
+
+    def get_many(self, terms):
+        """get() for many terms: {term: value or None}. Local misses are looked up in the
+        shared table 100 keys per BatchGetItem rather than one GetItem each."""
+        out, by_key = {}, {}
+        for term in terms:
+            key = term_hash(term)
+            hit = self.local.get(key)
+            if hit is not None:
+                if hit.get("negative"):
+                    self.negative_hits += 1
+                out[term] = hit
+            else:
+                out[term] = None
+                by_key.setdefault(key, []).append(term)
+        table = self._table_getter() if by_key else None
+        if table is None:
+            return out
+        keys, now = list(by_key), int(time.time())
+        for i in range(0, len(keys), 100):
+            request = {table.name: {"Keys": [{"termHash": k} for k in keys[i:i + 100]]}}
+            found = {}
+            try:
+                for attempt in range(5):
+                    res = table.meta.client.batch_get_item(RequestItems=request)
+                    for item in res.get("Responses", {}).get(table.name, []):
+                        found[item["termHash"]] = item
+                    request = res.get("UnprocessedKeys") or None
+                    if not request:
+                        break
+                    time.sleep(0.05 * (2 ** attempt))
+            except Exception as e:
+                self.shared_errors += 1
+                print("AI_CACHE_SHARED_GET_ERROR", str(e))
+                continue
+            for key in keys[i:i + 100]:
+                value = self._shared_value(key, found.get(key), now)
+                for term in by_key[key]:
+                    out[term] = value
+        return out
+
+    def _shared_value(self, key, item, now):
+        if not item or int(item.get("expiresAt", 0)) <= now:
+            self.shared_misses += 1
+            return None
+        self.shared_hits += 1
+        value = {
+            "category": item.get("category", ""),
+            "confidence": float(item.get("confidence", 0)),
+            "model": item.get("model"),
+            "cachedAt": item.get("cachedAt"),
+        }
+        self.local.put(key, value)
+        return value
+
+    def put(self, term: str, category: str, confidence, model: str):
+        key = term_hash(term)
+        now = int(time.time())
+        value = {"category": category, "confidence": float(confidence or 0), "model": model, "cachedAt": now}
+        self.local.put(key, value)
+        table = self._table_getter()
+        if table is None:
+            return
+        try:
+            table.put_item(Item={
+                "termHash": key,
+                "term": " ".join(str(term).lower().split())[:200],
+                "category": category,
+                "confidence": Decimal(str(value["confidence"])),
+                "model": model,
+                "cachedAt": now,
+                "expiresAt": now + int(self.shared_ttl),
+            })
+        except Exception as e:
+            self.shared_errors += 1
+            print("AI_CACHE_SHARED_PUT_ERROR", str(e))
+
+    def put_negative(self, term: str, reason: str):
+        self.local.put(term_hash(term), {"negative": True, "reason": reason}, ttl=self.negative_ttl)
+
+    def stats(self):
+        return {
+            "localHits": self.local.hits,
+            "localMisses": self.local.misses,
+            "localEvictions": self.local.evictions,
+            "localExpirations": self.local.expirations,
+            "localSize": len(self.local),
+            "sharedHits": self.shared_hits,
+            "sharedMisses": self.shared_misses,
+            "sharedErrors": self.shared_errors,
+            "negativeHits": self.negative_hits,
+            "upstreamCalls": self.upstream_calls,
+        }
@@ -0,0 +1,236 @@
+"""Spending analytics over a window of months of one user's expenses (POST /analytics).
+
+Expense items become four columns (day, month index, category code, amount) and every
+figure is an array operation over them:
+
+  totals[c, m]    spend per category and month (bincount on c * months + m)
+  rolling[c, m]   mean of the last `window` months (fewer at the start of the range)
+  slope[c]        least-squares trend per month over the completed months
+  burn            month-to-date spend per category vs its budget: daily rate, projected
+                  month total and the day cumulative spend crosses (or is projected to
+                  cross) the budget
+  outliers        expenses whose amount is `z_threshold` standard deviations above their
+                  category's mean over the window (categories with MIN_SAMPLES or more)
+
+Budgets are the UserBudgets item: `budgets` (PUT /budgets) or the web app's
+`defaultBudgets` with per-month `overrides`.
+"""
+import calendar
+from datetime import date
+
+import numpy as np
+
+DEFAULT_MONTHS = 6
+MAX_MONTHS = 24
+DEFAULT_WINDOW = 3
+DEFAULT_Z = 3.0
+MIN_SAMPLES = 5       # per category, before z-scores mean anything
+MAX_OUTLIERS = 50
+
+
+def month_start(d, back=0):
+    idx = d.year * 12 + d.month - 1 - back
+    return date(idx // 12, idx % 12 + 1, 1)
+
+
+def window_bounds(as_of, months):
+    """(first day, last day) of the `months` calendar months ending with as_of's month."""
+    last = calendar.monthrange(as_of.year, as_of.month)[1]
+    return month_start(as_of, months - 1), date(as_of.year, as_of.month, last)
+
+
+def budgets_for(item, month):
+    """Effective {category: amount} of a UserBudgets item for YYYY-MM."""
+    item = item or {}
+    base = item.get("budgets") or item.get("defaultBudgets") or {}
+    merged = {**base, **((item.get("overrides") or {}).get(month) or {})}
+    out = {}
+    for k, v in merged.items():
+        try:
+            amount = float(v)
+        except (TypeError, ValueError):
+            continue
+        if amount > 0:
+            out[k] = amount
+    return out
+
+
+def _to_day(value):
+    try:
+        return np.datetime64(value, "D")
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+class Columns:
+    """Expense items as parallel arrays; categories are codes into `names`."""
+
+    __slots__ = ("day", "category", "amount", "names", "ids", "texts")
+
+    def __init__(self, items):
+        items = items if isinstance(items, list) else list(items)
+        days = [str(it.get("date") or "")[:10] for it in items]
+        try:
+            self.day = np.array(days, dtype="datetime64[D]")
+        except ValueError:
+            # A hand-entered date that is not YYYY-MM-DD: drop that row (NaT) rather than the request
+            self.day = np.array([_to_day(d) for d in days], dtype="datetime64[D]")
+        self.amount = np.array([it.get("amount") or 0 for it in items], dtype=float)
+        codes = {}
+        self.category = np.array([codes.setdefault(it.get("category") or "Other", len(codes)) for it in items],
+                                 dtype=np.int64)
+        self.names = np.array(list(codes), dtype=object)
+        self.ids = [it.get("expenseId") for it in items]
+        self.texts = [it.get("rawText") for it in items]
+
+    def __len__(self):
+        return self.amount.size
+
+
+def _rolling_mean(x, window):
+    # Trailing mean along the last axis; the first window-1 columns average what exists
+    csum = np.cumsum(x, axis=-1)
+    out = csum.copy()
+    out[..., window:] = csum[..., window:] - csum[..., :-window]
+    n = np.minimum(np.arange(1, x.shape[-1] + 1), window)
+    return out / n
+
+
+def _slope(y):
+    # Least-squares slope of each row against 0..n-1
+    n = y.shape[-1]
+    if n < 2:
+        return np.zeros(y.shape[0])
+    x = np.arange(n) - (n - 1) / 2
+    return (y * x).sum(axis=-1) / (x * x).sum()
+
+
+def _r(a, nd=2):
+    return np.round(a, nd).tolist()
+
+
+def analyze(cols, as_of, months=DEFAULT_MONTHS, budgets=None, window=DEFAULT_WINDOW, z_threshold=DEFAULT_Z):
+    first, last = window_bounds(as_of, months)
+    month_labels = [month_start(as_of, months - 1 - i).strftime("%Y-%m") for i in range(months)]
+    in_window = (cols.day >= np.datetime64(first)) & (cols.day <= np.datetime64(as_of))
+    day, amount, cat = cols.day[in_window], cols.amount[in_window], cols.category[in_window]
+    rows = np.flatnonzero(in_window)
+    m_idx = day.astype("datetime64[M]").astype(np.int64) - np.datetime64(first, "M").astype(np.int64)
+
+    # Categories seen in the window, largest spend first
+    n_all = len(cols.names)
+    spend = np.bincount(cat, weights=amount, minlength=n_all)
+    present = np.flatnonzero(np.bincount(cat, minlength=n_all) > 0)
+    order = present[np.argsort(-spend[present], kind="stable")]
+    n_c = order.size
+    rank = np.zeros(n_all, dtype=np.int64)
+    rank[order] = np.arange(n_c)
+    cat = rank[cat]
+    names = [str(n) for n in cols.names[order]]
+
+    flat = cat * months + m_idx
+    totals = np.bincount(flat, weights=amount, minlength=n_c * months).reshape(n_c, months)
+    counts = np.bincount(flat, minlength=n_c * months).reshape(n_c, months)
+
+    # The current month is partial unless as_of is its last day
+    partial = as_of < last
+    complete = totals[:, :-1] if partial else totals
+    change = np.full(n_c, np.nan)
+    if complete.shape[1] >= 2:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = np.where(complete[:, -2] > 0, (complete[:, -1] / complete[:, -2] - 1) * 100, np.nan)
+    slope = _slope(complete)
+    average = complete.mean(axis=1) if complete.shape[1] else np.zeros(n_c)
+    overall = totals.sum(axis=0)
+
+    # Burn rate for as_of's month
+    ym = month_labels[-1]
+    budgets = budgets or {}
+    days_in_month = calendar.monthrange(as_of.year, as_of.month)[1]
+    elapsed = as_of.day
+    current = m_idx == months - 1
+    daily = np.zeros((n_c, days_in_month))
+    cur_day = (day[current] - np.datetime64(month_start(as_of))).astype(np.int64)
+    np.add.at(daily, (cat[current], cur_day), amount[current])
+    cum = np.cumsum(daily, axis=1)
+    spent = cum[:, elapsed - 1]
+    budget = np.array([budgets.get(n, np.nan) for n in names], dtype=float)
+    rate = spent / elapsed
+    projected = rate * days_in_month
+    with np.errstate(invalid="ignore"):
+        crossed = cum[:, :elapsed] > budget[:, None]
+        over_now = crossed.any(axis=1)
+        remaining_days = np.ceil((budget - spent) / np.where(rate > 0, rate, np.nan))
+    cross_day = np.where(over_now, crossed.argmax(axis=1) + 1, elapsed + remaining_days)
+    has_date = np.isfinite(cross_day) & (cross_day <= days_in_month)
+    month0 = month_start(as_of)
+
+    def burn_row(name, b, s, r, p, over, has, cd):
+        b, s, r, p = float(b), float(s), float(r), float(p)
+        return {"category": name, "budget": round(b, 2), "spent": round(s, 2), "dailyRate": round(r, 2),
+                "projected": round(p, 2), "usedPct": round(s / b * 100, 1) if b else None,
+                "status": "over" if over else ("atRisk" if p > b else "ok"),
+                "overspendDate": date(month0.year, month0.month, int(cd)).isoformat() if has else None}
+
+    budgeted = np.isfinite(budget)
+    burn_rows = [
+        burn_row(names[i], budget[i], spent[i], rate[i], projected[i], over_now[i], has_date[i], cross_day[i])
+        for i in np.flatnonzero(budgeted)
+    ]
+    # Budgets for categories with no spend this window still count towards the total
+    burn_rows += [burn_row(k, v, 0.0, 0.0, 0.0, False, False, 0) for k, v in sorted(budgets.items()) if k not in names]
+    # Total: budgeted categories only; spend in the others is reported beside it
+    budget_total = sum(budgets.values())
+    spent_total = float(spent[budgeted].sum())
+    total_cum = cum[budgeted].sum(axis=0)[:elapsed]
+    total_rate = spent_total / elapsed
+    total_over = budget_total > 0 and bool((total_cum > budget_total).any())
+    if total_over:
+        total_day = int((total_cum > budget_total).argmax()) + 1
+    elif budget_total > 0 and total_rate > 0:
+        total_day = elapsed + int(np.ceil((budget_total - spent_total) / total_rate))
+    else:
+        total_day = days_in_month + 1
+    burn_total = burn_row("Total", budget_total, spent_total, total_rate, total_rate * days_in_month,
+                          total_over, budget_total > 0 and total_day <= days_in_month, total_day)
+
+    # z-scores of single expenses within their category
+    n_cat = np.bincount(cat, minlength=n_c)
+    mean = np.bincount(cat, weights=amount, minlength=n_c) / np.maximum(n_cat, 1)
+    var = np.bincount(cat, weights=(amount - mean[cat]) ** 2, minlength=n_c) / np.maximum(n_cat - 1, 1)
+    std = np.sqrt(var)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(std[cat] > 0, (amount - mean[cat]) / std[cat], 0.0)
+    flagged = np.flatnonzero((n_cat[cat] >= MIN_SAMPLES) & (z >= z_threshold))
+    flagged = flagged[np.argsort(-z[flagged], kind="stable")][:MAX_OUTLIERS]
+    outliers = [{
+        "expenseId": cols.ids[rows[i]],
+        "date": str(day[i]),
+        "category": names[cat[i]],
+        "amount": round(float(amount[i]), 2),
+        "z": round(float(z[i]), 2),
+        "categoryMean": round(float(mean[cat[i]]), 2),
+        "rawText": cols.texts[rows[i]],
+    } for i in flagged]
+
+    return {
+        "window": {"start": first.isoformat(), "end": as_of.isoformat(), "months": month_labels,
+                   "partialMonth": bool(partial), "expenses": int(amount.size)},
+        "categories": names,
+        "monthly": {
+            "totals": _r(totals),
+            "counts": counts.tolist(),
+            "rollingAvg": _r(_rolling_mean(totals, window)),
+            "window": window,
+        },
+        "overall": {"totals": _r(overall), "rollingAvg": _r(_rolling_mean(overall, window))},
+        "trends": {
+            "average": _r(average),
+            "slope": _r(slope),
+            "changePct": [None if not np.isfinite(v) else round(float(v), 1) for v in change],
+        },
+        "burn": {"month": ym, "daysElapsed": elapsed, "daysInMonth": days_in_month,
+                 "categories": burn_rows, "total": burn_total, "unbudgetedSpent": round(float(spent[~budgeted].sum()), 2)},
+        "outliers": outliers,
+        "zThreshold": z_threshold,
+    }
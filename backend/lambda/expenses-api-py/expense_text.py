@@ -0,0 +1,431 @@
+"""Single-pass parser for free-text expenses ("2 coffees 180 at starbucks yesterday").
+
+The text is split on whitespace; plain words and plain numbers become tokens as they
+are, and only the remaining chunks ("₹1.2k", "28/04", "mcdonald's") go through one
+precompiled lexer pattern with three branches (number-like, word, punctuation). The term
+is tracked in that same pass. One walk over the tokens, with dict lookups and at most a
+few tokens of lookahead for "3 may" or "day before yesterday", then picks out
+
+  - amount    currency marks (₹ $ € £, rs/rs./inr/usd...), thousands separators
+                ("1,200", "1,20,000"), a decimal comma ("12,5"), k/lakh/cr multipliers
+                ("1.2k", "2L") and a quantity ("15 x 2" is 30)
+  - date      ISO or day-first numeric dates, "3 may"/"may 3rd", today/yesterday/
+                tomorrow, "day before yesterday", "N days ago", "friday"/"last fri"
+                ("may 2024" is a period, not a date, and not an amount either)
+  - merchant  the words after "at"/"from"/"@" ("at Blue Tokai" -> "Blue Tokai")
+  - term      the categorization key used for CategoryRules and the AI cache
+
+When several numbers appear, the one carrying a currency mark or multiplier wins, then
+one that is not a count ("2 coffees", "for 2", "3 for 900"), then the first one; numbers
+that are part of a date or a clock time are never amounts.
+
+`term` must equal extract_term(), the regex extractor POST /add has always used (the
+phrase after on/for/at/to, at most its last three words, else the last two words,
+lowercased), because CategoryRules and AI cache items are keyed by it. The chunk pass
+reproduces it for plain words and spaces; for shapes it does not model (irregular
+whitespace, a phrase over 41 characters, "2-to") parse() calls extract_term() instead.
+"""
+import re
+from datetime import date as _date, datetime, timedelta
+
+_MONTHS = {}
+for _i, _names in enumerate(["jan january", "feb february", "mar march", "apr april", "may", "jun june",
+                             "jul july", "aug august", "sep sept september", "oct october",
+                             "nov november", "dec december"]):
+    _MONTHS.update(dict.fromkeys(_names.split(), _i + 1))
+_WEEKDAYS = {}       # full names stand alone; "mon"/"sat"/"sun"... only count after "last"
+_WEEKDAY_ABBR = {}
+for _i, _name in enumerate(["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]):
+    _WEEKDAYS[_name] = _i
+    _WEEKDAY_ABBR[_name[:3]] = _i
+_WEEKDAY_ABBR.update(_WEEKDAYS, tues=1, thur=3, thurs=3)
+_RELATIVE = {"today": 0, "tonight": 0, "yesterday": -1, "tomorrow": 1}
+_MULTIPLIERS = {"k": 1_000, "l": 100_000, "lac": 100_000, "lakh": 100_000, "lakhs": 100_000,
+                "cr": 10_000_000, "crore": 10_000_000, "crores": 10_000_000}
+_CURRENCY_SYMBOLS = {"₹": "INR", "$": "USD", "€": "EUR", "£": "GBP"}
+_CURRENCY_WORDS = {"rs": "INR", "inr": "INR", "rupees": "INR", "rupee": "INR",
+                   "usd": "USD", "dollars": "USD", "eur": "EUR", "euros": "EUR", "gbp": "GBP"}
+_PREPOSITIONS = frozenset(["on", "for", "at", "to"])
+_MERCHANT_MARKS = frozenset(["at", "from", "@"])
+_DATE_WORDS = frozenset(["ago", "day", "days", "last", "before"])
+_MERCHANT_STOP = _PREPOSITIONS | _MERCHANT_MARKS
+# Words that may follow a number without making it a count of something ("500 on fuel")
+_AMOUNT_FOLLOWERS = _PREPOSITIONS | frozenset(["from", "paid", "spent", "only", "each", "total", "via", "by", "in"])
+# "for 2" (people, items) is a count up to this size, not a price
+_MAX_FOR_COUNT = 12
+# "15 x 2", "15*2": a price times a quantity
+_QUANTITY_MARKS = frozenset(["x", "×", "*"])
+_CLOCK = frozenset(["am", "pm"])
+_PREPOSITION_ENDINGS = tuple(_PREPOSITIONS)
+_TERM_STOP_WORDS = frozenset(["yesterday", "today", "tomorrow"])
+# Words after a plain number that make it more than an amount candidate ("3 may", "9 pm")
+_NUMBER_SUFFIXES = frozenset(_MONTHS) | _CLOCK | _QUANTITY_MARKS | frozenset(["day", "days"]) \
+    | frozenset(w for w in _MULTIPLIERS if len(w) > 1)
+
+# Words that need more than a plain append in the token walk
+_SPECIAL_WORDS = frozenset(_CURRENCY_WORDS) | frozenset(_RELATIVE) | frozenset(_WEEKDAYS) | frozenset(_MONTHS) \
+    | frozenset(["day", "last"])
+
+# (number-like, word, punctuation) within one whitespace-free chunk: a number-like token
+# carries its currency mark ("₹", "Rs.", "₹."), date separators ("2024-05-03", "28/04",
+# "9:30") and an attached k/L, ordinal or am/pm suffix
+_LEX = re.compile(
+    r"((?:[₹$€£]\.?|\b[Rr][Ss]\.)?(?:\d[\d,.:/-]*|\.\d+)(?:[kKlL]\b|(?:st|nd|rd|th)\b|[aApP][mM]\b)?)"
+    r"|([A-Za-z]+(?:['&][A-Za-z]+)*)"
+    r"|(\S)"
+)
+_DATE_SEP = re.compile(r"[/.-]")
+_TERM_PHRASE = re.compile(r"\b(?:on|for|at|to)\s+([A-Za-z][A-Za-z\s]{1,40})", re.IGNORECASE)
+_TERM_STOP = re.compile(r"\b(?:yesterday|today|tomorrow|\d{4}-\d{2}-\d{2})\b", re.IGNORECASE)
+_TERM_NON_ALPHA = re.compile(r"[^A-Za-z\s]")
+_TERM_WORD = re.compile(r"[A-Za-z]+")
+
+class ParsedText:
+    __slots__ = ("amount", "currency", "date", "merchant", "term")
+
+    def __init__(self, amount=None, currency=None, date=None, merchant=None, term=""):
+        self.amount = amount
+        self.currency = currency
+        self.date = date
+        self.merchant = merchant
+        self.term = term
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        return f"ParsedText({self.as_dict()!r})"
+
+
+def _today():
+    return datetime.utcnow().date()
+
+
+def _ymd(y, m, d):
+    try:
+        return _date(y, m, d).isoformat()
+    except ValueError:
+        return None
+
+
+def _year(y, today):
+    if y is None:
+        return today.year
+    y = int(y)
+    return y + 2000 if y < 100 else y
+
+
+def _month_day(m, d, y, today):
+    """Month/day without a year means the most recent such day, not one in the future."""
+    if y is not None:
+        return _ymd(_year(y, today), m, d)
+    out = _ymd(today.year, m, d)
+    if out and out > today.isoformat():
+        out = _ymd(today.year - 1, m, d)
+    return out
+
+
+def _number(tok):
+    """Classify a number-like token: ("num", (value, currency, marked)), ("date", iso or None),
+    ("ord", day) or ("time", None)."""
+    if tok.isdigit():
+        return "num", (float(tok), None, False)
+    low = tok.lower()
+    currency = _CURRENCY_SYMBOLS.get(low[0])
+    if currency:
+        low = low[1:].lstrip(".")
+    elif low.startswith("rs."):
+        currency, low = "INR", low[3:].lstrip()
+    if ":" in low or low.endswith(("am", "pm")):
+        return "time", None
+    if low.endswith(("st", "nd", "rd", "th")):
+        return "ord", int(low[:-2])
+    dash = low.endswith("/-")  # "500/-"
+    low = (low[:-2] if dash else low).rstrip(",.:/-")
+    mult = _MULTIPLIERS.get(low[-1:], 1)
+    if mult != 1:
+        low = low[:-1]
+    if "-" in low or "/" in low or low.count(".") > 1:
+        return "date", None
+    if "," in low:
+        head, _, tail = low.rpartition(",")
+        if len(tail) < 3:   # "12,5", "1.200,50": a decimal comma; "1,200" groups thousands
+            low = head.replace(".", "") + "." + tail
+    try:
+        value = float(low.replace(",", "")) * mult
+    except ValueError:
+        return "junk", None
+    return "num", (round(value, 2), currency or ("INR" if dash else None), bool(currency or dash or mult != 1))
+
+
+def _numeric_date(tok, today):
+    parts = _DATE_SEP.split(tok.rstrip(",.:/-"))
+    if not all(p.isdigit() for p in parts):
+        return None
+    if len(parts) == 3 and len(parts[0]) == 4:
+        return _ymd(int(parts[0]), int(parts[1]), int(parts[2]))
+    if len(parts) in (2, 3):  # day first
+        return _month_day(int(parts[1]), int(parts[0]), parts[2] if len(parts) == 3 else None, today)
+    return None
+
+
+def _year_at(toks, i):
+    """A four-digit year at toks[i], else None."""
+    if i < len(toks) and len(toks[i][0]) == 4 and toks[i][0].isdigit() and toks[i][0][:2] in ("19", "20"):
+        return toks[i][0]
+    return None
+
+
+def parse(raw_text: str, today=None) -> ParsedText:
+    """Parse one expense text; `today` (a date) anchors relative dates, UTC today by default."""
+    today = today or _today()
+    out = ParsedText()
+    text = raw_text or ""
+    chunks = text.split()
+    toks = []                # (number-like, word, punctuation), as _LEX.findall() gives them
+    phrase = None            # the words after the first on/for/at/to that has some
+    state = 0                # 0 before on/for/at/to, 1 right after it, 2 in its phrase, 3 done
+    odd = False              # a shape the term rules below do not model
+    for c in chunks:
+        if c.isalpha() and c.isascii():
+            toks.append(("", c, ""))
+            if state == 2:
+                phrase.append(c)
+            elif state == 1:
+                phrase, state = [c], 2
+            elif state == 0 and c.lower() in _PREPOSITIONS:
+                state = 1
+            continue
+        if c.isdecimal():
+            toks.append((c, "", ""))
+        else:
+            toks.extend(_LEX.findall(c))
+            if state in (1, 2) and c[0].isalpha():
+                if not c[0].isascii():
+                    odd = True
+                    continue
+                # "to mcdonald's": the phrase runs up to the first non-letter
+                lead = _TERM_WORD.match(c).group()
+                if state == 1:
+                    phrase = [lead]
+                else:
+                    phrase.append(lead)
+                state = 3
+                continue
+            if state < 2 and c.lower().endswith(_PREPOSITION_ENDINGS):
+                odd = True   # "500/-for rent": a preposition glued to the chunk before it
+        if state == 1:
+            state = 0
+        elif state == 2:
+            state = 3
+    out.term = _term(text, chunks, phrase) if not odd else extract_term(text)
+
+    n = len(toks)
+    tokens = []              # (kind, lowercased word, original word)
+    numbers = []             # [score, token position, amount, currency]
+    pending_currency = None  # "rs. 250": currency word before the number
+    day = None               # a date found in this token, resolved below
+    i = 0
+    while i < n:
+        num, word, punct = toks[i]
+        i += 1
+        if word:
+            low = word.lower()
+            if low not in _SPECIAL_WORDS:
+                tokens.append(("word", low if low.isalpha() else low.replace("'", "").replace("&", ""), word))
+                pending_currency = None
+                continue
+        nxt = toks[i][1].lower() if i < n else ""
+        if num:
+            if num.isdecimal() and nxt not in _NUMBER_SUFFIXES and (i == n or toks[i][2] not in _QUANTITY_MARKS):
+                numbers.append([2 if pending_currency else 0, len(tokens), float(num), pending_currency])
+                tokens.append(("num", "", ""))
+                pending_currency = None
+                continue
+            kind, val = _number(num)
+            if kind == "date":
+                day = _numeric_date(num, today)
+            elif nxt in _CLOCK and kind in ("num", "time"):
+                i += 1         # "9 pm", "9:30 pm"
+                tokens.append(("time", "", ""))
+                pending_currency = None
+                continue
+            elif (kind == "ord" or (kind == "num" and not val[1] and val[0].is_integer() and 1 <= val[0] <= 31)) \
+                    and nxt in _MONTHS:
+                # "3 may", "1st may 2024"
+                d = val if kind == "ord" else int(val[0])
+                year = _year_at(toks, i + 1)
+                i += 2 if year else 1
+                day = _month_day(_MONTHS[nxt], d, year, today) or ""
+            elif kind == "num" and nxt in ("day", "days") and i + 1 < n and toks[i + 1][1].lower() == "ago":
+                i += 2
+                day = (today - timedelta(days=int(val[0]))).isoformat()
+            elif kind == "num":
+                value, currency, marked = val
+                if nxt in _MULTIPLIERS and len(nxt) > 1:  # "5 cr", "2 lakh"
+                    value, marked = value * _MULTIPLIERS[nxt], True
+                    i += 1
+                if i + 1 < n and (nxt in _QUANTITY_MARKS or toks[i][2] in _QUANTITY_MARKS) and toks[i + 1][0]:
+                    kind, times = _number(toks[i + 1][0])
+                    if kind == "num":   # "15 x 2", "₹15×2"
+                        value, marked = round(value * times[0], 2), True
+                        currency = currency or times[1]
+                        i += 2
+                currency = currency or pending_currency
+                numbers.append([2 if (marked or currency) else 0, len(tokens), value, currency])
+                tokens.append(("num", "", ""))
+                pending_currency = None
+                continue
+            else:
+                tokens.append((kind, "", ""))
+                pending_currency = None
+                continue
+        elif word:
+            if low in _CURRENCY_WORDS:
+                prev = numbers[-1] if numbers else None
+                if prev and prev[1] == len(tokens) - 1 and not prev[3]:
+                    prev[3], prev[0] = _CURRENCY_WORDS[low], 2   # "250 rs"
+                else:
+                    pending_currency = _CURRENCY_WORDS[low]       # "rs 250"
+                continue
+            pending_currency = None
+            if low in _RELATIVE:
+                day = (today + timedelta(days=_RELATIVE[low])).isoformat()
+            elif low == "day" and nxt == "before" and i + 1 < n and toks[i + 1][1].lower() == "yesterday":
+                i += 2
+                day = (today - timedelta(days=2)).isoformat()
+            elif low in _WEEKDAYS or (low == "last" and nxt in _WEEKDAY_ABBR):
+                if low == "last":
+                    i += 1
+                back = (today.weekday() - _WEEKDAY_ABBR[nxt if low == "last" else low]) % 7
+                day = (today - timedelta(days=back or (7 if low == "last" else 0))).isoformat()
+            elif low in _MONTHS and i < n and toks[i][0]:
+                year = _year_at(toks, i)
+                if year:  # "may 2024" is a period: neither a date nor an amount
+                    i += 1
+                    day = ""
+                else:
+                    kind, val = _number(toks[i][0])
+                    if kind == "ord" or (kind == "num" and val[0].is_integer() and 1 <= val[0] <= 31):
+                        # "may 3", "may 3rd, 2024"
+                        d = val if kind == "ord" else int(val[0])
+                        i += 1
+                        comma = i < n and toks[i][2] == ","
+                        year = _year_at(toks, i + 1 if comma else i)
+                        if year:
+                            i += 2 if comma else 1
+                        day = _month_day(_MONTHS[low], d, year, today) or ""
+                    else:
+                        tokens.append(("word", low, word))
+                        continue
+            else:
+                tokens.append(("word", low if low.isalpha() else low.replace("'", "").replace("&", ""), word))
+                continue
+        else:
+            if punct in _CURRENCY_SYMBOLS:   # "₹ 500"
+                pending_currency = _CURRENCY_SYMBOLS[punct]
+                continue
+            if punct == "@":
+                tokens.append(("at", "@", "@"))
+            else:
+                tokens.append(("punct", "", ""))
+            if punct != ".":   # "rs." keeps its currency for the next number
+                pending_currency = None
+            continue
+        # A date (or period) was consumed
+        if day and out.date is None:
+            out.date = day
+        day = None
+        tokens.append(("date", "", ""))
+        pending_currency = None
+
+    if len(numbers) > 1:
+        _score_counts(numbers, tokens)
+        best = max(numbers, key=lambda c: (c[0], -c[1]))
+        out.amount, out.currency = best[2], best[3]
+    elif numbers:
+        out.amount, out.currency = numbers[0][2], numbers[0][3]
+    out.merchant = _merchant(tokens)
+    return out
+
+
+def _words_from(tokens, i, stop=()):
+    """Consecutive word tokens from index i, up to a number, date, time or punctuation."""
+    words = []
+    while i < len(tokens) and tokens[i][0] == "word" and tokens[i][1] not in stop:
+        words.append(tokens[i])
+        i += 1
+    return words
+
+
+def _score_counts(numbers, tokens):
+    """Lift bare numbers that are not counts to 1; counts stay at 0. A count is a number in
+    front of a noun ("2 coffees"), a small one after "for" ("coffee 180 for 2"), or the
+    first of "N for M" ("3 for 900")."""
+    counts = set()
+    for c in numbers:
+        if c[0] == 0:
+            p = c[1]
+            prev = tokens[p - 1][1] if p else ""
+            nxt = tokens[p + 1] if p + 1 < len(tokens) else None
+            if (nxt and nxt[0] == "word" and nxt[1] not in _AMOUNT_FOLLOWERS) \
+                    or (prev == "for" and c[2].is_integer() and c[2] <= _MAX_FOR_COUNT):
+                counts.add(p)
+    for c in numbers:
+        if c[0] == 0 and c[1] not in counts:
+            p = c[1]
+            # "3 for 900": the number before "for" counts what the later one paid for
+            if not (p + 2 < len(tokens) and tokens[p + 1][1] == "for" and tokens[p + 2][0] == "num"
+                    and p + 2 not in counts):
+                c[0] = 1
+
+
+def _term(text, chunks, phrase):
+    """extract_term() from the chunk pass: `phrase` is the run of words after the first
+    on/for/at/to followed by a letter, or None."""
+    if phrase:
+        joined = " ".join(phrase)
+        if len(joined) > 41 or len(joined) == 1 or " ".join(chunks) != text:
+            return extract_term(text)   # cut mid-word, too short to match, or odd spacing
+        words = []
+        for w in phrase:
+            low = w.lower()
+            if low in _TERM_STOP_WORDS:
+                break
+            words.append(low)
+        if words:
+            return " ".join(words[-3:])
+    tail = []
+    for c in reversed(chunks):
+        if c.isalpha() and c.isascii():
+            tail.append(c)
+        elif not c.isdecimal():
+            tail.extend(reversed(_TERM_WORD.findall(c)))
+        if len(tail) >= 2:
+            break
+    return " ".join(reversed(tail[:2])).lower()
+
+
+def extract_term(raw_text: str) -> str:
+    """Rule key of a text: the phrase after on/for/at/to (last up to 3 words, e.g. "dog
+    food"), else the last two words, lowercased."""
+    m = _TERM_PHRASE.search(raw_text)
+    if m:
+        cand = _TERM_STOP.split(m.group(1).strip(), 1)[0].strip()
+        cand = " ".join(_TERM_NON_ALPHA.sub("", cand).split())
+        if cand:
+            words = cand.split(" ")
+            if len(words) > 3:
+                cand = " ".join(words[-3:])
+            return cand.lower()
+    return " ".join(_TERM_WORD.findall(raw_text)[-2:]).lower()
+
+
+def _merchant(tokens):
+    for i, (kind, low, _) in enumerate(tokens):
+        if kind in ("word", "at") and low in _MERCHANT_MARKS:
+            words = [w[2] for w in _words_from(tokens, i + 1, _MERCHANT_STOP)
+                     if w[1] not in _DATE_WORDS]
+            if words:
+                return " ".join(words[:4])
+    return None
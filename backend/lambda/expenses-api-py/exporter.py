@@ -0,0 +1,241 @@
+"""Streaming export of a user's expenses or invest transactions as NDJSON or CSV.
+
+    python exporter.py expenses --user USER_ID out/expenses
+    python exporter.py transactions --user SUB [--portfolio PID] s3://bucket/exports/txns --format csv --gzip
+
+Rows come from a generator over the userId-date-index GSI (expenses) or the
+TRANSACTION#<pid># sort-key range (transactions), one DynamoDB page at a time, and are
+written to numbered parts (part-00000.ndjson[.gz], ...) of at most --part-rows rows in a
+local directory or under an s3:// prefix (S3_ENDPOINT_URL for non-AWS stores). A part is
+staged in a spooled temp file and uploaded when full, so memory stays constant whatever
+the history length.
+
+After every part, DEST/manifest.json records the parts written and the key of the last
+exported row. The deadline (--max-seconds, or the Lambda deadline via index.export_handler)
+is checked after every DynamoDB page: past it, the rows staged so far are written as a
+short part, the manifest is saved with "complete": false and the run stops, so no part
+can run past the timeout. Running the same command again resumes after the last part.
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import codec
+import index
+
+PART_ROWS = 100_000
+PAGE_SIZE = 1000  # items per Query page
+SPOOL_BYTES = 8 * 1024 * 1024  # parts larger than this spill to /tmp
+MANIFEST = "manifest.json"
+
+EXPENSE_COLUMNS = ["expenseId", "date", "amount", "category", "rawText", "createdAt"]
+TRANSACTION_COLUMNS = ["transactionId", "portfolioId", "date", "type", "holdingId", "units", "price", "amount", "sk"]
+
+
+def iter_expenses(user_id, start=None, end=None, start_key=None):
+    """Expense items one Query page (list) at a time."""
+    table = index._table(index.EXPENSES_TABLE)
+    params = {
+        "IndexName": index.EXPENSES_USER_DATE_INDEX,
+        "KeyConditionExpression": index._expense_key_condition(user_id, start, end),
+        "ScanIndexForward": True,
+        "Limit": PAGE_SIZE,
+    }
+    yield from _pages(table, params, start_key)
+
+
+def iter_transactions(user_sub, portfolio_id=None, start_key=None):
+    from boto3.dynamodb.conditions import Key
+
+    prefix = f"TRANSACTION#{portfolio_id}#" if portfolio_id else "TRANSACTION#"
+    table = index._table(index.INVEST_TABLE)
+    params = {
+        "KeyConditionExpression": Key("pk").eq(f"USER#{user_sub}") & Key("sk").begins_with(prefix),
+        "Limit": PAGE_SIZE,
+    }
+    yield from _pages(table, params, start_key)
+
+
+def _pages(table, params, start_key):
+    while True:
+        if start_key:
+            params["ExclusiveStartKey"] = start_key
+        res = table.query(**params)
+        yield res.get("Items", [])
+        start_key = res.get("LastEvaluatedKey")
+        if not start_key:
+            return
+
+
+def expense_row(item):
+    return {c: item.get(c) for c in EXPENSE_COLUMNS}
+
+
+def transaction_row(item):
+    data = item.get("data") or {}
+    row = {c: data.get(c) for c in TRANSACTION_COLUMNS}
+    row.update(transactionId=item.get("transactionId"), portfolioId=item.get("portfolioId"), sk=item.get("sk"),
+               holdingId=item.get("holdingId") or data.get("holdingId"))
+    return row
+
+
+class Destination:
+    """Local directory or s3://bucket/prefix holding the parts and the manifest."""
+
+    def __init__(self, uri):
+        self.uri = uri.rstrip("/")
+        self.s3 = None
+        if self.uri.startswith("s3://"):
+            import boto3
+
+            self.bucket, _, self.prefix = self.uri[len("s3://"):].partition("/")
+            self.s3 = boto3.client("s3", endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None)
+        else:
+            os.makedirs(self.uri, exist_ok=True)
+
+    def _key(self, name):
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def read_manifest(self):
+        try:
+            if self.s3:
+                body = self.s3.get_object(Bucket=self.bucket, Key=self._key(MANIFEST))["Body"].read()
+            else:
+                with open(os.path.join(self.uri, MANIFEST), "rb") as fh:
+                    body = fh.read()
+        except Exception as e:
+            if isinstance(e, FileNotFoundError) or index._error_code(e) in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(body)
+
+    def write_manifest(self, manifest):
+        data = json.dumps(manifest, indent=2).encode("utf-8")
+        if self.s3:
+            self.s3.put_object(Bucket=self.bucket, Key=self._key(MANIFEST), Body=data,
+                               ContentType="application/json")
+            return
+        tmp = os.path.join(self.uri, MANIFEST + ".tmp")
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, os.path.join(self.uri, MANIFEST))
+
+    def put(self, name, fileobj):
+        fileobj.seek(0)
+        if self.s3:
+            # upload_fileobj switches to multipart for large parts
+            self.s3.upload_fileobj(fileobj, self.bucket, self._key(name))
+            return
+        with open(os.path.join(self.uri, name), "wb") as out:
+            shutil.copyfileobj(fileobj, out)
+
+
+class _Part:
+    def __init__(self, fmt, compress, columns):
+        self.raw = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        self.gz = gzip.GzipFile(fileobj=self.raw, mode="wb", compresslevel=6, mtime=0) if compress else None
+        self.text = io.TextIOWrapper(self.gz or self.raw, encoding="utf-8", newline="")
+        self.csv = None
+        if fmt == "csv":
+            self.csv = csv.DictWriter(self.text, fieldnames=columns, extrasaction="ignore")
+            self.csv.writeheader()
+        self.rows = 0
+
+    def write(self, row):
+        if self.csv:
+            self.csv.writerow(row)
+        else:
+            self.text.write(codec.dumps(row))
+            self.text.write("\n")
+        self.rows += 1
+
+    def finish(self):
+        self.text.flush()
+        self.text.detach()
+        if self.gz:
+            self.gz.close()
+        return self.raw
+
+
+def run_export(kind, dest_uri, user, portfolio_id=None, start=None, end=None, fmt="ndjson", compress=False,
+               part_rows=PART_ROWS, deadline=None):
+    """Export (or resume exporting) into dest_uri; returns the manifest.
+
+    `deadline` is a time.monotonic() value; the run stops at the first page boundary past it."""
+    dest = Destination(dest_uri)
+    params = {"kind": kind, "user": user, "portfolioId": portfolio_id, "start": start, "end": end,
+              "format": fmt, "gzip": compress}
+    manifest = dest.read_manifest()
+    if manifest and manifest.get("params") != params:
+        raise SystemExit(f"{dest_uri} holds an export with different parameters: {manifest.get('params')}")
+    if manifest and manifest.get("complete"):
+        return manifest
+    manifest = manifest or {"params": params, "parts": [], "rows": 0, "lastKey": None, "complete": False}
+    if kind == "expenses":
+        pages = iter_expenses(user, start, end, manifest["lastKey"])
+        to_row, columns, key_attrs = expense_row, EXPENSE_COLUMNS, ("expenseId", "userId", "date")
+    else:
+        pages = iter_transactions(user, portfolio_id, manifest["lastKey"])
+        to_row, columns, key_attrs = transaction_row, TRANSACTION_COLUMNS, ("pk", "sk")
+    suffix = (".csv" if fmt == "csv" else ".ndjson") + (".gz" if compress else "")
+    started = time.perf_counter()
+    part = None
+    last = None
+
+    def flush():
+        name = f"part-{len(manifest['parts']):05d}{suffix}"
+        dest.put(name, part.finish())
+        manifest["parts"].append({"name": name, "rows": part.rows})
+        manifest["rows"] += part.rows
+        manifest["lastKey"] = {k: last[k] for k in key_attrs if k in last}
+        dest.write_manifest(manifest)
+
+    for page in pages:
+        for item in page:
+            if part is None:
+                part = _Part(fmt, compress, columns)
+            part.write(to_row(item))
+            last = item
+            if part.rows >= part_rows:
+                flush()
+                part = None
+        if deadline is not None and time.monotonic() >= deadline:
+            if part is not None and part.rows:
+                flush()
+            elapsed = time.perf_counter() - started
+            return {**manifest, "seconds": round(elapsed, 2)}
+    if part is not None and part.rows:
+        flush()
+    manifest["complete"] = True
+    dest.write_manifest(manifest)
+    elapsed = time.perf_counter() - started
+    return {**manifest, "seconds": round(elapsed, 2)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export expenses or invest transactions as NDJSON/CSV")
+    parser.add_argument("kind", choices=["expenses", "transactions"])
+    parser.add_argument("dest", help="local directory or s3://bucket/prefix")
+    parser.add_argument("--user", required=True, help="userId (expenses) or user sub (transactions)")
+    parser.add_argument("--portfolio", help="limit transactions to one portfolio")
+    parser.add_argument("--start", help="first date (expenses)")
+    parser.add_argument("--end", help="last date (expenses)")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--part-rows", type=int, default=PART_ROWS)
+    parser.add_argument("--max-seconds", type=float, help="stop at the first page boundary past this budget")
+    args = parser.parse_args(argv)
+    deadline = time.monotonic() + args.max_seconds if args.max_seconds else None
+    manifest = run_export(args.kind, args.dest, args.user, args.portfolio, args.start, args.end, args.format,
+                          args.gzip, args.part_rows, deadline)
+    print(json.dumps({k: v for k, v in manifest.items() if k != "parts"}, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Pooled keep-alive HTTP(S) client for the Groq chat-completions API.
+
+Held at module scope so warm invocations reuse TCP/TLS connections. Connect and read
+timeouts are separate, retryable statuses (429/5xx) and connection failures are retried
+with full-jitter backoff (timeouts are not retried), and a circuit breaker fails fast after repeated failures so
+callers drop straight to the rules-only path while the upstream is unhealthy.
+
+GROQ_BASE_URL may point at a plain-http stub (see backend/bench/groq_stub.py).
+"""
+import http.client
+import json
+import random
+import socket
+import ssl
+import threading
+import time
+from urllib.parse import urlsplit
+
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class UpstreamError(Exception):
+    def __init__(self, reason: str, status=None, body: str = ""):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+        self.body = body
+
+
+class CircuitBreaker:
+    """closed -> open after `threshold` consecutive failures; after `cooldown` seconds one
+    half-open trial call is let through, and its outcome closes or re-opens the circuit."""
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class GroqClient:
+    def __init__(self, base_url="https://api.groq.com", connect_timeout=2.0, read_timeout=8.0,
+                 max_retries=2, backoff_base=0.25, backoff_cap=2.0, pool_size=8, breaker=None):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+        self._idle = []
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context() if self.scheme == "https" else None
+        self.stats = {"requests": 0, "retries": 0, "connects": 0, "failures": 0, "shortCircuited": 0}
+
+    @staticmethod
+    def _within(timeout, deadline):
+        """`timeout`, capped at the time left before `deadline` (time.monotonic()) if any."""
+        if deadline is None:
+            return timeout
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise socket.timeout("deadline passed")
+        return min(timeout, left)
+
+    def _new_connection(self, deadline=None):
+        timeout = self._within(self.connect_timeout, deadline)
+        with self._lock:
+            self.stats["connects"] += 1
+        if self.scheme == "https":
+            conn = http.client.HTTPSConnection(self.host, self.port, timeout=timeout, context=self._ssl_context)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        conn.connect()
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def _acquire(self, deadline=None):
+        # Returns (connection, reused_from_pool)
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._new_connection(deadline), False
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _send(self, path, body, headers, read_timeout, deadline=None):
+        conn, reused = self._acquire(deadline)
+        while True:
+            try:
+                conn.sock.settimeout(self._within(read_timeout or self.read_timeout, deadline))
+                conn.request("POST", self.base_path + path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                conn.close()
+                if not reused:
+                    raise
+                # Pooled connection was closed by the server while idle: retry on a fresh one
+                conn, reused = self._new_connection(deadline), False
+            except Exception:
+                conn.close()
+                raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        return resp.status, resp.getheader("Retry-After"), data
+
+    def _sleep_before_retry(self, attempt, retry_after=None, deadline=None):
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, min(self.backoff_cap, float(retry_after)))
+            except ValueError:
+                pass
+        if deadline is not None:
+            delay = min(delay, max(deadline - time.monotonic(), 0))
+        time.sleep(delay)
+
+    def post_json(self, path: str, payload, headers=None, read_timeout=None, deadline=None):
+        """POST JSON and return the decoded response; raises UpstreamError with reason
+        circuit_open, timeout, connection, http_<status> or invalid_json. With a `deadline`
+        (time.monotonic()), each attempt's connect and read timeouts are capped at the time
+        left, and an attempt that would start after it is a timeout."""
+        if not self.breaker.allow():
+            self.stats["shortCircuited"] += 1
+            raise UpstreamError("circuit_open")
+        body = json.dumps(payload).encode("utf-8")
+        hdrs = {"Content-Type": "application/json", "Accept": "application/json", **(headers or {})}
+        last = None
+        for attempt in range(self.max_retries + 1):
+            self.stats["requests"] += 1
+            retry_after = None
+            try:
+                status, retry_after, data = self._send(path, body, hdrs, read_timeout, deadline)
+            except (socket.timeout, TimeoutError):
+                # A read timeout already cost the full budget; retrying would multiply it
+                last = UpstreamError("timeout")
+                break
+            except (OSError, http.client.HTTPException) as e:
+                last = UpstreamError("connection", body=str(e))
+            else:
+                if 200 <= status < 300:
+                    try:
+                        decoded = json.loads(data.decode("utf-8"))
+                    except ValueError:
+                        # A 2xx that is not JSON (proxy error page, truncated body) is an
+                        # upstream failure too, and must end a half-open trial
+                        self.stats["failures"] += 1
+                        self.breaker.record_failure()
+                        raise UpstreamError("invalid_json", status, data.decode("utf-8", "replace"))
+                    self.breaker.record_success()
+                    return decoded
+                last = UpstreamError(f"http_{status}", status, data.decode("utf-8", "replace"))
+                if status not in RETRYABLE_STATUSES:
+                    # Client errors say nothing about upstream health
+                    self.breaker.record_success()
+                    raise last
+            if attempt < self.max_retries:
+                self.stats["retries"] += 1
+                self._sleep_before_retry(attempt, retry_after, deadline)
+        self.stats["failures"] += 1
+        self.breaker.record_failure()
+        raise last
@@ -0,0 +1,421 @@
+"""HOLDING snapshots maintained from the TRANSACTION log of the InvestApp table.
+
+A transaction whose data carries {"holdingId", "type": "buy"|"sell", "units", "price" or
+"amount"} moves the matching HOLDING item (sk HOLDING#<pid>#<hid>):
+  data.units          units held
+  data.investedAmount cost basis (average-cost method: sells release avgCost * units)
+  data.avgCost        investedAmount / units
+  version             bumped on every write; each write is conditional on the version read
+  lastTxnSk           sk of the latest transaction applied
+  opening             {units, investedAmount} the holding had before its first transaction
+Each TRANSACTION item also stores `position`, the holding state right after it, so a
+backdated transaction replays only the transactions that sort after it.
+
+Trades logged before snapshots existed (no top-level holdingId) are already counted in the
+client-kept data.units of their holding, so such a holding opens empty and its first
+snapshot replays the whole log instead of adding to data.
+
+The transaction Put and the snapshot Update go through one TransactWriteItems call; a
+concurrent writer fails the version check and the whole step is retried from a fresh read.
+
+Run `python holdings.py verify|rebuild [--user SUB] [--portfolio PID]` to recompute
+snapshots and positions from the log and report (or repair) drift.
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+INCOME_TYPES = ("dividend", "interest", "income")
+TRANSACTION_TYPES = ("buy", "sell") + INCOME_TYPES
+MAX_ATTEMPTS = 4
+TRANSACT_LIMIT = 100  # items per TransactWriteItems
+ZERO = Decimal(0)
+
+
+class InsufficientUnits(ValueError):
+    pass
+
+
+class DuplicateTransaction(Exception):
+    pass
+
+
+class VersionConflict(Exception):
+    pass
+
+
+def to_decimal(v) -> Decimal:
+    """Decimal of a stored or JSON value; missing and unparseable values are 0."""
+    if isinstance(v, Decimal):
+        return v
+    try:
+        return Decimal(str(v)) if v not in (None, "") else ZERO
+    except InvalidOperation:
+        return ZERO
+
+
+def to_dynamo(value):
+    """JSON-decoded value with floats turned into Decimal (boto3 rejects float)."""
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [to_dynamo(v) for v in value]
+    return value
+
+
+def holding_sk(portfolio_id: str, holding_id: str) -> str:
+    return f"HOLDING#{portfolio_id}#{holding_id}"
+
+
+def transaction_prefix(portfolio_id: str) -> str:
+    return f"TRANSACTION#{portfolio_id}#"
+
+
+def parse_txn(data):
+    """(holdingId, type, units, amount) for a position-moving transaction, else None.
+    The type must be given: an entry without one moves nothing."""
+    data = data or {}
+    kind = str(data.get("type") or "").strip().lower()
+    holding_id = data.get("holdingId")
+    units = abs(to_decimal(data.get("units")))
+    if not holding_id or kind not in ("buy", "sell") or units == 0:
+        return None
+    if data.get("amount") not in (None, ""):
+        amount = abs(to_decimal(data.get("amount")))
+    else:
+        amount = units * abs(to_decimal(data.get("price")))
+    return holding_id, kind, units, amount
+
+
+def empty_position():
+    return {"units": ZERO, "investedAmount": ZERO, "avgCost": ZERO}
+
+
+def apply(position, kind, units, amount):
+    """Position after one buy/sell under the average-cost method."""
+    held = to_decimal(position.get("units"))
+    invested = to_decimal(position.get("investedAmount"))
+    if kind == "buy":
+        held += units
+        invested += amount
+    else:
+        if units > held:
+            raise InsufficientUnits(f"Sell of {units} exceeds {held} units held")
+        avg = invested / held if held else ZERO
+        held -= units
+        invested = ZERO if held == 0 else invested - avg * units
+    return {"units": held, "investedAmount": invested, "avgCost": invested / held if held else ZERO}
+
+
+def legacy_trade(item) -> bool:
+    """A buy/sell TRANSACTION written before snapshots existed: record_transaction sets a
+    top-level holdingId on every trade it writes, older rows only have data.holdingId."""
+    return "holdingId" not in item and parse_txn(item.get("data")) is not None
+
+
+def opening_position(holding, legacy_trades=False):
+    # Units the holding had before transactions were tracked: the stored opening, or for a
+    # holding never touched by a transaction, whatever the client saved in data. When the
+    # log has legacy trades for it, data (and any opening stored from it) already counts
+    # them, so the trades replay from an empty position instead
+    if not holding or legacy_trades:
+        return empty_position()
+    src = holding["opening"] if "opening" in holding else (holding.get("data") or {})
+    units = to_decimal(src.get("units"))
+    invested = to_decimal(src.get("investedAmount"))
+    return {"units": units, "investedAmount": invested, "avgCost": invested / units if units else ZERO}
+
+
+def current_position(holding):
+    if not holding or not holding.get("lastTxnSk"):
+        return opening_position(holding)
+    data = holding.get("data") or {}
+    return {"units": to_decimal(data.get("units")), "investedAmount": to_decimal(data.get("investedAmount")),
+            "avgCost": to_decimal(data.get("avgCost"))}
+
+
+def _query(table, **kwargs):
+    start_key = None
+    while True:
+        params = dict(kwargs)
+        if start_key:
+            params["ExclusiveStartKey"] = start_key
+        res = table.query(**params)
+        for it in res.get("Items", []):
+            yield it
+        start_key = res.get("LastEvaluatedKey")
+        if not start_key:
+            return
+
+
+def _holding_txns(table, pk, holding_id, lower, upper, forward=True):
+    from boto3.dynamodb.conditions import Attr, Key
+
+    return _query(
+        table,
+        KeyConditionExpression=Key("pk").eq(pk) & Key("sk").between(lower, upper),
+        # data.holdingId, as rebuild() reads it: rows written before snapshots have no
+        # top-level holdingId
+        FilterExpression=Attr("data.holdingId").eq(holding_id),
+        ScanIndexForward=forward,
+        ConsistentRead=True,
+    )
+
+
+def _position_before(table, pk, portfolio_id, holding_id, sk, holding, legacy_after=False):
+    """(position just before sk, opening it was replayed from or None, [(sk, position)] of
+    the rows replayed). Walks back to the nearest transaction with a stored position (older
+    rows written before snapshots existed have none) and replays forward from it, else from
+    the opening; legacy_after: the transactions from sk on include legacy trades."""
+    pending = []
+    base = None
+    for it in _holding_txns(table, pk, holding_id, transaction_prefix(portfolio_id), sk, forward=False):
+        if it["sk"] >= sk:
+            continue
+        if it.get("position"):
+            base = {k: to_decimal(v) for k, v in it["position"].items()}
+            break
+        pending.append(it)
+    opening = None
+    if base is None:
+        opening = opening_position(holding, legacy_after or any(legacy_trade(it) for it in pending))
+    position = base or opening
+    replayed = []
+    for it in reversed(pending):
+        step = parse_txn(it.get("data"))
+        if step:
+            position = apply(position, *step[1:])
+            replayed.append((it["sk"], position))
+    return position, opening, replayed
+
+
+def _snapshot_update(table_name, pk, sk, holding, position, last_sk, portfolio_id, holding_id, seed, opening=None):
+    now = datetime.utcnow().isoformat()
+    version = int(holding.get("version", 0)) if holding else 0
+    if not holding:
+        item = {
+            "pk": pk, "sk": sk, "entityType": "HOLDING", "portfolioId": portfolio_id, "holdingId": holding_id,
+            "data": {**seed, "id": holding_id, **position}, "version": 1, "lastTxnSk": last_sk,
+            "opening": {"units": ZERO, "investedAmount": ZERO}, "updatedAt": now,
+            "GSI1PK": f"PORTFOLIO#{portfolio_id}", "GSI1SK": f"HOLDING#{holding_id}",
+        }
+        return {"Put": {"TableName": table_name, "Item": item,
+                        "ConditionExpression": "attribute_not_exists(sk)"}}
+    names = {"#d": "data", "#u": "units", "#i": "investedAmount", "#a": "avgCost", "#v": "version"}
+    values = {":u": position["units"], ":i": position["investedAmount"], ":a": position["avgCost"],
+              ":nv": version + 1, ":sk": last_sk, ":now": now}
+    sets = "#d.#u = :u, #d.#i = :i, #d.#a = :a, #v = :nv, lastTxnSk = :sk, updatedAt = :now"
+    if opening is not None or "opening" not in holding:
+        # A replay from the opening also corrects one stored before legacy trades counted
+        open_pos = opening or opening_position(holding)
+        sets += ", opening = :o"
+        values[":o"] = {"units": open_pos["units"], "investedAmount": open_pos["investedAmount"]}
+    if version:
+        condition = "#v = :v"
+        values[":v"] = version
+    else:
+        condition = "attribute_exists(sk) AND attribute_not_exists(#v)"
+    return {"Update": {
+        "TableName": table_name,
+        "Key": {"pk": pk, "sk": sk},
+        "UpdateExpression": "SET " + sets,
+        "ConditionExpression": condition,
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+    }}
+
+
+def _position_update(table_name, pk, sk, position):
+    return {"Update": {
+        "TableName": table_name,
+        "Key": {"pk": pk, "sk": sk},
+        "UpdateExpression": "SET #p = :p",
+        "ConditionExpression": "attribute_exists(sk)",
+        "ExpressionAttributeNames": {"#p": "position"},
+        "ExpressionAttributeValues": {":p": position},
+    }}
+
+
+def cancellation_codes(e):
+    """Per-item CancellationReasons codes of a TransactionCanceledException, else []."""
+    return [r.get("Code") for r in (getattr(e, "response", None) or {}).get("CancellationReasons", [])]
+
+
+def record_transaction(table, item):
+    """Write a TRANSACTION item and move its HOLDING snapshot in one transaction.
+
+    `item` is the full TRANSACTION item (pk, sk, portfolioId, data, ...). Returns the
+    snapshot position after the write. Raises InsufficientUnits when a sell would take
+    the holding negative, DuplicateTransaction when the sk already exists and
+    VersionConflict when concurrent writers keep winning."""
+    parsed = parse_txn(item.get("data"))
+    pk, sk, portfolio_id = item["pk"], item["sk"], item["portfolioId"]
+    holding_id, kind, units, amount = parsed
+    h_sk = holding_sk(portfolio_id, holding_id)
+    client = table.meta.client
+    for attempt in range(MAX_ATTEMPTS):
+        holding = table.get_item(Key={"pk": pk, "sk": h_sk}, ConsistentRead=True).get("Item")
+        last_sk = (holding or {}).get("lastTxnSk")
+        # (sk, position) of other transactions whose stored position the replay rewrites
+        later = []
+        opening = None
+        if last_sk and sk > last_sk:
+            position = apply(current_position(holding), kind, units, amount)
+            final = position
+        else:
+            # Backdated, or the holding's first snapshot (legacy trades may already be logged
+            # for it): rebuild from the position just before it, then replay what sorts after
+            upper = transaction_prefix(portfolio_id) + "~"
+            after = [t for t in _holding_txns(table, pk, holding_id, sk, upper) if parse_txn(t.get("data"))]
+            if after and after[0]["sk"] == sk:
+                raise DuplicateTransaction(sk)
+            before, opening, later = _position_before(table, pk, portfolio_id, holding_id, sk, holding,
+                                                      any(legacy_trade(t) for t in after))
+            position = apply(before, kind, units, amount)
+            final = position
+            for t in after:
+                final = apply(final, *parse_txn(t["data"])[1:])
+                later.append((t["sk"], final))
+        seed = {k: v for k, v in (item.get("data") or {}).items() if k in ("name", "symbol", "instrumentClass")}
+        ops = [
+            {"Put": {"TableName": table.name, "Item": {**item, "holdingId": holding_id, "position": position},
+                     "ConditionExpression": "attribute_not_exists(sk)"}},
+            _snapshot_update(table.name, pk, h_sk, holding, final, max([sk, last_sk or ""] + [t for t, _ in later]),
+                             portfolio_id, holding_id, seed, opening),
+        ]
+        inline = later[:TRANSACT_LIMIT - len(ops)]
+        ops += [_position_update(table.name, pk, t_sk, pos) for t_sk, pos in inline]
+        try:
+            client.transact_write_items(TransactItems=ops)
+        except Exception as e:
+            codes = cancellation_codes(e)
+            if not codes:
+                raise
+            if codes[0] == "ConditionalCheckFailed":
+                raise DuplicateTransaction(sk)
+            if "ConditionalCheckFailed" in codes[1:] or "TransactionConflict" in codes:
+                time.sleep(0.02 * (2 ** attempt))
+                continue
+            raise
+        # Positions past the transaction size limit are derived data; a failure here only
+        # affects later backdated inserts and is repaired by `holdings.py rebuild`
+        for t_sk, pos in later[len(inline):]:
+            try:
+                table.update_item(Key={"pk": pk, "sk": t_sk}, UpdateExpression="SET #p = :p",
+                                  ExpressionAttributeNames={"#p": "position"}, ExpressionAttributeValues={":p": pos})
+            except Exception as e:
+                print("HOLDING_POSITION_ERROR", t_sk, str(e))
+        return final
+    raise VersionConflict(h_sk)
+
+
+def _scan_investments(table, user_sub=None):
+    from boto3.dynamodb.conditions import Attr, Key
+
+    entity = Attr("entityType").is_in(["HOLDING", "TRANSACTION"])
+    if user_sub:
+        return _query(table, KeyConditionExpression=Key("pk").eq(f"USER#{user_sub}"), FilterExpression=entity)
+
+    def scan():
+        start_key = None
+        while True:
+            params = {"FilterExpression": entity}
+            if start_key:
+                params["ExclusiveStartKey"] = start_key
+            res = table.scan(**params)
+            yield from res.get("Items", [])
+            start_key = res.get("LastEvaluatedKey")
+            if not start_key:
+                return
+    return scan()
+
+
+def _same(a, b):
+    return all(to_decimal(a.get(k)) == to_decimal(b.get(k)) for k in ("units", "investedAmount", "avgCost"))
+
+
+def rebuild(table, user_sub=None, portfolio_id=None, dry_run=False):
+    """Replay every holding's transactions from its opening position, compare with the
+    stored snapshot and per-transaction positions, and (unless dry_run) rewrite drift."""
+    holdings = {}
+    txns = {}
+    for it in _scan_investments(table, user_sub):
+        if portfolio_id and it.get("portfolioId") != portfolio_id:
+            continue
+        if it.get("entityType") == "HOLDING":
+            holdings[(it["pk"], it["sk"])] = it
+        elif parse_txn(it.get("data")):
+            h_sk = holding_sk(it["portfolioId"], parse_txn(it["data"])[0])
+            txns.setdefault((it["pk"], h_sk), []).append(it)
+
+    drift = []
+    errors = []
+    rows = 0
+    for key in sorted(txns):
+        pk, h_sk = key
+        holding = holdings.get(key)
+        open_pos = opening_position(holding, any(legacy_trade(t) for t in txns[key]))
+        position = open_pos
+        fixes = []
+        try:
+            for t in sorted(txns[key], key=lambda t: t["sk"]):
+                rows += 1
+                position = apply(position, *parse_txn(t["data"])[1:])
+                if not _same(t.get("position") or {}, position):
+                    fixes.append((t["sk"], position))
+        except InsufficientUnits as e:
+            errors.append({"pk": pk, "holding": h_sk, "error": str(e)})
+            continue
+        stored = current_position(holding) if holding and holding.get("lastTxnSk") else None
+        if stored is None or not _same(stored, position) or fixes:
+            drift.append({
+                "pk": pk, "holding": h_sk, "transactionsToFix": len(fixes),
+                "expected": {k: str(v) for k, v in position.items()},
+                "actual": {k: str(v) for k, v in stored.items()} if stored else None,
+            })
+        if dry_run or (stored is not None and _same(stored, position) and not fixes):
+            continue
+        for t_sk, pos in fixes:
+            table.update_item(Key={"pk": pk, "sk": t_sk}, UpdateExpression="SET #p = :p",
+                              ExpressionAttributeNames={"#p": "position"}, ExpressionAttributeValues={":p": pos})
+        if holding:
+            table.update_item(
+                Key={"pk": pk, "sk": h_sk},
+                UpdateExpression="SET #d.#u = :u, #d.#i = :i, #d.#a = :a, lastTxnSk = :sk, opening = :o, "
+                                 "updatedAt = :now ADD #v :one",
+                ExpressionAttributeNames={"#d": "data", "#u": "units", "#i": "investedAmount", "#a": "avgCost",
+                                          "#v": "version"},
+                ExpressionAttributeValues={
+                    ":u": position["units"], ":i": position["investedAmount"], ":a": position["avgCost"],
+                    ":sk": max(t["sk"] for t in txns[key]), ":now": datetime.utcnow().isoformat(), ":one": 1,
+                    ":o": {"units": open_pos["units"], "investedAmount": open_pos["investedAmount"]},
+                },
+            )
+    return {"transactions": rows, "holdings": len(txns), "drifted": len(drift), "drift": drift,
+            "errors": errors, "dryRun": dry_run}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HOLDING snapshot maintenance")
+    parser.add_argument("cmd", choices=["verify", "rebuild"], help="verify = report drift only")
+    parser.add_argument("--user", help="limit to one user sub (query instead of full scan)")
+    parser.add_argument("--portfolio", help="limit to one portfolioId")
+    args = parser.parse_args(argv)
+
+    import boto3
+
+    region = os.environ.get("AWS_REGION") or os.environ.get("REGION") or "us-east-1"
+    dynamodb = boto3.resource("dynamodb", region_name=region, endpoint_url=os.environ.get("DYNAMODB_ENDPOINT_URL") or None)
+    report = rebuild(dynamodb.Table(os.environ.get("INVEST_TABLE", "InvestApp")), args.user, args.portfolio,
+                     dry_run=args.cmd == "verify")
+    print(json.dumps(report, indent=2))
+    return 1 if (report["drift"] or report["errors"]) and args.cmd == "verify" else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,252 @@
+"""Streaming bulk import of CSV / bank-statement exports into the Expenses table.
+
+    python importer.py --user USER_ID statement.csv
+    python importer.py --user USER_ID s3://bucket/exports/2024.csv \
+        --map date="Txn Date" --map amount="Withdrawal Amt." --map text=Narration --date-format %d/%m/%y
+
+Rows are read one at a time (local file or S3-compatible object; set S3_ENDPOINT_URL for
+non-AWS stores), categorized with the same synonym/rule logic as POST /add (no AI calls),
+and written with batch_writer in 25-item batches. Expense ids are derived from a hash of
+the row, so re-importing the same file skips rows that already exist, and only newly
+written rows are added to the rollups.
+
+Only debits are imported: rows with a negative amount (or a positive one with
+--debits-negative), a "Cr" marker in the amount or a Dr/Cr column, or a value only in the
+credit column are counted as credits and skipped.
+"""
+import argparse
+import codecs
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+import index
+import rollups
+
+# Currency words and symbols around statement amounts ("Rs. 500", "INR 1,200.00", "₹500")
+_CURRENCY = re.compile(r"(?:\b(?:rs|inr|usd|eur|gbp)\b\.?|[₹$€£])", re.IGNORECASE)
+CHUNK_SIZE = 100  # rows checked for existing ids per BatchGetItem; written as 4 x 25
+IMPORT_NAMESPACE = uuid.UUID("8f0c6a52-3c1e-4b8e-9a57-1d0f3b9e6c21")
+
+DEFAULT_COLUMNS = {
+    "date": ["date", "txn date", "transaction date", "value date", "posting date"],
+    "amount": ["amount", "debit", "withdrawal amt.", "withdrawal", "debit amount"],
+    "text": ["rawtext", "description", "narration", "details", "particulars", "text", "merchant"],
+    "category": ["category"],
+    "credit": ["credit", "deposit amt.", "deposit", "credit amount"],
+    "direction": ["dr/cr", "cr/dr", "debit/credit"],
+}
+
+
+def open_lines(path: str):
+    """Text stream over a local path or s3://bucket/key, decoded incrementally."""
+    if path.startswith("s3://"):
+        import boto3
+
+        bucket, _, key = path[len("s3://"):].partition("/")
+        s3 = boto3.client("s3", endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None)
+        body = s3.get_object(Bucket=bucket, Key=key)["Body"]
+        return codecs.getreader("utf-8-sig")(body)
+    return open(path, encoding="utf-8-sig", newline="")
+
+
+def resolve_columns(header, overrides):
+    lower = {h.strip().lower(): h for h in header if h}
+    cols = {}
+    for field, candidates in DEFAULT_COLUMNS.items():
+        if field in overrides:
+            if overrides[field] not in header:
+                raise SystemExit(f"Column {overrides[field]!r} for {field} not in header {header}")
+            cols[field] = overrides[field]
+            continue
+        cols[field] = next((lower[c] for c in candidates if c in lower), None)
+    if cols.get("credit") == cols["amount"]:
+        cols["credit"] = None
+    missing = [f for f in ("date", "amount", "text") if not cols.get(f)]
+    if missing:
+        raise SystemExit(f"Could not map columns {missing}; pass --map FIELD=COLUMN")
+    return cols
+
+
+def parse_amount(value, debits_negative=False):
+    """Positive debit amount of a cell, else None."""
+    amount = signed_amount(value)
+    if amount is None:
+        return None
+    amount = -amount if debits_negative else amount
+    return amount if amount > 0 else None
+
+
+def signed_amount(value):
+    text = str(value or "").strip()
+    # Currency marks first: "Rs. 500" must not leave the "." of "Rs." in front of 500
+    cleaned = re.sub(r"[^\d.\-]", "", _CURRENCY.sub("", text))
+    if not cleaned:
+        return None
+    try:
+        amount = Decimal(cleaned)
+    except InvalidOperation:
+        return None
+    # "(1,200.00)" and "1,200.00 Cr" are credits in most statement exports
+    if text.startswith("(") or re.search(r"\bcr\.?$", text, flags=re.IGNORECASE):
+        amount = -abs(amount)
+    return amount
+
+
+def is_credit(raw, cols, debits_negative=False):
+    if cols.get("direction") and str(raw.get(cols["direction"]) or "").strip().lower().startswith("cr"):
+        return True
+    amount = signed_amount(raw.get(cols["amount"]))
+    if amount is not None and amount != 0:
+        return (amount > 0) if debits_negative else (amount < 0)
+    # Separate withdrawal / deposit columns: only the deposit side is filled
+    credit = signed_amount(raw.get(cols["credit"])) if cols.get("credit") else None
+    return bool(credit)
+
+
+def parse_date(value, date_format=None):
+    value = str(value or "").strip()
+    formats = [date_format] if date_format else ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d %b %Y", "%m/%d/%Y"]
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def expense_id_for(user_id, date, amount, text, occurrence):
+    # Identical rows in one file (two coffees, same day) stay distinct via their occurrence number
+    digest = hashlib.sha256(f"{user_id}|{date}|{amount}|{' '.join(text.lower().split())}|{occurrence}".encode("utf-8"))
+    return str(uuid.uuid5(IMPORT_NAMESPACE, digest.hexdigest()))
+
+
+def categorize(rows):
+    """Fill row["category"] in place: explicit column, else the same synonym / rule / local
+    classifier stages as POST /add/batch, else Other."""
+    pending = [row for row in rows if not row.get("category")]
+    for row, local in zip(pending, index.categorize_local([row["rawText"] for row in pending])):
+        row["category"] = local["category"] or "Other"
+
+
+def existing_ids(ids):
+    found = set()
+    table = index.table(index.EXPENSES_TABLE)
+    request = {table.name: {"Keys": [{"expenseId": i} for i in ids], "ProjectionExpression": "expenseId"}}
+    for attempt in range(8):
+        res = table.meta.client.batch_get_item(RequestItems=request)
+        found.update(it["expenseId"] for it in res.get("Responses", {}).get(table.name, []))
+        request = res.get("UnprocessedKeys") or None
+        if not request:
+            return found
+        time.sleep(0.05 * (2 ** attempt))
+    raise RuntimeError("BatchGetItem kept returning UnprocessedKeys")
+
+
+def write_chunk(rows, dry_run=False):
+    """Write rows whose ids are not already stored; returns the number written."""
+    present = existing_ids([r["expenseId"] for r in rows])
+    new = [r for r in rows if r["expenseId"] not in present]
+    if not new or dry_run:
+        return len(new)
+    categorize(new)
+    now = datetime.utcnow().isoformat()
+    # batch_writer flushes every 25 puts and resubmits UnprocessedItems itself
+    with index.table(index.EXPENSES_TABLE).batch_writer() as batch:
+        for r in new:
+            batch.put_item(Item={**r, "createdAt": now, "source": "import"})
+    try:
+        rollups.record_many(index.table(index.ROLLUPS_TABLE), new)
+    except Exception as e:
+        print("ROLLUP_ERROR import", str(e))
+    return len(new)
+
+
+def run_import(path, user_id, overrides=None, date_format=None, dry_run=False, progress_every=5000,
+               debits_negative=False):
+    stats = {"rows": 0, "written": 0, "duplicates": 0, "skipped": 0, "credits": 0}
+    # Occurrence numbers of identical rows only need to be unique within a date. Statements
+    # are date-ordered, so the counter covers the current date's run of rows; a date that
+    # comes back after another one starts a new block, numbered apart from the first, so
+    # memory is one small int per distinct date rather than per row.
+    seen, current_date, blocks = {}, None, {}
+    chunk = []
+    started = time.perf_counter()
+
+    def flush():
+        written = write_chunk(chunk, dry_run)
+        stats["written"] += written
+        stats["duplicates"] += len(chunk) - written
+        chunk.clear()
+
+    with open_lines(path) as fh:
+        reader = csv.DictReader(fh)
+        cols = resolve_columns(reader.fieldnames or [], overrides or {})
+        for raw in reader:
+            stats["rows"] += 1
+            if is_credit(raw, cols, debits_negative):
+                stats["credits"] += 1
+                continue
+            amount = parse_amount(raw.get(cols["amount"]), debits_negative)
+            date = parse_date(raw.get(cols["date"]), date_format)
+            text = " ".join(str(raw.get(cols["text"]) or "").split())
+            if amount is None or date is None or not text:
+                stats["skipped"] += 1
+                continue
+            if date != current_date:
+                seen.clear()
+                current_date = date
+                blocks[date] = blocks.get(date, -1) + 1
+            sig = hashlib.blake2b(f"{amount}|{text.lower()}".encode("utf-8"), digest_size=8).digest()
+            n = seen.get(sig, 0)
+            seen[sig] = n + 1
+            occurrence = n if blocks[date] == 0 else f"{blocks[date]}.{n}"
+            row = {
+                "expenseId": expense_id_for(user_id, date, amount, text, occurrence),
+                "userId": user_id,
+                "amount": amount,
+                "rawText": text,
+                "date": date,
+            }
+            category = index.allowed_category(raw.get(cols["category"])) if cols.get("category") else None
+            if category:
+                row["category"] = category
+            chunk.append(row)
+            if len(chunk) >= CHUNK_SIZE:
+                flush()
+            if progress_every and stats["rows"] % progress_every == 0:
+                elapsed = time.perf_counter() - started
+                print("IMPORT_PROGRESS", json.dumps({**stats, "rowsPerSec": round(stats["rows"] / elapsed, 1)}))
+        if chunk:
+            flush()
+    elapsed = time.perf_counter() - started
+    return {**stats, "seconds": round(elapsed, 2), "rowsPerSec": round(stats["rows"] / elapsed, 1) if elapsed else None,
+            "dryRun": dry_run}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a CSV / bank statement into Expenses")
+    parser.add_argument("path", help="local file or s3://bucket/key")
+    parser.add_argument("--user", required=True, help="userId to import for")
+    parser.add_argument("--map", action="append", default=[], metavar="FIELD=COLUMN",
+                        help="column mapping for date, amount, text or category")
+    parser.add_argument("--date-format", help="strptime format of the date column")
+    parser.add_argument("--debits-negative", action="store_true",
+                        help="the amount column is signed with debits negative (credits positive)")
+    parser.add_argument("--dry-run", action="store_true", help="parse and de-duplicate without writing")
+    parser.add_argument("--progress-every", type=int, default=5000)
+    args = parser.parse_args(argv)
+    overrides = dict(m.split("=", 1) for m in args.map)
+    report = run_import(args.path, args.user, overrides, args.date_format, args.dry_run, args.progress_every,
+                        args.debits_negative)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,136 @@
+import base64
+import hashlib
 import json
 import os
 import re
+import time
 import uuid
 from datetime import datetime
-from urllib import request as urlrequest
-from urllib.error import HTTPError, URLError
 
-import boto3
-from boto3.dynamodb.conditions import Key
 from decimal import Decimal
 
+import codec
+import expense_text
+import holdings
+import metrics
+import pipeline
+import portfolio
+import rollups
+import text_classifier
+from ai_cache import CategorizationCache
+from keyword_matcher import KeywordMatcher
+from rule_index import CachedRuleIndex
+from rule_learning import RuleLearner
+
 AWS_REGION = os.environ.get("AWS_REGION") or os.environ.get("REGION") or "us-east-1"
 EXPENSES_TABLE = os.environ.get("EXPENSES_TABLE", "Expenses")
 CATEGORY_RULES_TABLE = os.environ.get("CATEGORY_RULES_TABLE", "CategoryRules")
 USER_BUDGETS_TABLE = os.environ.get("USER_BUDGETS_TABLE", "UserBudgets")
 GROQ_API_KEY = (os.environ.get("GROQ_API_KEY") or "").strip()
 GROQ_MODEL = os.environ.get("GROQ_MODEL", "llama-3.1-70b-versatile")
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL", "https://api.groq.com")
+GROQ_CONNECT_TIMEOUT = float(os.environ.get("GROQ_CONNECT_TIMEOUT", "2"))
+GROQ_READ_TIMEOUT = float(os.environ.get("GROQ_READ_TIMEOUT", "8"))
+GROQ_MAX_RETRIES = int(os.environ.get("GROQ_MAX_RETRIES", "2"))
+GROQ_BREAKER_THRESHOLD = int(os.environ.get("GROQ_BREAKER_THRESHOLD", "5"))
+GROQ_BREAKER_COOLDOWN = float(os.environ.get("GROQ_BREAKER_COOLDOWN", "30"))
 INVEST_TABLE = os.environ.get("INVEST_TABLE", "InvestApp")
+AI_CACHE_TABLE = os.environ.get("AI_CACHE_TABLE", "")
+AI_CACHE_MAX_ENTRIES = int(os.environ.get("AI_CACHE_MAX_ENTRIES", "2048"))
+AI_CACHE_TTL_SECONDS = float(os.environ.get("AI_CACHE_TTL_SECONDS", "3600"))
+AI_CACHE_SHARED_TTL_SECONDS = int(os.environ.get("AI_CACHE_SHARED_TTL_SECONDS", str(30 * 86400)))
+AI_CACHE_NEGATIVE_TTL_SECONDS = float(os.environ.get("AI_CACHE_NEGATIVE_TTL_SECONDS", "60"))
+ROLLUPS_TABLE = os.environ.get("ROLLUPS_TABLE", "ExpenseRollups")
+MERCHANT_KEYWORDS_FILE = os.environ.get("MERCHANT_KEYWORDS_FILE", "")
+CATEGORY_MODEL_FILE = os.environ.get(
+    "CATEGORY_MODEL_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "category_model.bin"))
+CATEGORY_MODEL_MIN_CONFIDENCE = float(os.environ.get("CATEGORY_MODEL_MIN_CONFIDENCE", "0.8"))
+# Keep well inside the function timeout (terraform/lambda_api.tf)
+CATEGORIZE_BUDGET_MS = float(os.environ.get("CATEGORIZE_BUDGET_MS", "1500"))
+# Start Groq alongside the rule lookups when they cannot answer; off by default because a
+# call the request does not wait for still runs (and is billed) on a pool thread
+CATEGORIZE_SPECULATE_AI = os.environ.get("CATEGORIZE_SPECULATE_AI", "0") == "1"
+CATEGORIZE_WORKERS = int(os.environ.get("CATEGORIZE_WORKERS", "8"))
+RULE_INDEX_TTL_SECONDS = float(os.environ.get("RULE_INDEX_TTL_SECONDS", "300"))
+RULE_FLUSH_SECONDS = float(os.environ.get("RULE_FLUSH_SECONDS", "30"))
+RULE_FLUSH_MAX = int(os.environ.get("RULE_FLUSH_MAX", "100"))
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "500"))
+AI_BATCH_SIZE = int(os.environ.get("AI_BATCH_SIZE", "25"))
+AI_BATCH_WORKERS = int(os.environ.get("AI_BATCH_WORKERS", "4"))
+EXPENSES_USER_DATE_INDEX = "userId-date-index"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+DYNAMODB_ENDPOINT_URL = os.environ.get("DYNAMODB_ENDPOINT_URL") or None
+
+# boto3 costs ~150-300 ms to import and the resource/Table objects a few ms more, so both
+# are built on first use (OPTIONS preflights never touch them) and memoized per container.
+_dynamodb = None
+_tables = {}
+
+
+def _ddb():
+    global _dynamodb
+    if _dynamodb is None:
+        import boto3
+
+        _dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION, endpoint_url=DYNAMODB_ENDPOINT_URL)
+        metrics.instrument_dynamodb(_dynamodb.meta.client)
+    return _dynamodb
+
+
+def _table(name: str):
+    table = _tables.get(name)
+    if table is None:
+        table = _tables[name] = _ddb().Table(name)
+    return table
+
+
+def table(name: str):
+    """The memoized DynamoDB Table for scripts that share this module's connection setup
+    (importer, exporter, rebuild jobs)."""
+    return _table(name)
+
+
+# Loaded on the first fuzzy-rule lookup of a warm container, then rebuilt in the background
+# once the TTL lapses while the stale copy keeps answering
+rule_index = CachedRuleIndex(lambda: _table(CATEGORY_RULES_TABLE), ttl=RULE_INDEX_TTL_SECONDS)
+# New rules are written before the response; hit counts are coalesced and flushed off the request path
+rule_learner = RuleLearner(
+    lambda: _table(CATEGORY_RULES_TABLE),
+    known=rule_index.peek,
+    on_new=rule_index.learn,
+    flush_seconds=RULE_FLUSH_SECONDS,
+    flush_max=RULE_FLUSH_MAX,
+)
+# POST /add lookups overlap on this pool; stage times and winners go to the metrics record
+categorize_pipeline = pipeline.Pipeline("Categorize", workers=CATEGORIZE_WORKERS)
+_groq_client = None
+
+
+def _groq():
+    # Built on the first AI fallback (http.client/ssl are not imported before that), then kept
+    # at module scope so warm invocations reuse pooled keep-alive connections and breaker state
+    global _groq_client
+    if _groq_client is None:
+        from groq_client import CircuitBreaker, GroqClient
+
+        _groq_client = GroqClient(
+            GROQ_BASE_URL,
+            connect_timeout=GROQ_CONNECT_TIMEOUT,
+            read_timeout=GROQ_READ_TIMEOUT,
+            max_retries=GROQ_MAX_RETRIES,
+            breaker=CircuitBreaker(GROQ_BREAKER_THRESHOLD, GROQ_BREAKER_COOLDOWN),
+        )
+    return _groq_client
 
-dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION)
-expenses_table = dynamodb.Table(EXPENSES_TABLE)
-category_rules_table = dynamodb.Table(CATEGORY_RULES_TABLE)
-user_budgets_table = dynamodb.Table(USER_BUDGETS_TABLE)
-invest_table = dynamodb.Table(INVEST_TABLE)
+ai_cache = CategorizationCache(
+    lambda: _table(AI_CACHE_TABLE) if AI_CACHE_TABLE else None,
+    maxsize=AI_CACHE_MAX_ENTRIES,
+    ttl=AI_CACHE_TTL_SECONDS,
+    shared_ttl=AI_CACHE_SHARED_TTL_SECONDS,
+    negative_ttl=AI_CACHE_NEGATIVE_TTL_SECONDS,
+)
 
 
 def _cors_headers():
@@ -35,13 +143,111 @@ def _cors_headers():
 
 
 def _response(status, body):
-    return {"statusCode": status, "headers": _cors_headers(), "body": json.dumps(body, default=_to_json)}
+    return {"statusCode": status, "headers": _cors_headers(), "body": codec.dumps(body)}
 
 
-def _to_json(o):
-    if isinstance(o, Decimal):
-        return float(o)
-    return o
+def _etag_response(request_headers, body):
+    """200 carrying an ETag over the serialized body, or a bodiless 304 when the client's
+    If-None-Match already names that ETag (the query still runs; the transfer is saved)."""
+    payload = codec.dumps(body, sort_keys=True)
+    tag = '"' + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32] + '"'
+    headers = {**_cors_headers(), "etag": tag, "cache-control": "private, no-cache",
+               "access-control-expose-headers": "etag"}
+    sent = (request_headers or {}).get("if-none-match") or ""
+    candidates = {t.strip().removeprefix("W/") for t in sent.split(",") if t.strip()}
+    if tag in candidates or "*" in candidates:
+        return {"statusCode": 304, "headers": headers, "body": ""}
+    return {"statusCode": 200, "headers": headers, "body": payload}
+
+
+def _encode_cursor(last_key):
+    # Opaque, URL-safe token wrapping DynamoDB's LastEvaluatedKey
+    if not last_key:
+        return None
+    raw = codec.dumps(last_key, sort_keys=True)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor, expected=None):
+    """Decode a cursor from _encode_cursor; raises ValueError if malformed or if any
+    key attribute in `expected` does not match (so a cursor cannot hop to another user)."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, dict) or not key:
+        raise ValueError("Invalid cursor")
+    for k, v in (expected or {}).items():
+        if key.get(k) != v:
+            raise ValueError("Invalid cursor")
+    return key
+
+
+def _page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(maximum, n))
+
+
+def _query_page(table, limit, cursor_key=None, **kwargs):
+    """Run a Query and keep following LastEvaluatedKey until `limit` items are collected
+    (FilterExpression may leave pages short) or the key range is exhausted.
+    Returns (items, last_key) where last_key resumes right after the last returned item."""
+    items = []
+    start_key = cursor_key
+    while True:
+        params = dict(kwargs, Limit=limit - len(items))
+        if start_key:
+            params["ExclusiveStartKey"] = start_key
+        res = table.query(**params)
+        items.extend(res.get("Items", []))
+        start_key = res.get("LastEvaluatedKey")
+        if not start_key or len(items) >= limit:
+            return items, start_key
+
+
+def _query_all(table, **kwargs):
+    # Generator over every item in a key range, one DynamoDB page at a time
+    start_key = None
+    while True:
+        params = dict(kwargs)
+        if start_key:
+            params["ExclusiveStartKey"] = start_key
+        res = table.query(**params)
+        for it in res.get("Items", []):
+            yield it
+        start_key = res.get("LastEvaluatedKey")
+        if not start_key:
+            return
+
+
+def _update_rollups(fn, *items):
+    # Rollups trail the Expenses write; a failure here is logged and repaired by `rollups.py rebuild`
+    try:
+        fn(_table(ROLLUPS_TABLE), *items)
+    except Exception as e:
+        print("ROLLUP_ERROR", fn.__name__, str(e))
+
+
+def _expense_key_condition(user_id, start=None, end=None, month=None):
+    # Push the date window into the userId-date-index sort key instead of filtering in Python
+    from boto3.dynamodb.conditions import Key
+
+    cond = Key("userId").eq(user_id)
+    if month:
+        return cond & Key("date").begins_with(month)
+    if start and end:
+        return cond & Key("date").between(start, end)
+    if start:
+        return cond & Key("date").gte(start)
+    if end:
+        return cond & Key("date").lte(end)
+    return cond
 
 
 ALLOWED_CATEGORIES = [
@@ -65,560 +271,1295 @@ ALLOWED_CATEGORIES = [
 ]
 
 
-def _get_category_from_ai(raw_text: str):
+# Fixed categories (predefined rules)
+SYNONYMS = {
+    # Food
+    "groceries": "Food", "grocery": "Food", "restaurant": "Food", "dining": "Food",
+    "lunch": "Food", "dinner": "Food", "pizza": "Food", "breakfast": "Food",
+    "snacks": "Food", "coffee": "Food", "swiggy": "Food", "zomato": "Food",
+    "ubereats": "Food",
+
+    # Travel
+    "travel": "Travel", "transport": "Travel", "taxi": "Travel", "uber": "Travel",
+    "ola": "Travel", "bus": "Travel", "train": "Travel", "flight": "Travel",
+    "airline": "Travel", "fuel": "Travel", "petrol": "Travel", "gas": "Travel",
+
+    # Entertainment (experiences & gaming, NOT subscriptions)
+    "entertainment": "Entertainment", "cinema": "Entertainment", "movie": "Entertainment",
+    "movies": "Entertainment", "theatre": "Entertainment", "outing": "Entertainment",
+    "playstation": "Entertainment", "xbox": "Entertainment", "gaming": "Entertainment",
+
+    # Shopping
+    "shopping": "Shopping", "amazon": "Shopping", "flipkart": "Shopping", "myntra": "Shopping",
+    "apparel": "Shopping", "clothing": "Shopping", "mall": "Shopping", "electronics": "Shopping",
+    "gadget": "Shopping", "laptop": "Shopping", "mobile": "Shopping",
+
+    # Utilities
+    "utilities": "Utilities", "electricity": "Utilities", "water": "Utilities", "internet": "Utilities",
+    "broadband": "Utilities", "jio": "Utilities", "airtel": "Utilities", "bsnl": "Utilities",
+    "bill": "Utilities", "phone": "Utilities", "gas bill": "Utilities",
+
+    # Healthcare
+    "health": "Healthcare", "healthcare": "Healthcare", "medicine": "Healthcare",
+    "hospital": "Healthcare", "doctor": "Healthcare", "pharmacy": "Healthcare",
+    "apollo": "Healthcare", "pharmeasy": "Healthcare", "practo": "Healthcare",
+
+    # Subscription (recurring digital services)
+    "netflix": "Subscription", "spotify": "Subscription", "prime": "Subscription",
+    "disney": "Subscription", "hotstar": "Subscription", "sunnxt": "Subscription",
+    "membership": "Subscription", "subscription": "Subscription", "zee5": "Subscription",
+    "apple music": "Subscription", "youtube premium": "Subscription",
+}
+
+
+def _load_merchant_keywords(path):
+    # Optional JSON {"keyword": "Category"} bundled with the function to extend SYNONYMS
+    if not path:
+        return {}
+    try:
+        with open(path, encoding="utf-8") as fh:
+            data = json.load(fh) or {}
+        return {str(k): v for k, v in data.items() if v in ALLOWED_CATEGORIES}
+    except Exception as e:
+        print("MERCHANT_KEYWORDS_LOAD_ERROR", path, str(e))
+        return {}
+
+
+# Compiled once per container; one pass over the input finds every keyword hit
+synonym_matcher = KeywordMatcher({**_load_merchant_keywords(MERCHANT_KEYWORDS_FILE), **SYNONYMS})
+
+# Offline-trained classifier (python text_classifier.py train); None when no model is bundled
+category_model = text_classifier.load(CATEGORY_MODEL_FILE)
+
+
+def _model_guess(raw_text):
+    """(category, confidence) from the local classifier, or None."""
+    if category_model is None:
+        return None
+    guess = category_model.predict(raw_text)
+    return guess if guess and allowed_category(guess[0]) else None
+
+
+def _exact_rule(term):
+    """Category of the CategoryRules rule `term`. A rule's category is fixed by its first
+    writer, so a hit in the loaded rule index saves the get_item."""
+    known = rule_index.peek(term)
+    if known:
+        return known
+    r = _table(CATEGORY_RULES_TABLE).get_item(Key={"rule": term})
+    return (r.get("Item", {}) or {}).get("category") or None
+
+
+def _rule_index_lookup(term):
+    # Never waits for a scan: until the first load finishes (in the background) this misses
+    index = rule_index.get(wait=False)
+    return index.lookup(term) if index is not None else None
+
+
+def _rule_hit_unlikely(term):
+    """True when no rule can answer: no term, or the loaded rule index (not loaded here) has
+    neither an exact nor a token match, so Groq is worth starting alongside the lookups."""
+    if not term:
+        return True
+    idx = rule_index.loaded()
+    if idx is None:
+        return False
+    return idx.get(term) is None and (len(term.split()) < 2 or not idx.lookup(term))
+
+
+def _groq_chat(system_prompt: str, user_content: str, read_timeout=None, deadline=None):
+    """POST one chat completion to Groq. Returns (content_text, error) where error is None
+    on success or a short reason string (http_<code>, timeout, connection, circuit_open).
+    `deadline` (time.monotonic()) caps the connect and read timeouts at the time left."""
+    payload = {
+        "model": GROQ_MODEL,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content},
+        ],
+        "temperature": 0,
+    }
+    headers = {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        # Cloudflare 1010 is often due to missing headers/UA
+        "User-Agent": "finsight-lambda/1.0 (+https://github.com/arunclementcristiano/finsight)",
+    }
+    client = _groq()
+    from groq_client import UpstreamError
+
+    try:
+        with metrics.timed("Groq"):
+            data = client.post_json("/openai/v1/chat/completions", payload, headers, read_timeout=read_timeout,
+                                    deadline=deadline)
+    except UpstreamError as ue:
+        print("GROQ_UPSTREAM_ERROR", ue.reason, (ue.body or "")[:500])
+        return "", ue.reason
+    except Exception as e:
+        print("GROQ_ERROR", str(e))
+        return "", "exception"
+    txt = (
+        (data.get("choices") or [{}])[0].get("message", {}).get("content", "")
+        if isinstance(data, dict)
+        else ""
+    )
+    return txt, None
+
+
+def _get_category_from_ai(raw_text: str, read_timeout=None, deadline=None):
     if not GROQ_API_KEY:
         print("GROQ_API_KEY missing")
         return {"category": "", "confidence": 0.0}
+    system_prompt = (
+        "You are a financial expense categorizer. Allowed categories: " + ", ".join(ALLOWED_CATEGORIES) + ". "
+        "Given a user input, respond ONLY as JSON: {\"category\": one of the allowed, \"confidence\": number 0..1}."
+    )
+    txt, error = _groq_chat(system_prompt, raw_text, read_timeout=read_timeout, deadline=deadline)
+    if error:
+        return {"category": "", "confidence": 0.0, "error": error}
     try:
-        system_prompt = (
-            "You are a financial expense categorizer. Allowed categories: " + ", ".join(ALLOWED_CATEGORIES) + ". "
-            "Given a user input, respond ONLY as JSON: {\"category\": one of the allowed, \"confidence\": number 0..1}."
-        )
-        payload = {
-            "model": GROQ_MODEL,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": raw_text},
-            ],
-            "temperature": 0,
-        }
-        req = urlrequest.Request(
-            "https://api.groq.com/openai/v1/chat/completions",
-            data=json.dumps(payload).encode("utf-8"),
-            headers={
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-                "Authorization": f"Bearer {GROQ_API_KEY}",
-                "User-Agent": "finsight-lambda/1.0 (+https://github.com/arunclementcristiano/finsight)"
-            },
-            method="POST",
-        )
-        try:
-            with urlrequest.urlopen(req, timeout=10) as resp:
-                content = resp.read().decode("utf-8")
-                data = json.loads(content)
-        except HTTPError as he:
-            try:
-                err_body = he.read().decode("utf-8")
-            except Exception:
-                err_body = ""
-            print("GROQ_HTTP_ERROR", he.code, err_body[:500])
-            # Cloudflare 1010 is often due to missing headers/UA; we added UA/Accept above
-            return {"category": "", "confidence": 0.0}
-        except URLError as ue:
-            print("GROQ_URL_ERROR", str(ue))
-            return {"category": "", "confidence": 0.0}
-        txt = (
-            (data.get("choices") or [{}])[0].get("message", {}).get("content", "")
-            if isinstance(data, dict)
-            else ""
-        )
+        parsed = json.loads(txt)
+        cat = parsed.get("category", "")
+        conf = parsed.get("confidence", 0.7)
+    except Exception:
+        # Best-effort extraction
+        mcat = re.search(r"category\W+([A-Za-z]+)", txt, re.I)
+        mconf = re.search(r"confidence\W+(\d+(?:\.\d+)?)", txt, re.I)
+        cat = (mcat.group(1) if mcat else "")
+        conf = float(mconf.group(1)) if mconf else 0.7
+        if conf > 1:
+            conf = conf / 100.0
+    return {"category": cat, "confidence": conf}
+
+
+def _get_categories_from_ai_batch(texts):
+    """Categorize several inputs with one Groq call. Returns one {"category", "confidence"}
+    dict per input, in order; entries the model skipped carry an "error" key."""
+    if not GROQ_API_KEY:
+        return [{"category": "", "confidence": 0.0} for _ in texts]
+    system_prompt = (
+        "You are a financial expense categorizer. Allowed categories: " + ", ".join(ALLOWED_CATEGORIES) + ". "
+        "The user sends a JSON array of {\"id\": number, \"text\": string}. Respond ONLY with a JSON array "
+        "containing one {\"id\": same id, \"category\": one of the allowed, \"confidence\": number 0..1} per input."
+    )
+    txt, error = _groq_chat(system_prompt, json.dumps([{"id": i, "text": t} for i, t in enumerate(texts)]), read_timeout=2 * GROQ_READ_TIMEOUT)
+    out = [{"category": "", "confidence": 0.0, "error": error or "missing"} for _ in texts]
+    if error:
+        return out
+    m = re.search(r"\[.*\]", txt, re.S)
+    try:
+        parsed = json.loads(m.group(0) if m else txt)
+    except Exception:
+        print("GROQ_BATCH_PARSE_ERROR", txt[:500])
+        return [{"category": "", "confidence": 0.0, "error": "parse"} for _ in texts]
+    for row in parsed if isinstance(parsed, list) else []:
         try:
-            parsed = json.loads(txt)
-            cat = parsed.get("category", "")
-            conf = parsed.get("confidence", 0.7)
+            i = int(row.get("id"))
+            conf = float(row.get("confidence", 0.7))
         except Exception:
-            # Best-effort extraction
-            mcat = re.search(r"category\W+([A-Za-z]+)", txt, re.I)
-            mconf = re.search(r"confidence\W+(\d+(?:\.\d+)?)", txt, re.I)
-            cat = (mcat.group(1) if mcat else "")
-            conf = float(mconf.group(1)) if mconf else 0.7
-            if conf > 1:
-                conf = conf / 100.0
-        return {"category": cat, "confidence": conf}
-    except Exception as e:
-        print("GROQ_ERROR", str(e))
-        return {"category": "", "confidence": 0.0}
+            continue
+        if 0 <= i < len(texts):
+            out[i] = {"category": str(row.get("category") or ""), "confidence": conf / 100.0 if conf > 1 else conf}
+    return out
+
+
+def allowed_category(cat):
+    cat = (cat or "").strip().lower()
+    return next((c for c in ALLOWED_CATEGORIES if c.lower() == cat), None)
+
+
+def _categorize_terms_with_ai(texts_by_term):
+    """AI categories for {term: representative raw text}: cached terms are answered from the
+    cache, the rest go to Groq in chunks of AI_BATCH_SIZE on a bounded worker pool."""
+    out = {}
+    missing = []
+    for term, hit in ai_cache.get_many(texts_by_term).items():
+        if hit is not None and not hit.get("negative"):
+            out[term] = {"category": hit["category"], "confidence": hit["confidence"], "cached": True}
+        elif hit is None:
+            missing.append(term)
+    if not missing or not GROQ_API_KEY:
+        return out
+    chunks = [missing[i:i + AI_BATCH_SIZE] for i in range(0, len(missing), AI_BATCH_SIZE)]
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=max(1, min(AI_BATCH_WORKERS, len(chunks)))) as pool:
+        ask = metrics.propagate(lambda chunk: _get_categories_from_ai_batch([texts_by_term[t] for t in chunk]))
+        answers = pool.map(ask, chunks)
+        for chunk, results in zip(chunks, answers):
+            ai_cache.record_upstream_call()
+            for term, ai in zip(chunk, results):
+                cat = allowed_category(ai.get("category"))
+                if ai.get("error"):
+                    ai_cache.put_negative(term, ai["error"])
+                elif cat:
+                    ai_cache.put(term, cat, ai.get("confidence"), GROQ_MODEL)
+                out[term] = ai
+    print("AI_CACHE_STATS", json.dumps(ai_cache.stats()))
+    return out
+
 
+def _rules_for_terms(terms):
+    """Exact CategoryRules matches for many terms, 100 keys per BatchGetItem."""
+    found = {}
+    terms = sorted(terms)
+    for i in range(0, len(terms), 100):
+        request = {CATEGORY_RULES_TABLE: {
+            "Keys": [{"rule": t} for t in terms[i:i + 100]],
+            "ProjectionExpression": "#r, category",
+            "ExpressionAttributeNames": {"#r": "rule"},
+        }}
+        for attempt in range(5):
+            res = _ddb().batch_get_item(RequestItems=request)
+            for it in res.get("Responses", {}).get(CATEGORY_RULES_TABLE, []):
+                found[it["rule"]] = it.get("category")
+            request = res.get("UnprocessedKeys") or None
+            if not request:
+                break
+            time.sleep(0.05 * (2 ** attempt))
+    return found
 
-def _parse_amount(raw_text: str):
-    m = re.search(r"(?:[₹$€£])?\s*(\d+(?:\.\d{1,2})?)", raw_text)
-    return float(m.group(1)) if m else None
+
+def _cache_term(raw_text: str) -> str:
+    # Cache on the categorization term, not the amount/date noise around it
+    return _extract_term(raw_text) or " ".join(re.findall(r"[a-z]+", raw_text.lower()))
+
+
+def _get_category_from_ai_cached(raw_text: str, read_timeout=None, deadline=None):
+    """_get_category_from_ai behind the two-tier cache; errors/timeouts are cached briefly
+    as negative entries so an outage does not make every request wait out the timeout."""
+    term = _cache_term(raw_text)
+    if not term:
+        return _get_category_from_ai(raw_text, read_timeout, deadline)
+    hit = ai_cache.get(term)
+    if hit is not None:
+        if hit.get("negative"):
+            return {"category": "", "confidence": 0.0, "error": hit.get("reason"), "cached": True}
+        return {"category": hit["category"], "confidence": hit["confidence"], "cached": True}
+    if not GROQ_API_KEY:
+        return _get_category_from_ai(raw_text, read_timeout, deadline)
+    ai_cache.record_upstream_call()
+    ai = _get_category_from_ai(raw_text, read_timeout, deadline)
+    cat = (ai.get("category") or "").strip()
+    if ai.get("error"):
+        ai_cache.put_negative(term, ai["error"])
+    elif any(c.lower() == cat.lower() for c in ALLOWED_CATEGORIES):
+        ai_cache.put(term, cat, ai.get("confidence"), GROQ_MODEL)
+    print("AI_CACHE_STATS", json.dumps(ai_cache.stats()))
+    return ai
 
 
 def _extract_term(raw_text: str) -> str:
-    # Prefer a phrase following prepositions; normalize to last up-to-3 tokens to add context (e.g., "dog food" instead of "food")
-    m = re.search(r"\b(?:on|for|at|to)\s+([A-Za-z][A-Za-z\s]{1,40})", raw_text, flags=re.IGNORECASE)
-    if m:
-        cand = m.group(1).strip()
-        cand = re.split(r"\b(yesterday|today|tomorrow|\d{4}-\d{2}-\d{2})\b", cand, flags=re.IGNORECASE)[0].strip()
-        cand = re.sub(r"[^A-Za-z\s]", "", cand).strip()
-        cand = re.sub(r"\s+", " ", cand)
-        if cand:
-            words = cand.split(" ")
-            if len(words) > 3:
-                cand = " ".join(words[-3:])
-            return cand.lower()
-    tokens = re.findall(r"[A-Za-z]+", raw_text)
-    if tokens:
-        # last two tokens give more context than one
-        if len(tokens) >= 2:
-            return f"{tokens[-2].lower()} {tokens[-1].lower()}"
-        return tokens[-1].lower()
-    return ""
+    # Phrase after on/for/at/to (last up to 3 words, e.g. "dog food"), else the last two words
+    return expense_text.extract_term(raw_text)
 
 # CategoryMemory support removed
 
 
+class HttpError(Exception):
+    """Raised by route functions to end the request with a JSON {"error": message} body."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    __slots__ = ("event", "route_key", "body", "qs", "params", "headers", "user_sub")
+
+    def __init__(self, event, route_key, body, qs, user_sub=None):
+        self.event = event
+        self.route_key = route_key
+        self.body = body
+        self.qs = qs
+        self.params = event.get("pathParameters") or {}
+        # HTTP API (payload v2) already lowercases header names; v1 events do not
+        self.headers = {str(k).lower(): v for k, v in (event.get("headers") or {}).items()}
+        self.user_sub = user_sub
+
+
+# "METHOD /path" -> (route function, requires JWT); filled by the @route decorators below
+ROUTES = {}
+
+# DynamoDB error codes that mean "back off and retry", surfaced as 503 instead of 500
+THROTTLING_ERRORS = frozenset({
+    "ProvisionedThroughputExceededException", "ThrottlingException", "RequestLimitExceeded",
+})
+
+
+def route(route_key: str, auth: bool = False):
+    def register(fn):
+        ROUTES[route_key] = (fn, auth)
+        return fn
+    return register
+
+
+def _user_from_jwt(evt):
+    try:
+        claims = (((evt.get("requestContext") or {}).get("authorizer") or {}).get("jwt") or {}).get("claims") or {}
+        sub = claims.get("sub")
+        return sub
+    except Exception:
+        return None
+
+
+def _parse_body(event):
+    if not event.get("body"):
+        return {}
+    try:
+        body = json.loads(event["body"]) or {}
+    except Exception:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+def _error_code(e):
+    return (getattr(e, "response", None) or {}).get("Error", {}).get("Code")
+
+
+def _dispatch(event, route_key):
+    """Middleware chain: route lookup -> auth -> body parsing -> route function -> error mapping."""
+    entry = ROUTES.get(route_key)
+    if entry is None:
+        return _response(404, {"error": "Not found", "routeKey": route_key})
+    fn, auth = entry
+    user_sub = None
+    if auth:
+        user_sub = _user_from_jwt(event)
+        if not user_sub:
+            return _response(401, {"error": "Unauthorized"})
+    req = Request(event, route_key, _parse_body(event), event.get("queryStringParameters") or {}, user_sub)
+    try:
+        return fn(req)
+    except HttpError as e:
+        return _response(e.status, {"error": e.message})
+    except Exception as e:
+        if _error_code(e) in THROTTLING_ERRORS:
+            print("handler throttled", route_key, e)
+            return _response(503, {"error": "Service busy, retry shortly"})
+        print("handler error", route_key, e)
+        return _response(500, {"error": "Internal error"})
+
+
 def handler(event, context):
+    method = (event.get("requestContext", {}).get("http", {}) or {}).get("method") or event.get("httpMethod")
+    path = event.get("rawPath") or event.get("resource") or ""
+    route_key = event.get("requestContext", {}).get("routeKey") or f"{method} {path}"
+    # Unknown paths share one metrics Route so scanners cannot blow up dimension cardinality
+    metric_route = "OPTIONS" if method == "OPTIONS" else route_key if route_key in ROUTES else "UNMATCHED"
+    metrics.begin(metric_route, getattr(context, "aws_request_id", None))
     try:
-        method = (event.get("requestContext", {}).get("http", {}) or {}).get("method") or event.get("httpMethod")
-        path = event.get("rawPath") or event.get("resource") or ""
-        route_key = event.get("requestContext", {}).get("routeKey") or f"{method} {path}"
+        resp = _response(200, {"ok": True}) if method == "OPTIONS" else _dispatch(event, route_key)
+    except Exception as e:
+        print("handler error", e)
+        resp = _response(500, {"error": "Internal error"})
+    headers = event.get("headers") or {}
+    resp = codec.compress(resp, headers.get("accept-encoding") or headers.get("Accept-Encoding"))
+    rule_learner.maybe_flush()  # time-based flush of rule hit counts; runs on its own thread
+    metrics.end(resp["statusCode"])
+    return resp
 
-        if method == "OPTIONS":
-            return _response(200, {"ok": True})
 
-        body = {}
-        if event.get("body"):
-            try:
-                body = json.loads(event["body"]) or {}
-            except Exception:
-                body = {}
-        qs = event.get("queryStringParameters") or {}
-
-        if route_key == "POST /add":
-            user_id = body.get("userId")
-            raw_text = body.get("rawText", "")
-            if not user_id or not raw_text:
-                return _response(400, {"error": "Missing userId or rawText"})
-            amount = _parse_amount(raw_text)
-
-            # Fixed categories (predefined rules)
-            synonyms = {
-                # Food
-                "groceries": "Food", "grocery": "Food", "restaurant": "Food", "dining": "Food", 
-                "lunch": "Food", "dinner": "Food", "pizza": "Food", "breakfast": "Food", 
-                "snacks": "Food", "coffee": "Food", "swiggy": "Food", "zomato": "Food", 
-                "ubereats": "Food",
-
-                # Travel
-                "travel": "Travel", "transport": "Travel", "taxi": "Travel", "uber": "Travel", 
-                "ola": "Travel", "bus": "Travel", "train": "Travel", "flight": "Travel", 
-                "airline": "Travel", "fuel": "Travel", "petrol": "Travel", "gas": "Travel",
-
-                # Entertainment (experiences & gaming, NOT subscriptions)
-                "entertainment": "Entertainment", "cinema": "Entertainment", "movie": "Entertainment", 
-                "movies": "Entertainment", "theatre": "Entertainment", "outing": "Entertainment", 
-                "playstation": "Entertainment", "xbox": "Entertainment", "gaming": "Entertainment",
-
-                # Shopping
-                "shopping": "Shopping", "amazon": "Shopping", "flipkart": "Shopping", "myntra": "Shopping", 
-                "apparel": "Shopping", "clothing": "Shopping", "mall": "Shopping", "electronics": "Shopping", 
-                "gadget": "Shopping", "laptop": "Shopping", "mobile": "Shopping",
-
-                # Utilities
-                "utilities": "Utilities", "electricity": "Utilities", "water": "Utilities", "internet": "Utilities", 
-                "broadband": "Utilities", "jio": "Utilities", "airtel": "Utilities", "bsnl": "Utilities", 
-                "bill": "Utilities", "phone": "Utilities", "gas bill": "Utilities",
-
-                # Healthcare
-                "health": "Healthcare", "healthcare": "Healthcare", "medicine": "Healthcare", 
-                "hospital": "Healthcare", "doctor": "Healthcare", "pharmacy": "Healthcare", 
-                "apollo": "Healthcare", "pharmeasy": "Healthcare", "practo": "Healthcare",
-
-                # Subscription (recurring digital services)
-                "netflix": "Subscription", "spotify": "Subscription", "prime": "Subscription", 
-                "disney": "Subscription", "hotstar": "Subscription", "sunnxt": "Subscription", 
-                "membership": "Subscription", "subscription": "Subscription", "zee5": "Subscription",
-                "apple music": "Subscription", "youtube premium": "Subscription",
-            }
-
-            lower = raw_text.lower()
-            extracted_term = _extract_term(raw_text)
-
-            # 1) Rule-based (predefined)
-            matched_key = next((k for k in synonyms.keys() if k in lower), None)
-            matched = synonyms.get(matched_key) if matched_key else None
-            final_category = matched if matched else ""
-            ai_conf = None
-
-            # If matched by predefined, also upsert into CategoryRules for future
-            if final_category:
-                try:
-                    if extracted_term:
-                        # Conditional put to avoid duplicates
-                        category_rules_table.put_item(
-                            Item={"rule": extracted_term, "category": final_category},
-                            ConditionExpression="attribute_not_exists(#r)",
-                            ExpressionAttributeNames={"#r": "rule"}
-                        )
-                except Exception:
-                    pass
-
-            # 2) CategoryRules table (global rules configured by you). If matched, return directly without acknowledgment
-            if not final_category and extracted_term:
-                try:
-                    r = category_rules_table.get_item(Key={"rule": extracted_term})
-                    rule_cat = (r.get("Item", {}) or {}).get("category")
-                    if rule_cat:
-                        final_category = rule_cat
-                except Exception:
-                    pass
-                # Fuzzy contains for reversed word order (e.g., "150 laptop repair")
-                if not final_category:
-                    try:
-                        w = extracted_term.split()
-                        if len(w) >= 2:
-                            scan = category_rules_table.scan(ProjectionExpression="#r, category", ExpressionAttributeNames={"#r": "rule"})
-                            items = scan.get("Items", [])
-                            for it in items:
-                                r = str(it.get("rule", "")).lower()
-                                if w[0].lower() in r and w[1].lower() in r:
-                                    final_category = it.get("category")
-                                    break
-                    except Exception:
-                        pass
-
-            # 3) Skip CategoryMemory per new requirement (global rules only)
-
-            # 4) Groq fallback
-            if not final_category:
-                print("GROQ_CALL_START")
-                ai = _get_category_from_ai(raw_text)
-                print("GROQ_CALL_END", ai)
-                ai_cat_raw = (ai.get("category") or "").strip()
-                ai_cat = ai_cat_raw.lower()
-                ai_conf = ai.get("confidence")
-                # Normalize to one of the allowed categories, else "Other"
-                matched_allowed = next((c for c in ALLOWED_CATEGORIES if c.lower() == ai_cat), None)
-                mapped_ai = matched_allowed or "Other"
-
-                # Always provide acknowledgment when Groq was used
-                msg = (
-                    f"Could not parse amount; AI suggestion {mapped_ai}. Pick a category."
-                    if amount is None
-                    else f"Parsed amount {amount}; AI suggestion {mapped_ai}. Pick a category."
-                )
-                # Optionally include AI's raw suggestion first
-                opts = list(dict.fromkeys([ai_cat_raw] + ALLOWED_CATEGORIES))
-                return _response(200, {"amount": amount, "category": mapped_ai, "AIConfidence": ai_conf, "options": opts, "message": msg})
-
-            msg = (
-                f"Parsed amount {amount} and category {final_category}" if amount is not None
-                else f"Could not parse amount; suggested category {final_category}"
-            )
-            resp = {"amount": amount, "category": final_category, "message": msg}
-            if ai_conf is not None:
-                resp["AIConfidence"] = ai_conf
-            return _response(200, resp)
-
-        if route_key == "GET /budgets":
-            user_id = qs.get("userId") or body.get("userId")
-            if not user_id:
-                return _response(400, {"error": "Missing userId"})
-            try:
-                res = user_budgets_table.get_item(Key={"userId": user_id})
-                budgets = (res.get("Item", {}) or {}).get("budgets", {})
-                # Normalize Decimals -> float via _to_json in _response
-                return _response(200, {"budgets": budgets})
-            except Exception as e:
-                print("BUDGETS_GET_ERROR", str(e))
-                return _response(200, {"budgets": {}})
-
-        if route_key == "PUT /budgets":
-            user_id = body.get("userId")
-            budgets = body.get("budgets") or {}
-            if not user_id or not isinstance(budgets, dict):
-                return _response(400, {"error": "Missing userId or budgets"})
+def _cursor(body, expected, sk_prefix=None):
+    try:
+        key = _decode_cursor(body.get("cursor"), expected)
+    except ValueError:
+        raise HttpError(400, "Invalid cursor")
+    # InvestApp cursors share one pk per user; keep them inside the queried sk range too
+    if key and sk_prefix and not str(key.get("sk", "")).startswith(sk_prefix):
+        raise HttpError(400, "Invalid cursor")
+    return key
+
+
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]{0,63}$")
+MAX_PROJECTED_FIELDS = 20
+
+
+def _data_projection(fields, id_attr):
+    """ProjectionExpression params for `fields=a,b,c` (top-level keys of the item's `data`
+    map), always keeping `id_attr`. Returns {} when no fields were requested."""
+    if not fields:
+        return {}
+    names = [f.strip() for f in str(fields).split(",") if f.strip()]
+    if len(names) > MAX_PROJECTED_FIELDS or not all(_FIELD_NAME.match(f) for f in names):
+        raise HttpError(400, "Invalid fields")
+    attr_names = {"#id": id_attr, "#d": "data"}
+    paths = ["#id"]
+    for i, f in enumerate(dict.fromkeys(names)):
+        attr_names[f"#f{i}"] = f
+        paths.append(f"#d.#f{i}")
+    return {"ProjectionExpression": ", ".join(paths), "ExpressionAttributeNames": attr_names}
+
+
+# ----------------------- EXPENSES APIs -----------------------
+
+@route("POST /add")
+def _add_suggest(req):
+    body = req.body
+    user_id = body.get("userId")
+    raw_text = body.get("rawText", "")
+    if not user_id or not raw_text:
+        return _response(400, {"error": "Missing userId or rawText"})
+    parsed = expense_text.parse(raw_text)
+    amount = parsed.amount
+    term = parsed.term
+    extras = {"date": parsed.date, "merchant": parsed.merchant}
+
+    # Stages in priority order, the first answer wins (pipeline.py): 1) predefined synonyms,
+    # 2) the exact CategoryRules rule, 3) the rule token index (any word order, e.g.
+    # "150 laptop repair"), 4) the local classifier when confident, 5) Groq. The rule lookups
+    # overlap; Groq starts only after they miss (with CATEGORIZE_SPECULATE_AI, alongside them
+    # when the loaded index already rules them out), and its connect and read timeouts are
+    # capped at what is left of the budget when it starts, so a call the response gave up
+    # on does not outlive it.
+    guess = _model_guess(raw_text)
+    confident = bool(guess and guess[1] >= CATEGORY_MODEL_MIN_CONFIDENCE)
+    speculate = CATEGORIZE_SPECULATE_AI and not confident and _rule_hit_unlikely(term)
+    stages = [pipeline.Stage("Synonym", lambda: synonym_matcher.match(raw_text), pipeline.INLINE)]
+    if term:
+        stages.append(pipeline.Stage("Rule", lambda: _exact_rule(term), pipeline.EAGER))
+    if len(term.split()) >= 2:
+        stages.append(pipeline.Stage("RuleIndex", lambda: _rule_index_lookup(term), pipeline.EAGER))
+    stages.append(pipeline.Stage("Model", lambda: guess if confident else None, pipeline.INLINE))
+    deadline = time.monotonic() + CATEGORIZE_BUDGET_MS / 1000
+    stages.append(pipeline.Stage("AI", lambda: _get_category_from_ai_cached(raw_text, deadline=deadline),
+                                 pipeline.EAGER if speculate else pipeline.DEFERRED))
+    outcome = categorize_pipeline.run(stages, CATEGORIZE_BUDGET_MS)
+    source, value = outcome.winner, outcome.value
+
+    final_category = ""
+    model_conf = None
+    if source == "Synonym":
+        final_category = value[1]
+        # If matched by predefined, also learn it into CategoryRules for future (hits
+        # are only counted when PUT /add confirms the category)
+        if term:
+            rule_learner.observe(term, final_category, confirmed=False)
+    elif source == "Rule":
+        final_category = value
+    elif source == "RuleIndex":
+        final_category = value[1]
+    elif source == "Model":
+        final_category, model_conf = value[0], round(value[1], 3)
+
+    # Groq answered, or nothing did within the budget
+    if not final_category:
+        ai = value if source == "AI" else {"category": "", "confidence": 0.0}
+        ai_cat_raw = (ai.get("category") or "").strip()
+        ai_conf = ai.get("confidence")
+        # Normalize to one of the allowed categories, else the classifier's best guess, else "Other"
+        mapped_ai = allowed_category(ai_cat_raw) or (guess[0] if guess else None) or "Other"
+
+        # Always provide acknowledgment when Groq was used
+        msg = (
+            f"Could not parse amount; AI suggestion {mapped_ai}. Pick a category."
+            if amount is None
+            else f"Parsed amount {amount}; AI suggestion {mapped_ai}. Pick a category."
+        )
+        # Optionally include AI's raw suggestion first
+        opts = list(dict.fromkeys([ai_cat_raw] + ALLOWED_CATEGORIES))
+        return _response(200, {"amount": amount, "category": mapped_ai, "AIConfidence": ai_conf, "options": opts, "message": msg,
+                                **extras})
+
+    msg = (
+        f"Parsed amount {amount} and category {final_category}" if amount is not None
+        else f"Could not parse amount; suggested category {final_category}"
+    )
+    resp = {"amount": amount, "category": final_category, "message": msg, **extras}
+    if model_conf is not None:
+        resp["ModelConfidence"] = model_conf
+    return _response(200, resp)
+
+
+def categorize_local(texts, terms=None):
+    """Categories for many texts without AI calls: predefined synonyms, CategoryRules (exact
+    matches for all distinct terms in one pass, then the token index) and the local
+    classifier. One {"category", "source", "confidence", "guess"} dict per text; category is
+    None when nothing was confident, with the classifier's unsure pick in "guess"."""
+    if terms is None:
+        terms = [_extract_term(t) for t in texts]
+    out = [{"category": None, "source": None, "confidence": None, "guess": None} for _ in texts]
+    for r, text in zip(out, texts):
+        matched = synonym_matcher.match(text)
+        if matched:
+            r["category"], r["source"] = matched[1], "synonym"
+
+    pending = {t for r, t in zip(out, terms) if not r["category"] and t}
+    try:
+        exact = _rules_for_terms(pending) if pending else {}
+    except Exception as e:
+        print("RULES_BATCH_GET_ERROR", str(e))
+        exact = {}
+    for r, t in zip(out, terms):
+        if r["category"] or not t:
+            continue
+        cat = exact.get(t)
+        if not cat and len(t.split()) >= 2:
             try:
-                # Convert to Decimal for DynamoDB
-                put_budgets = {k: Decimal(str(v)) for k, v in budgets.items()}
-                user_budgets_table.put_item(Item={
-                    "userId": user_id,
-                    "budgets": put_budgets,
-                    "updatedAt": datetime.utcnow().isoformat(),
-                })
-                return _response(200, {"ok": True})
+                hit = rule_index.get().lookup(t)
+                cat = hit[1] if hit else None
             except Exception as e:
-                print("BUDGETS_PUT_ERROR", str(e))
-                return _response(500, {"error": "Failed to save budgets"})
-
-        if route_key == "PUT /add":
-            user_id = body.get("userId")
-            amount = body.get("amount")
-            category = body.get("category")
-            raw_text = body.get("rawText")
-            date = body.get("date") or datetime.utcnow().strftime("%Y-%m-%d")
-            if not user_id or raw_text is None or category is None or amount is None:
-                return _response(400, {"error": "Missing fields"})
-            expense_id = str(uuid.uuid4())
-            expenses_table.put_item(
-                Item={
-                    "expenseId": expense_id,
-                    "userId": user_id,
-                    "amount": Decimal(str(amount)),
-                    "category": category,
-                    "rawText": raw_text,
-                    "date": date,
-                    "createdAt": datetime.utcnow().isoformat(),
-                }
-            )
-            # Persist rule->category mapping for future global use
-            try:
-                if category != "Uncategorized":
-                    term = _extract_term(raw_text)
-                    if term:
-                        category_rules_table.put_item(
-                            Item={"rule": term, "category": category},
-                            ConditionExpression="attribute_not_exists(#r)",
-                            ExpressionAttributeNames={"#r": "rule"}
-                        )
-            except Exception:
-                pass
-            return _response(200, {"ok": True, "expenseId": expense_id})
-
-        if route_key == "POST /list":
-            user_id = body.get("userId")
-            start = body.get("start")
-            end = body.get("end")
-            category = body.get("category")
-            if not user_id:
-                return _response(400, {"error": "Missing userId"})
-            items = expenses_table.scan().get("Items", [])
-            items = [x for x in items if x.get("userId") == user_id]
-            def _ok_date(it):
-                if not start and not end:
-                    return True
-                d = datetime.strptime(it.get("date"), "%Y-%m-%d")
-                if start and d < datetime.strptime(start, "%Y-%m-%d"):
-                    return False
-                if end and d > datetime.strptime(end, "%Y-%m-%d"):
-                    return False
-                return True
-            items = [x for x in items if (category is None or x.get("category") == category) and _ok_date(x)]
-            return _response(200, {"items": items})
-
-        if route_key == "POST /edit":
-            expense_id = body.get("expenseId")
-            updates = body.get("updates") or {}
-            if not expense_id or not updates:
-                return _response(400, {"error": "Missing expenseId or updates"})
-            exprs = []
-            vals = {}
-            if "amount" in updates and updates["amount"] is not None:
-                exprs.append("amount = :a")
-                vals[":a"] = Decimal(str(updates["amount"]))
-            if "category" in updates and updates["category"] is not None:
-                exprs.append("category = :c")
-                vals[":c"] = updates["category"]
-            if "rawText" in updates and updates["rawText"] is not None:
-                exprs.append("rawText = :r")
-                vals[":r"] = updates["rawText"]
-            if not exprs:
-                return _response(400, {"error": "No valid updates"})
-            expenses_table.update_item(
-                Key={"expenseId": expense_id},
-                UpdateExpression="SET " + ", ".join(exprs),
-                ExpressionAttributeValues=vals,
-            )
-            return _response(200, {"ok": True})
-
-        if route_key == "POST /delete":
-            expense_id = body.get("expenseId")
-            if not expense_id:
-                return _response(400, {"error": "Missing expenseId"})
-            expenses_table.delete_item(Key={"expenseId": expense_id})
-            return _response(200, {"ok": True})
-
-        if route_key == "POST /summary/monthly":
-            user_id = body.get("userId")
-            month = body.get("month")
-            if not user_id:
-                return _response(400, {"error": "Missing userId"})
-            if not month:
-                now = datetime.utcnow()
-                month = f"{now.year}-{str(now.month).zfill(2)}"
-            items = expenses_table.scan().get("Items", [])
-            items = [x for x in items if x.get("userId") == user_id and str(x.get("date", "")).startswith(month)]
-            totals = {}
-            for it in items:
-                cat = it.get("category", "Other")
-                totals[cat] = float(totals.get(cat, 0)) + float(it.get("amount", 0))
-            return _response(200, {"month": month, "totals": totals})
-
-        if route_key == "POST /summary/category":
-            user_id = body.get("userId")
-            category = body.get("category")
-            if not user_id or not category:
-                return _response(400, {"error": "Missing userId or category"})
-            items = expenses_table.scan().get("Items", [])
-            items = [x for x in items if x.get("userId") == user_id and x.get("category") == category]
-            total = sum(float(x.get("amount", 0)) for x in items)
-            return _response(200, {"items": items, "total": total})
-
-        # ----------------------- PORTFOLIO APIs (JWT-protected via API Gateway) -----------------------
-        def _user_from_jwt(evt):
-            try:
-                claims = (((evt.get("requestContext") or {}).get("authorizer") or {}).get("jwt") or {}).get("claims") or {}
-                sub = claims.get("sub")
-                return sub
-            except Exception:
-                return None
-
-        # Create portfolio (POST /portfolio) — body: { name }
-        if route_key == "POST /portfolio":
-            user_sub = _user_from_jwt(event)
-            if not user_sub:
-                return _response(401, {"error": "Unauthorized"})
-            name = (body.get("name") or "").strip()
-            if not name:
-                return _response(400, {"error": "Missing name"})
-            portfolio_id = str(uuid.uuid4())
-            now = datetime.utcnow().isoformat()
-            invest_table.put_item(Item={
-                "pk": f"USER#{user_sub}",
-                "sk": f"PORTFOLIO#{portfolio_id}",
-                "entityType": "PORTFOLIO",
-                "name": name,
-                "createdAt": now,
-                "updatedAt": now,
-                "GSI1PK": f"PORTFOLIO#{portfolio_id}",
-                "GSI1SK": now,
-            })
-            return _response(200, {"portfolioId": portfolio_id, "name": name})
-
-        # Read portfolios (GET /portfolio) — list user's portfolios
-        if route_key == "GET /portfolio":
-            user_sub = _user_from_jwt(event)
-            if not user_sub:
-                return _response(401, {"error": "Unauthorized"})
-            res = invest_table.query(
-                KeyConditionExpression=Key("pk").eq(f"USER#{user_sub}") & Key("sk").begins_with("PORTFOLIO#")
-            )
-            items = res.get("Items", [])
-            portfolios = [{"portfolioId": it["sk"].split("#",1)[1], "name": it.get("name"), "createdAt": it.get("createdAt") } for it in items]
-            return _response(200, {"items": portfolios})
-
-        # Save allocation plan (PUT /portfolio/plan) — body: { portfolioId, plan }
-        if route_key == "PUT /portfolio/plan":
-            user_sub = _user_from_jwt(event)
-            if not user_sub:
-                return _response(401, {"error": "Unauthorized"})
-            portfolio_id = body.get("portfolioId")
-            plan = body.get("plan")
-            if not portfolio_id or not plan:
-                return _response(400, {"error": "Missing portfolioId or plan"})
-            now = datetime.utcnow().isoformat()
-            invest_table.put_item(Item={
-                "pk": f"USER#{user_sub}",
-                "sk": f"ALLOCATION#{portfolio_id}",
-                "entityType": "ALLOCATION",
-                "plan": plan,
-                "updatedAt": now,
-                "GSI1PK": f"PORTFOLIO#{portfolio_id}",
-                "GSI1SK": f"ALLOCATION#{now}",
-            })
-            return _response(200, {"ok": True})
-
-        # Fetch allocation plan (GET /portfolio/plan?portfolioId=...)
-        if route_key == "GET /portfolio/plan":
-            user_sub = _user_from_jwt(event)
-            if not user_sub:
-                return _response(401, {"error": "Unauthorized"})
-            portfolio_id = (qs or {}).get("portfolioId")
-            if not portfolio_id:
-                return _response(400, {"error": "Missing portfolioId"})
-            res = invest_table.get_item(Key={"pk": f"USER#{user_sub}", "sk": f"ALLOCATION#{portfolio_id}"})
-            item = res.get("Item") or {}
-            return _response(200, {"plan": item.get("plan")})
-
-        # Create holding (POST /holdings) — body: { portfolioId, holding }
-        if route_key == "POST /holdings":
-            user_sub = _user_from_jwt(event)
-            if not user_sub:
-                return _response(401, {"error": "Unauthorized"})
-            portfolio_id = body.get("portfolioId")
-            holding = body.get("holding") or {}
-            if not portfolio_id or not isinstance(holding, dict):
-                return _response(400, {"error": "Missing portfolioId or holding"})
-            holding_id = holding.get("id") or str(uuid.uuid4())
-            now = datetime.utcnow().isoformat()
-            item = {
-                "pk": f"USER#{user_sub}",
-                "sk": f"HOLDING#{portfolio_id}#{holding_id}",
-                "entityType": "HOLDING",
-                "portfolioId": portfolio_id,
-                "holdingId": holding_id,
-                "data": holding,
-                "updatedAt": now,
-                "GSI1PK": f"PORTFOLIO#{portfolio_id}",
-                "GSI1SK": f"HOLDING#{holding_id}",
-            }
-            invest_table.put_item(Item=item)
-            return _response(200, {"holdingId": holding_id})
-
-        # List holdings (GET /holdings?portfolioId=...)
-        if route_key == "GET /holdings":
-            user_sub = _user_from_jwt(event)
-            if not user_sub:
-                return _response(401, {"error": "Unauthorized"})
-            portfolio_id = (qs or {}).get("portfolioId")
-            if not portfolio_id:
-                return _response(400, {"error": "Missing portfolioId"})
-            res = invest_table.query(
-                KeyConditionExpression=Key("pk").eq(f"USER#{user_sub}") & Key("sk").begins_with(f"HOLDING#{portfolio_id}#")
-            )
-            items = res.get("Items", [])
-            holdings = [{"id": it.get("holdingId"), **(it.get("data") or {})} for it in items]
-            return _response(200, {"items": holdings})
-
-        # Create transaction (POST /transactions) — body: { portfolioId, txn }
-        if route_key == "POST /transactions":
-            user_sub = _user_from_jwt(event)
-            if not user_sub:
-                return _response(401, {"error": "Unauthorized"})
-            portfolio_id = body.get("portfolioId")
-            txn = body.get("txn") or {}
-            if not portfolio_id or not isinstance(txn, dict):
-                return _response(400, {"error": "Missing portfolioId or txn"})
-            txn_id = txn.get("id") or str(uuid.uuid4())
-            now = datetime.utcnow().isoformat()
-            date = txn.get("date") or now[:10]
-            item = {
-                "pk": f"USER#{user_sub}",
-                "sk": f"TRANSACTION#{portfolio_id}#{date}#{txn_id}",
-                "entityType": "TRANSACTION",
-                "portfolioId": portfolio_id,
-                "transactionId": txn_id,
-                "data": txn,
-                "createdAt": now,
-                "GSI1PK": f"PORTFOLIO#{portfolio_id}",
-                "GSI1SK": f"TRANSACTION#{date}#{txn_id}",
-            }
-            invest_table.put_item(Item=item)
-            return _response(200, {"transactionId": txn_id})
-
-        # List transactions (GET /transactions?portfolioId=...&start=YYYY-MM-DD&end=YYYY-MM-DD)
-        if route_key == "GET /transactions":
-            user_sub = _user_from_jwt(event)
-            if not user_sub:
-                return _response(401, {"error": "Unauthorized"})
-            portfolio_id = (qs or {}).get("portfolioId")
-            start = (qs or {}).get("start")
-            end = (qs or {}).get("end")
-            if not portfolio_id:
-                return _response(400, {"error": "Missing portfolioId"})
-            # Query by PK and filter SK prefix for TRANSACTION#PORTFOLIOID#
-            res = invest_table.query(
-                KeyConditionExpression=Key("pk").eq(f"USER#{user_sub}") & Key("sk").begins_with(f"TRANSACTION#{portfolio_id}#")
-            )
-            items = res.get("Items", [])
-            def in_range(sk: str) -> bool:
-                try:
-                    parts = sk.split("#")
-                    date_str = parts[2]
-                    if start and date_str < start:
-                        return False
-                    if end and date_str > end:
-                        return False
-                    return True
-                except Exception:
-                    return True
-            txns = [{"id": it.get("transactionId"), **(it.get("data") or {})} for it in items if in_range(it.get("sk",""))]
-            return _response(200, {"items": txns})
+                print("RULE_INDEX_ERROR", str(e))
+        if cat:
+            r["category"], r["source"] = cat, "rule"
 
-        return _response(404, {"error": "Not found", "routeKey": route_key})
+    for r, text in zip(out, texts):
+        if r["category"]:
+            continue
+        guess = _model_guess(text)
+        if guess and guess[1] >= CATEGORY_MODEL_MIN_CONFIDENCE:
+            r["category"], r["source"], r["confidence"] = guess[0], "model", guess[1]
+        elif guess:
+            r["guess"] = guess[0]
+    return out
+
+
+@route("POST /add/batch")
+def _add_batch(req):
+    body = req.body
+    user_id = body.get("userId")
+    texts = body.get("texts")
+    if not user_id or not isinstance(texts, list) or not texts:
+        return _response(400, {"error": "Missing userId or texts"})
+    if len(texts) > BATCH_MAX_ITEMS:
+        return _response(400, {"error": f"At most {BATCH_MAX_ITEMS} texts per batch"})
+    results = []
+    terms = []
+    for i, t in enumerate(texts):
+        raw = str(t or "")
+        parsed = expense_text.parse(raw)
+        results.append({"index": i, "rawText": raw, "amount": parsed.amount, "date": parsed.date,
+                        "category": "", "source": None})
+        terms.append(parsed.term)
+
+    # 1-3) Synonyms, CategoryRules and the local classifier; what it is unsure about goes on to Groq
+    guesses = {}
+    for r, local in zip(results, categorize_local([r["rawText"] for r in results], terms)):
+        if local["category"]:
+            r["category"], r["source"] = local["category"], local["source"]
+            if local["source"] == "model":
+                r["ModelConfidence"] = round(local["confidence"], 3)
+        elif local["guess"]:
+            guesses[r["index"]] = local["guess"]
+
+    # 4) Groq for the remaining distinct terms, chunked multi-item prompts
+    keys = [None if r["category"] else _cache_term(r["rawText"]) for r in results]
+    unknown = {}
+    for r, k in zip(results, keys):
+        if k:
+            unknown.setdefault(k, r["rawText"])
+    ai_by_term = _categorize_terms_with_ai(unknown) if unknown else {}
+    for r, k in zip(results, keys):
+        if r["category"]:
+            continue
+        ai = ai_by_term.get(k) or {}
+        cat = allowed_category(ai.get("category"))
+        if cat:
+            r["category"], r["source"], r["AIConfidence"] = cat, "ai", ai.get("confidence")
+        else:
+            r["category"], r["source"] = guesses.get(r["index"], "Other"), "fallback"
+    return _response(200, {"items": results})
+
+
+@route("GET /budgets")
+def _get_budgets(req):
+    body = req.body
+    qs = req.qs
+    user_id = qs.get("userId") or body.get("userId")
+    if not user_id:
+        return _response(400, {"error": "Missing userId"})
+    try:
+        res = _table(USER_BUDGETS_TABLE).get_item(Key={"userId": user_id})
+        budgets = (res.get("Item", {}) or {}).get("budgets", {})
+        return _etag_response(req.headers, {"budgets": budgets})
     except Exception as e:
-        print("handler error", e)
-        return _response(500, {"error": "Internal error"})
\ No newline at end of file
+        print("BUDGETS_GET_ERROR", str(e))
+        return _response(200, {"budgets": {}})
+
+
+@route("PUT /budgets")
+def _put_budgets(req):
+    body = req.body
+    user_id = body.get("userId")
+    budgets = body.get("budgets") or {}
+    if not user_id or not isinstance(budgets, dict):
+        return _response(400, {"error": "Missing userId or budgets"})
+    try:
+        # Convert to Decimal for DynamoDB
+        put_budgets = {k: Decimal(str(v)) for k, v in budgets.items()}
+        _table(USER_BUDGETS_TABLE).put_item(Item={
+            "userId": user_id,
+            "budgets": put_budgets,
+            "updatedAt": datetime.utcnow().isoformat(),
+        })
+        return _response(200, {"ok": True})
+    except Exception as e:
+        print("BUDGETS_PUT_ERROR", str(e))
+        return _response(500, {"error": "Failed to save budgets"})
+
+
+@route("PUT /add")
+def _add_expense(req):
+    body = req.body
+    user_id = body.get("userId")
+    amount = body.get("amount")
+    category = body.get("category")
+    raw_text = body.get("rawText")
+    if not user_id or raw_text is None or category is None or amount is None:
+        return _response(400, {"error": "Missing fields"})
+    parsed = expense_text.parse(raw_text)
+    # An explicit date wins; otherwise "yesterday" / "2024-05-03" in the text, then today
+    date = body.get("date") or parsed.date or datetime.utcnow().strftime("%Y-%m-%d")
+    expense_id = str(uuid.uuid4())
+    item = {
+        "expenseId": expense_id,
+        "userId": user_id,
+        "amount": Decimal(str(amount)),
+        "category": category,
+        "rawText": raw_text,
+        "date": date,
+        "createdAt": datetime.utcnow().isoformat(),
+    }
+    _table(EXPENSES_TABLE).put_item(Item=item)
+    _update_rollups(rollups.record_add, item)
+    # Learn rule->category mapping for future global use
+    if category != "Uncategorized":
+        rule_learner.observe(parsed.term, category)
+    return _response(200, {"ok": True, "expenseId": expense_id})
+
+
+@route("POST /list")
+def _list_expenses(req):
+    body = req.body
+    user_id = body.get("userId")
+    start = body.get("start")
+    end = body.get("end")
+    category = body.get("category")
+    if not user_id:
+        return _response(400, {"error": "Missing userId"})
+    cursor_key = _cursor(body, {"userId": user_id})
+    params = {
+        "IndexName": EXPENSES_USER_DATE_INDEX,
+        "KeyConditionExpression": _expense_key_condition(user_id, start, end),
+        "ScanIndexForward": str(body.get("order") or "desc").lower() == "asc",
+    }
+    if category is not None:
+        from boto3.dynamodb.conditions import Attr
+
+        params["FilterExpression"] = Attr("category").eq(category)
+    items, last_key = _query_page(_table(EXPENSES_TABLE), _page_size(body.get("limit")), cursor_key, **params)
+    return _etag_response(req.headers, {"items": items, "nextCursor": _encode_cursor(last_key)})
+
+
+@route("POST /edit")
+def _edit_expense(req):
+    body = req.body
+    expense_id = body.get("expenseId")
+    updates = body.get("updates") or {}
+    if not expense_id or not updates:
+        return _response(400, {"error": "Missing expenseId or updates"})
+    exprs = []
+    vals = {}
+    changed = {}
+    if "amount" in updates and updates["amount"] is not None:
+        exprs.append("amount = :a")
+        vals[":a"] = changed["amount"] = Decimal(str(updates["amount"]))
+    if "category" in updates and updates["category"] is not None:
+        exprs.append("category = :c")
+        vals[":c"] = changed["category"] = updates["category"]
+    if "rawText" in updates and updates["rawText"] is not None:
+        exprs.append("rawText = :r")
+        vals[":r"] = changed["rawText"] = updates["rawText"]
+    if not exprs:
+        return _response(400, {"error": "No valid updates"})
+    try:
+        res = _table(EXPENSES_TABLE).update_item(
+            Key={"expenseId": expense_id},
+            UpdateExpression="SET " + ", ".join(exprs),
+            ConditionExpression="attribute_exists(expenseId)",
+            ExpressionAttributeValues=vals,
+            ReturnValues="ALL_OLD",
+        )
+    except Exception as e:
+        if _error_code(e) == "ConditionalCheckFailedException":
+            return _response(404, {"error": "Expense not found"})
+        raise
+    old = res.get("Attributes") or {}
+    _update_rollups(rollups.record_edit, old, {**old, **changed})
+    return _response(200, {"ok": True})
+
+
+@route("POST /delete")
+def _delete_expense(req):
+    body = req.body
+    expense_id = body.get("expenseId")
+    if not expense_id:
+        return _response(400, {"error": "Missing expenseId"})
+    res = _table(EXPENSES_TABLE).delete_item(Key={"expenseId": expense_id}, ReturnValues="ALL_OLD")
+    if res.get("Attributes"):
+        _update_rollups(rollups.record_delete, res["Attributes"])
+    return _response(200, {"ok": True})
+
+
+@route("POST /summary/monthly")
+def _summary_monthly(req):
+    body = req.body
+    user_id = body.get("userId")
+    month = body.get("month")
+    if not user_id:
+        return _response(400, {"error": "Missing userId"})
+    if not month:
+        now = datetime.utcnow()
+        month = f"{now.year}-{str(now.month).zfill(2)}"
+    rolled = rollups.read_bucket(_table(ROLLUPS_TABLE), user_id, rollups.month_bucket(month))
+    if rolled is not None:
+        return _response(200, {"month": month, "totals": {c: amt for c, (amt, _) in rolled.items()}})
+    # No rollup yet (pre-backfill user or empty month): aggregate from the index
+    items = _query_all(
+        _table(EXPENSES_TABLE),
+        IndexName=EXPENSES_USER_DATE_INDEX,
+        KeyConditionExpression=_expense_key_condition(user_id, month=month),
+        ProjectionExpression="#c, #a",
+        ExpressionAttributeNames={"#c": "category", "#a": "amount"},
+    )
+    totals = {}
+    for it in items:
+        cat = it.get("category", "Other")
+        totals[cat] = float(totals.get(cat, 0)) + float(it.get("amount", 0))
+    return _response(200, {"month": month, "totals": totals})
+
+
+@route("POST /summary/category")
+def _summary_category(req):
+    body = req.body
+    user_id = body.get("userId")
+    category = body.get("category")
+    if not user_id or not category:
+        return _response(400, {"error": "Missing userId or category"})
+    cursor_key = _cursor(body, {"userId": user_id})
+    from boto3.dynamodb.conditions import Attr
+
+    key_cond = _expense_key_condition(user_id, body.get("start"), body.get("end"))
+    params = {
+        "IndexName": EXPENSES_USER_DATE_INDEX,
+        "KeyConditionExpression": key_cond,
+        "FilterExpression": Attr("category").eq(category),
+    }
+    rolled = None
+    if not body.get("start") and not body.get("end"):
+        rolled = rollups.read_bucket(_table(ROLLUPS_TABLE), user_id, rollups.category_bucket(category))
+    if rolled is not None:
+        total = float(rolled.get(category, (0, 0))[0])
+    else:
+        amounts = _query_all(
+            _table(EXPENSES_TABLE), ProjectionExpression="#a", ExpressionAttributeNames={"#a": "amount"}, **params
+        )
+        total = sum(float(x.get("amount", 0)) for x in amounts)
+    items, last_key = _query_page(
+        _table(EXPENSES_TABLE), _page_size(body.get("limit")), cursor_key, ScanIndexForward=False, **params
+    )
+    return _response(200, {"items": items, "total": total, "nextCursor": _encode_cursor(last_key)})
+
+
+# Spending analytics (POST /analytics) — body: { userId, months?: 1-24 (6), asOf?: YYYY-MM-DD,
+# window?: rolling months (3), zThreshold?: (3) }; monthly trends per category, this month's
+# burn rate against UserBudgets and outlier expenses in one response
+@route("POST /analytics")
+def _analytics(req):
+    from concurrent.futures import ThreadPoolExecutor
+
+    import analytics  # numpy
+
+    body = req.body
+    user_id = body.get("userId")
+    if not user_id:
+        return _response(400, {"error": "Missing userId"})
+    try:
+        months = int(body.get("months") or analytics.DEFAULT_MONTHS)
+        window = int(body.get("window") or analytics.DEFAULT_WINDOW)
+        z_threshold = float(body.get("zThreshold") or analytics.DEFAULT_Z)
+        as_of = datetime.strptime(body["asOf"], "%Y-%m-%d").date() if body.get("asOf") else datetime.utcnow().date()
+    except (TypeError, ValueError):
+        return _response(400, {"error": "Invalid months, window, zThreshold or asOf"})
+    if not 1 <= months <= analytics.MAX_MONTHS or window < 1 or z_threshold <= 0:
+        return _response(400, {"error": f"months must be 1-{analytics.MAX_MONTHS}, window and zThreshold positive"})
+    first, _ = analytics.window_bounds(as_of, months)
+
+    def load_budgets():
+        try:
+            return _table(USER_BUDGETS_TABLE).get_item(Key={"userId": user_id}).get("Item")
+        except Exception as e:
+            print("BUDGETS_GET_ERROR", str(e))
+            return None
+
+    # One paged query over the window; the budgets read rides alongside it
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        budget_item = pool.submit(metrics.propagate(load_budgets))
+        with metrics.timed("AnalyticsLoad"):
+            cols = analytics.Columns(_query_all(
+                _table(EXPENSES_TABLE),
+                IndexName=EXPENSES_USER_DATE_INDEX,
+                KeyConditionExpression=_expense_key_condition(user_id, first.isoformat(), as_of.isoformat()),
+                ProjectionExpression="expenseId, #d, category, amount, rawText",
+                ExpressionAttributeNames={"#d": "date"},
+            ))
+        budgets = analytics.budgets_for(budget_item.result(), as_of.strftime("%Y-%m"))
+    with metrics.timed("AnalyticsCompute"):
+        result = analytics.analyze(cols, as_of, months, budgets, window, z_threshold)
+    return _response(200, result)
+
+
+# ----------------------- PORTFOLIO APIs (JWT-protected via API Gateway) -----------------------
+
+# Create portfolio (POST /portfolio) — body: { name }
+@route("POST /portfolio", auth=True)
+def _create_portfolio(req):
+    body = req.body
+    user_sub = req.user_sub
+    name = (body.get("name") or "").strip()
+    if not name:
+        return _response(400, {"error": "Missing name"})
+    portfolio_id = str(uuid.uuid4())
+    now = datetime.utcnow().isoformat()
+    _table(INVEST_TABLE).put_item(Item={
+        "pk": f"USER#{user_sub}",
+        "sk": f"PORTFOLIO#{portfolio_id}",
+        "entityType": "PORTFOLIO",
+        "name": name,
+        "createdAt": now,
+        "updatedAt": now,
+        "GSI1PK": f"PORTFOLIO#{portfolio_id}",
+        "GSI1SK": now,
+    })
+    return _response(200, {"portfolioId": portfolio_id, "name": name})
+
+
+# Read portfolios (GET /portfolio) — list user's portfolios
+@route("GET /portfolio", auth=True)
+def _list_portfolios(req):
+    from boto3.dynamodb.conditions import Key
+
+    user_sub = req.user_sub
+    res = _table(INVEST_TABLE).query(
+        KeyConditionExpression=Key("pk").eq(f"USER#{user_sub}") & Key("sk").begins_with("PORTFOLIO#")
+    )
+    items = res.get("Items", [])
+    portfolios = [{"portfolioId": it["sk"].split("#",1)[1], "name": it.get("name"), "createdAt": it.get("createdAt") } for it in items]
+    return _response(200, {"items": portfolios})
+
+
+# Save allocation plan (PUT /portfolio/plan) — body: { portfolioId, plan }
+@route("PUT /portfolio/plan", auth=True)
+def _put_plan(req):
+    body = req.body
+    user_sub = req.user_sub
+    portfolio_id = body.get("portfolioId")
+    plan = body.get("plan")
+    if not portfolio_id or not plan:
+        return _response(400, {"error": "Missing portfolioId or plan"})
+    now = datetime.utcnow().isoformat()
+    _table(INVEST_TABLE).put_item(Item={
+        "pk": f"USER#{user_sub}",
+        "sk": f"ALLOCATION#{portfolio_id}",
+        "entityType": "ALLOCATION",
+        "plan": plan,
+        "updatedAt": now,
+        "GSI1PK": f"PORTFOLIO#{portfolio_id}",
+        "GSI1SK": f"ALLOCATION#{now}",
+    })
+    return _response(200, {"ok": True})
+
+
+# Fetch allocation plan (GET /portfolio/plan?portfolioId=...)
+@route("GET /portfolio/plan", auth=True)
+def _get_plan(req):
+    qs = req.qs
+    user_sub = req.user_sub
+    portfolio_id = (qs or {}).get("portfolioId")
+    if not portfolio_id:
+        return _response(400, {"error": "Missing portfolioId"})
+    res = _table(INVEST_TABLE).get_item(Key={"pk": f"USER#{user_sub}", "sk": f"ALLOCATION#{portfolio_id}"})
+    item = res.get("Item") or {}
+    return _etag_response(req.headers, {"plan": item.get("plan")})
+
+
+def _query_recent_transactions(user_sub, portfolio_id, limit):
+    from boto3.dynamodb.conditions import Attr, Key
+
+    items, _ = _query_page(
+        _table(INVEST_TABLE),
+        limit,
+        IndexName="GSI1",
+        KeyConditionExpression=Key("GSI1PK").eq(f"PORTFOLIO#{portfolio_id}") & Key("GSI1SK").begins_with("TRANSACTION#"),
+        FilterExpression=Attr("pk").eq(f"USER#{user_sub}"),
+        ScanIndexForward=False,
+    )
+    return items
+
+
+def _query_portfolio_state(user_sub, portfolio_id):
+    # GSI1SK of the PORTFOLIO item is its createdAt timestamp and the others start with
+    # ALLOCATION#/HOLDING#, so everything but the transaction log sorts below "TRANSACTION#"
+    from boto3.dynamodb.conditions import Attr, Key
+
+    return list(_query_all(
+        _table(INVEST_TABLE),
+        IndexName="GSI1",
+        KeyConditionExpression=Key("GSI1PK").eq(f"PORTFOLIO#{portfolio_id}") & Key("GSI1SK").lt("TRANSACTION#"),
+        FilterExpression=Attr("pk").eq(f"USER#{user_sub}"),
+    ))
+
+
+# Portfolio dashboard (GET /portfolio/{id}/dashboard?recent=20&tolerance=5) — portfolio, plan,
+# holdings, recent transactions and actual-vs-target allocation in one response
+@route("GET /portfolio/{id}/dashboard", auth=True)
+def _portfolio_dashboard(req):
+    from concurrent.futures import ThreadPoolExecutor
+
+    user_sub = req.user_sub
+    portfolio_id = req.params.get("id")
+    if not portfolio_id:
+        return _response(400, {"error": "Missing portfolioId"})
+    recent = _page_size(req.qs.get("recent"), default=20, maximum=100)
+    try:
+        tolerance = float(req.qs.get("tolerance") or portfolio.DEFAULT_DRIFT_TOLERANCE_PCT)
+    except ValueError:
+        return _response(400, {"error": "Invalid tolerance"})
+    # GSI1 spans users, so both queries filter on the caller's pk
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        state = pool.submit(metrics.propagate(_query_portfolio_state), user_sub, portfolio_id)
+        txns = pool.submit(metrics.propagate(_query_recent_transactions), user_sub, portfolio_id, recent)
+        by_type = {}
+        for it in state.result():
+            by_type.setdefault(it.get("entityType"), []).append(it)
+        recent_items = txns.result()
+    meta = (by_type.get("PORTFOLIO") or [None])[0]
+    if meta is None:
+        return _response(404, {"error": "Portfolio not found"})
+    plan = ((by_type.get("ALLOCATION") or [{}])[0]).get("plan")
+    holding_rows = [{"id": it.get("holdingId"), **(it.get("data") or {})} for it in by_type.get("HOLDING", [])]
+    body = {
+        "portfolio": {"portfolioId": portfolio_id, "name": meta.get("name"), "createdAt": meta.get("createdAt")},
+        "plan": plan,
+        "holdings": holding_rows,
+        "recentTransactions": [{"id": it.get("transactionId"), **(it.get("data") or {})} for it in recent_items],
+        "allocation": portfolio.allocation_drift(holding_rows, plan, tolerance),
+    }
+    return _etag_response(req.headers, body)
+
+
+def _latest_transaction_sk(user_sub, portfolio_id):
+    res = _table(INVEST_TABLE).query(
+        KeyConditionExpression=_transaction_key_condition(user_sub, portfolio_id),
+        ScanIndexForward=False,
+        Limit=1,
+        ProjectionExpression="sk",
+    )
+    items = res.get("Items", [])
+    return items[0]["sk"] if items else None
+
+
+# Portfolio performance (GET /portfolio/{id}/performance?interval=day|week|month&asOf=YYYY-MM-DD) —
+# XIRR, time-weighted return and the valuation series from the whole transaction log
+@route("GET /portfolio/{id}/performance", auth=True)
+def _portfolio_performance(req):
+    import performance  # numpy
+
+    user_sub = req.user_sub
+    portfolio_id = req.params.get("id")
+    if not portfolio_id:
+        return _response(400, {"error": "Missing portfolioId"})
+    interval = str(req.qs.get("interval") or "day").lower()
+    if interval not in performance.INTERVALS:
+        return _response(400, {"error": "interval must be day, week or month"})
+    as_of = performance.parse_date(req.qs.get("asOf")) if req.qs.get("asOf") else datetime.utcnow().date()
+    if as_of is None:
+        return _response(400, {"error": "Invalid asOf"})
+    by_type = {}
+    for it in _query_portfolio_state(user_sub, portfolio_id):
+        by_type.setdefault(it.get("entityType"), []).append(it)
+    meta = (by_type.get("PORTFOLIO") or [None])[0]
+    if meta is None:
+        return _response(404, {"error": "Portfolio not found"})
+    holding_items = by_type.get("HOLDING", [])
+    # The log is write-once, so its newest write (lastTxnAt, stamped by POST /transactions;
+    # the newest sk for logs older than the stamp) plus the holdings' versions and prices
+    # decide whether a memoized result is still current
+    stamp = (
+        meta.get("lastTxnAt") or _latest_transaction_sk(user_sub, portfolio_id),
+        as_of.isoformat(),
+        tuple(sorted((it["sk"], str(it.get("version")), str((it.get("data") or {}).get("price")),
+                      str((it.get("data") or {}).get("currentValue"))) for it in holding_items)),
+    )
+    result, cached = performance.memoized(
+        (user_sub, portfolio_id),
+        stamp,
+        lambda: performance.compute(
+            _query_all(
+                _table(INVEST_TABLE),
+                KeyConditionExpression=_transaction_key_condition(user_sub, portfolio_id, end=as_of.isoformat()),
+                ProjectionExpression="sk, holdingId, #d",
+                ExpressionAttributeNames={"#d": "data"},
+            ),
+            holding_items,
+            as_of,
+            meta.get("createdAt"),
+        ),
+    )
+    metrics.annotate("PerformanceCached", cached)
+    if result is None:
+        return _response(200, {"portfolioId": portfolio_id, "asOf": as_of.isoformat(), "summary": None,
+                               "holdings": [], "series": None})
+    body = {"portfolioId": portfolio_id, **{k: v for k, v in result.items() if k != "_series"},
+            "series": performance.series(result, interval)}
+    return _etag_response(req.headers, body)
+
+
+# Rebalance proposal (POST /portfolio/rebalance/propose) — body: { portfolioId?, plan?, holdings?,
+# locks?: [class], constraints?: { efMonths, liquidityAmount }, options?: { driftTolerancePct,
+# minTradeAmount, minTradePct, turnoverLimitPct, cashOnly } }; plan/holdings not sent are
+# read from the invest table
+@route("POST /portfolio/rebalance/propose", auth=True)
+def _rebalance_propose(req):
+    import rebalance  # numpy; only this route and the batch entry point need it
+
+    body = req.body
+    portfolio_id = body.get("portfolioId")
+    plan, holding_rows = body.get("plan"), body.get("holdings")
+    if plan is None or holding_rows is None:
+        if not portfolio_id:
+            return _response(400, {"error": "Missing portfolioId or plan/holdings"})
+        by_type = {}
+        for it in _query_portfolio_state(req.user_sub, portfolio_id):
+            by_type.setdefault(it.get("entityType"), []).append(it)
+        if not by_type.get("PORTFOLIO"):
+            return _response(404, {"error": "Portfolio not found"})
+        if plan is None:
+            plan = ((by_type.get("ALLOCATION") or [{}])[0]).get("plan")
+        if holding_rows is None:
+            holding_rows = [{"id": it.get("holdingId"), **(it.get("data") or {})} for it in by_type.get("HOLDING", [])]
+    if not isinstance(plan, dict) or not isinstance(plan.get("buckets"), list) or not isinstance(holding_rows, list):
+        return _response(400, {"error": "Missing or invalid plan/holdings"})
+    locks = body.get("locks") or []
+    constraints = body.get("constraints")
+    options = body.get("options")
+    if not isinstance(locks, list) or (constraints is not None and not isinstance(constraints, dict)):
+        return _response(400, {"error": "Invalid locks or constraints"})
+    if options is not None and not isinstance(options, dict):
+        return _response(400, {"error": "Invalid options"})
+    proposal = rebalance.propose(
+        [h for h in holding_rows if isinstance(h, dict)], plan, options or {}, locks, constraints,
+    )
+    proposal.pop("key", None)
+    return _response(200, {"portfolioId": portfolio_id, **proposal})
+
+
+def rebalance_batch_handler(event, context):
+    """Scheduled/ad-hoc entry point: drift-score every portfolio (or one user's) in the invest
+    table. Event: { userSub?, options?, top? }."""
+    import rebalance
+
+    event = event or {}
+    report = rebalance.score_all(
+        _table(INVEST_TABLE), event.get("userSub"), event.get("options") or {}, top=int(event.get("top") or 20),
+    )
+    print("REBALANCE_BATCH", json.dumps({k: v for k, v in report.items() if k != "mostDrifted"}))
+    return report
+
+
+def price_refresh_handler(event, context):
+    """EventBridge entry point: reprice every HOLDING with a symbol from PRICE_PROVIDER.
+    Event: { provider?, segments?, dryRun? }."""
+    import pricing  # numpy; only the scheduled job needs it
+
+    event = event or {}
+    report = pricing.refresh(
+        _table(INVEST_TABLE),
+        pricing.load_provider(event.get("provider")),
+        int(event.get("segments") or pricing.SCAN_SEGMENTS),
+        bool(event.get("dryRun")),
+    )
+    print("PRICE_REFRESH", json.dumps(report))
+    return report
+
+
+def export_handler(event, context):
+    """Export entry point: { kind: expenses|transactions, dest, user, portfolioId?, start?, end?,
+    format?, gzip?, partRows? }. Stops a minute before the invocation deadline with
+    "complete": false; invoking again with the same event resumes from the manifest."""
+    import exporter
+
+    event = event or {}
+    if event.get("kind") not in ("expenses", "transactions") or not event.get("dest") or not event.get("user"):
+        raise ValueError("export needs kind (expenses|transactions), dest and user")
+    remaining = context.get_remaining_time_in_millis() / 1000.0 if context else 840.0
+    manifest = exporter.run_export(
+        event["kind"], event["dest"], event["user"], event.get("portfolioId"), event.get("start"), event.get("end"),
+        event.get("format") or "ndjson", bool(event.get("gzip")), int(event.get("partRows") or exporter.PART_ROWS),
+        deadline=time.monotonic() + max(0.0, remaining - 60.0),
+    )
+    summary = {k: v for k, v in manifest.items() if k != "parts"}
+    print("EXPORT", json.dumps({**summary, "parts": len(manifest["parts"])}))
+    return summary
+
+
+# Create holding (POST /holdings) — body: { portfolioId, holding }
+@route("POST /holdings", auth=True)
+def _create_holding(req):
+    body = req.body
+    user_sub = req.user_sub
+    portfolio_id = body.get("portfolioId")
+    holding = body.get("holding") or {}
+    if not portfolio_id or not isinstance(holding, dict):
+        return _response(400, {"error": "Missing portfolioId or holding"})
+    holding_id = holding.get("id") or str(uuid.uuid4())
+    now = datetime.utcnow().isoformat()
+    item = {
+        "pk": f"USER#{user_sub}",
+        "sk": f"HOLDING#{portfolio_id}#{holding_id}",
+        "entityType": "HOLDING",
+        "portfolioId": portfolio_id,
+        "holdingId": holding_id,
+        "data": holding,
+        "updatedAt": now,
+        "GSI1PK": f"PORTFOLIO#{portfolio_id}",
+        "GSI1SK": f"HOLDING#{holding_id}",
+    }
+    try:
+        # A holding that transactions have moved keeps its snapshot (units, investedAmount,
+        # avgCost) and the version / lastTxnSk / opening bookkeeping; only the other data
+        # fields are updated
+        _table(INVEST_TABLE).put_item(Item=item, ConditionExpression="attribute_not_exists(lastTxnSk)")
+    except Exception as e:
+        if _error_code(e) != "ConditionalCheckFailedException":
+            raise
+        fields = {k: v for k, v in holding.items() if k not in ("id", "units", "investedAmount", "avgCost")}
+        names = {"#d": "data", **{f"#f{i}": k for i, k in enumerate(fields)}}
+        values = {":now": now, **{f":f{i}": holdings.to_dynamo(v) for i, v in enumerate(fields.values())}}
+        sets = ["updatedAt = :now"] + [f"#d.#f{i} = :f{i}" for i in range(len(fields))]
+        _table(INVEST_TABLE).update_item(
+            Key={"pk": item["pk"], "sk": item["sk"]},
+            UpdateExpression="SET " + ", ".join(sets),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+    return _response(200, {"holdingId": holding_id})
+
+
+# List holdings (GET /holdings?portfolioId=...&limit=&cursor=&fields=a,b)
+@route("GET /holdings", auth=True)
+def _list_holdings(req):
+    from boto3.dynamodb.conditions import Key
+
+    qs = req.qs
+    user_sub = req.user_sub
+    portfolio_id = qs.get("portfolioId")
+    if not portfolio_id:
+        return _response(400, {"error": "Missing portfolioId"})
+    prefix = f"HOLDING#{portfolio_id}#"
+    cursor_key = _cursor(qs, {"pk": f"USER#{user_sub}"}, prefix)
+    items, last_key = _query_page(
+        _table(INVEST_TABLE),
+        _page_size(qs.get("limit")),
+        cursor_key,
+        KeyConditionExpression=Key("pk").eq(f"USER#{user_sub}") & Key("sk").begins_with(prefix),
+        **_data_projection(qs.get("fields"), "holdingId"),
+    )
+    holdings = [{"id": it.get("holdingId"), **(it.get("data") or {})} for it in items]
+    return _etag_response(req.headers, {"items": holdings, "nextCursor": _encode_cursor(last_key)})
+
+
+# Create transaction (POST /transactions) — body: { portfolioId, txn }; a buy/sell with
+# txn.holdingId also moves that HOLDING snapshot in the same TransactWriteItems
+@route("POST /transactions", auth=True)
+def _create_transaction(req):
+    body = req.body
+    user_sub = req.user_sub
+    portfolio_id = body.get("portfolioId")
+    txn = body.get("txn") or {}
+    if not portfolio_id or not isinstance(txn, dict):
+        return _response(400, {"error": "Missing portfolioId or txn"})
+    kind = str(txn.get("type") or "").strip().lower()
+    if kind not in holdings.TRANSACTION_TYPES:
+        return _response(400, {"error": f"txn.type must be one of {', '.join(holdings.TRANSACTION_TYPES)}"})
+    txn_id = txn.get("id") or str(uuid.uuid4())
+    now = datetime.utcnow().isoformat()
+    date = txn.get("date") or now[:10]
+    item = {
+        "pk": f"USER#{user_sub}",
+        "sk": f"TRANSACTION#{portfolio_id}#{date}#{txn_id}",
+        "entityType": "TRANSACTION",
+        "portfolioId": portfolio_id,
+        "transactionId": txn_id,
+        "data": holdings.to_dynamo(txn),
+        "createdAt": now,
+        "GSI1PK": f"PORTFOLIO#{portfolio_id}",
+        "GSI1SK": f"TRANSACTION#{date}#{txn_id}",
+    }
+    if not holdings.parse_txn(txn):
+        # Not a buy/sell against a holdingId: plain log entry, no snapshot to move
+        _table(INVEST_TABLE).put_item(Item=item)
+        _touch_portfolio(user_sub, portfolio_id, now)
+        return _response(200, {"transactionId": txn_id})
+    try:
+        position = holdings.record_transaction(_table(INVEST_TABLE), item)
+    except holdings.InsufficientUnits as e:
+        raise HttpError(400, str(e))
+    except holdings.DuplicateTransaction:
+        raise HttpError(409, "Transaction already exists")
+    except holdings.VersionConflict:
+        raise HttpError(409, "Holding is being updated concurrently, retry")
+    _touch_portfolio(user_sub, portfolio_id, now)
+    return _response(200, {"transactionId": txn_id, "holding": {"id": txn["holdingId"], **position}})
+
+
+def _touch_portfolio(user_sub, portfolio_id, now):
+    # lastTxnAt keys the memoized GET /portfolio/{id}/performance result; a backdated entry
+    # sorts before the newest sk, so the sort key alone would not show it
+    try:
+        _table(INVEST_TABLE).update_item(
+            Key={"pk": f"USER#{user_sub}", "sk": f"PORTFOLIO#{portfolio_id}"},
+            UpdateExpression="SET lastTxnAt = :t",
+            ConditionExpression="attribute_exists(pk)",
+            ExpressionAttributeValues={":t": now},
+        )
+    except Exception as e:
+        print("PORTFOLIO_TOUCH_ERROR", portfolio_id, str(e))
+
+
+def _transaction_key_condition(user_sub, portfolio_id, start=None, end=None):
+    # sk = TRANSACTION#<pid>#<date>#<id>; "~" sorts after every date character, so a bare
+    # date or month bound ("2024-03") covers that whole day or month
+    from boto3.dynamodb.conditions import Key
+
+    prefix = f"TRANSACTION#{portfolio_id}#"
+    cond = Key("pk").eq(f"USER#{user_sub}")
+    if not start and not end:
+        return cond & Key("sk").begins_with(prefix)
+    return cond & Key("sk").between(f"{prefix}{start or ''}", f"{prefix}{end or ''}~")
+
+
+# List transactions (GET /transactions?portfolioId=...&start=YYYY-MM-DD&end=YYYY-MM-DD
+#                    &limit=&cursor=&order=asc|desc&fields=a,b)
+@route("GET /transactions", auth=True)
+def _list_transactions(req):
+    qs = req.qs
+    user_sub = req.user_sub
+    portfolio_id = qs.get("portfolioId")
+    if not portfolio_id:
+        return _response(400, {"error": "Missing portfolioId"})
+    start = qs.get("start")
+    end = qs.get("end")
+    if start and end and start > end:
+        return _response(400, {"error": "start must not be after end"})
+    cursor_key = _cursor(qs, {"pk": f"USER#{user_sub}"}, f"TRANSACTION#{portfolio_id}#")
+    items, last_key = _query_page(
+        _table(INVEST_TABLE),
+        _page_size(qs.get("limit")),
+        cursor_key,
+        KeyConditionExpression=_transaction_key_condition(user_sub, portfolio_id, start, end),
+        ScanIndexForward=str(qs.get("order") or "asc").lower() != "desc",
+        **_data_projection(qs.get("fields"), "transactionId"),
+    )
+    txns = [{"id": it.get("transactionId"), **(it.get("data") or {})} for it in items]
+    return _response(200, {"items": txns, "nextCursor": _encode_cursor(last_key)})
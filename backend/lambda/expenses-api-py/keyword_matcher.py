@@ -0,0 +1,96 @@
+"""Aho-Corasick keyword matcher used for the predefined synonym categories.
+
+The automaton is compiled once (at import of index.py) and finds every keyword hit in a
+single pass over the text, independent of how many keywords are loaded.
+"""
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum()
+
+
+class KeywordMatcher:
+    """Match keywords (which may contain spaces, e.g. "gas bill") on word boundaries.
+
+    A hit must start at the beginning of a word and end at the end of one; a single
+    trailing "s" is tolerated so "pizzas" still finds "pizza". When several keywords hit,
+    the longest wins ("gas bill" over "gas", "ubereats" over "uber"), then the earliest in
+    the text, then the keyword itself, so results never depend on insertion order.
+    """
+
+    def __init__(self, mapping):
+        self._goto = [{}]     # node -> {char: node}
+        self._fail = [0]
+        self._out = [()]      # node -> keywords ending here (incl. via fail links)
+        self._values = {}
+        for keyword, value in mapping.items():
+            self._add(keyword, value)
+        self._compile()
+
+    def _add(self, keyword: str, value):
+        key = " ".join(str(keyword).lower().split())
+        if not key:
+            return
+        node = 0
+        for ch in key:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        if key not in self._values:
+            self._out[node] = self._out[node] + (key,)
+        self._values[key] = value
+
+    def _compile(self):
+        # Breadth-first fail links; outputs are merged so matching never walks fail chains
+        queue = list(self._goto[0].values())
+        for child in queue:
+            self._fail[child] = 0
+        i = 0
+        while i < len(queue):
+            node = queue[i]
+            i += 1
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[child] = self._goto[f].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def __len__(self):
+        return len(self._values)
+
+    def find_all(self, text: str):
+        """Return [(start, end, keyword)] for every word-bounded keyword hit in `text`."""
+        s = str(text or "").lower()
+        n = len(s)
+        goto, fail, out = self._goto, self._fail, self._out
+        hits = []
+        node = 0
+        for i, ch in enumerate(s):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for kw in out[node]:
+                start = i - len(kw) + 1
+                if start > 0 and _is_word_char(s[start - 1]):
+                    continue
+                end = i + 1
+                if end < n and _is_word_char(s[end]):
+                    if not (s[end] == "s" and (end + 1 == n or not _is_word_char(s[end + 1]))):
+                        continue
+                hits.append((start, end, kw))
+        return hits
+
+    def match(self, text: str):
+        """Return (keyword, value) for the highest-priority hit, or None."""
+        hits = self.find_all(text)
+        if not hits:
+            return None
+        start, end, kw = min(hits, key=lambda h: (-(h[1] - h[0]), h[0], h[2]))
+        return kw, self._values[kw]
@@ -0,0 +1,188 @@
+"""Per-request metrics emitted as CloudWatch Embedded Metric Format (EMF) log lines.
+
+handler() opens a record with begin(route), the DynamoDB client hooks and timed("Groq")
+blocks add to it while the route runs, and end(status) prints one JSON line:
+
+  {"_aws": {...}, "Route": "POST /add", "Status": 200, "Latency": 41.2,
+   "DynamoDBTime": 12.9, "DynamoDBCalls": 2, "GroqTime": 0, "GroqCalls": 0,
+   "ReadCapacityUnits": 0.5, "WriteCapacityUnits": 1.0,
+   "ConsumedCapacity": {"CategoryRules": {"read": 0.5, "write": 1.0}}, "requestId": "..."}
+
+CloudWatch turns the listed members into metrics with a Route dimension; the per-table
+ConsumedCapacity map stays a log property (query it with Logs Insights) so table names do
+not multiply metric cardinality.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+NAMESPACE = os.environ.get("METRICS_NAMESPACE", "Finsight/ExpensesApi")
+ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+# Operations that accept ReturnConsumedCapacity; the rest (DescribeTable, ...) are timed only
+CAPACITY_OPERATIONS = frozenset({
+    "GetItem", "PutItem", "UpdateItem", "DeleteItem", "Query", "Scan",
+    "BatchGetItem", "BatchWriteItem", "TransactGetItems", "TransactWriteItems",
+})
+READ_OPERATIONS = frozenset({"GetItem", "Query", "Scan", "BatchGetItem", "TransactGetItems"})
+TIMERS = ("DynamoDB", "Groq")
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self, route: str, request_id=None):
+        self.route = route
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.timings = {name: [0.0, 0] for name in TIMERS}  # name -> [ms, calls]
+        self.capacity = {}  # table -> {"read": units, "write": units}
+        self.properties = {}  # extra log properties (not metrics)
+        self._lock = threading.Lock()
+
+    def add_time(self, name: str, ms: float):
+        with self._lock:
+            entry = self.timings.setdefault(name, [0.0, 0])
+            entry[0] += ms
+            entry[1] += 1
+
+    def add_capacity(self, operation: str, consumed):
+        # ConsumedCapacity is a dict for single-table calls and a list for batch/transact calls
+        entries = consumed if isinstance(consumed, list) else [consumed]
+        with self._lock:
+            for c in entries:
+                if not isinstance(c, dict) or not c.get("TableName"):
+                    continue
+                units = self.capacity.setdefault(c["TableName"], {"read": 0.0, "write": 0.0})
+                if "ReadCapacityUnits" in c or "WriteCapacityUnits" in c:
+                    units["read"] += float(c.get("ReadCapacityUnits") or 0)
+                    units["write"] += float(c.get("WriteCapacityUnits") or 0)
+                else:
+                    kind = "read" if operation in READ_OPERATIONS else "write"
+                    units[kind] += float(c.get("CapacityUnits") or 0)
+
+    def record(self, status: int):
+        latency = (time.perf_counter() - self.started) * 1000.0
+        names = [("Latency", "Milliseconds"), ("Errors", "Count")]
+        out = {
+            "Route": self.route,
+            "Status": status,
+            "Latency": round(latency, 2),
+            "Errors": 1 if status >= 500 else 0,
+        }
+        for name, (ms, calls) in self.timings.items():
+            out[f"{name}Time"] = round(ms, 2)
+            out[f"{name}Calls"] = calls
+            names += [(f"{name}Time", "Milliseconds"), (f"{name}Calls", "Count")]
+        out["ReadCapacityUnits"] = round(sum(u["read"] for u in self.capacity.values()), 2)
+        out["WriteCapacityUnits"] = round(sum(u["write"] for u in self.capacity.values()), 2)
+        names += [("ReadCapacityUnits", "Count"), ("WriteCapacityUnits", "Count")]
+        out["ConsumedCapacity"] = {t: {k: round(v, 2) for k, v in u.items()} for t, u in self.capacity.items()}
+        out.update(self.properties)
+        if self.request_id:
+            out["requestId"] = self.request_id
+        out["_aws"] = {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": NAMESPACE,
+                "Dimensions": [["Route"]],
+                "Metrics": [{"Name": n, "Unit": u} for n, u in names],
+            }],
+        }
+        return out
+
+
+def current():
+    return _current.get()
+
+
+def begin(route: str, request_id=None):
+    req = RequestMetrics(route, request_id)
+    _current.set(req)
+    return req
+
+
+def end(status: int):
+    """Close the current record, print it as one EMF line and return it (None if none open)."""
+    req = _current.get()
+    if req is None:
+        return None
+    _current.set(None)
+    record = req.record(status)
+    if ENABLED:
+        print(json.dumps(record, separators=(",", ":")))
+    return record
+
+
+def add_time(name: str, ms: float):
+    req = _current.get()
+    if req is not None:
+        req.add_time(name, ms)
+
+
+def annotate(key: str, value):
+    """Attach a log property to the current record (queryable with Logs Insights, not a metric)."""
+    req = _current.get()
+    if req is not None:
+        with req._lock:
+            req.properties[key] = value
+
+
+@contextmanager
+def timed(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        req = _current.get()
+        if req is not None:
+            req.add_time(name, (time.perf_counter() - started) * 1000.0)
+
+
+def propagate(fn):
+    """Bind fn to the calling request's record so calls made on pool threads (which do not
+    inherit context variables) are still counted."""
+    req = _current.get()
+
+    def run(*args, **kwargs):
+        token = _current.set(req)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return run
+
+
+def _add_return_consumed_capacity(params, model, **kwargs):
+    if model.name in CAPACITY_OPERATIONS:
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+
+def _before_call(model, context, **kwargs):
+    context["metrics_started"] = time.perf_counter()
+
+
+def _after_call(parsed, model, context, **kwargs):
+    req = _current.get()
+    started = context.get("metrics_started")
+    if req is None or started is None:
+        return
+    req.add_time("DynamoDB", (time.perf_counter() - started) * 1000.0)
+    if isinstance(parsed, dict) and parsed.get("ConsumedCapacity"):
+        req.add_capacity(model.name, parsed["ConsumedCapacity"])
+
+
+def instrument_dynamodb(client):
+    """Register botocore hooks on a DynamoDB client: every call asks for TOTAL consumed
+    capacity and reports its wall time (retries included) and capacity to the open record."""
+    events = client.meta.events
+    # before-parameter-build, not provide-client-params: boto3 swaps in a copy of the params
+    # at the latter, so changes made there are dropped
+    events.register("before-parameter-build.dynamodb", _add_return_consumed_capacity)
+    events.register("before-call.dynamodb", _before_call)
+    events.register("after-call.dynamodb", _after_call)
+    return client
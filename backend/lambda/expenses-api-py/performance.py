@@ -0,0 +1,348 @@
+"""Portfolio returns from the TRANSACTION log: XIRR, time-weighted return and daily value.
+
+Transactions arrive in sort-key (date) order and become arrays over a (holdings x days)
+grid from the first flow to the valuation date:
+
+  units[h, d]    opening units plus the cumulative buys minus sells up to day d
+  price[h, d]    last known price: each buy/sell prices its holding at amount / units, the
+                 opening position at its avgCost, and the HOLDING's current price (data.price,
+                 else currentValue / units) applies from its priceAsOf; forward-filled
+  flows[d]       net money put in: buys minus sells (opening cost basis on the first day)
+  income[d]      dividend / interest / income entries, paid out of the portfolio
+
+Opening positions come from holdings.opening_position, the same rule record_transaction and
+rebuild use: the HOLDING's `opening` (else data.units), or nothing when the log has legacy
+trades for it (rows without a top-level holdingId), since those are already counted in
+whatever opening or data was stored.
+
+The value series is sum_h units * price. TWR chains daily returns with flows at the end of
+the day, r[d] = (value[d] - flows[d] + income[d]) / value[d-1] - 1, so deposits do not
+count as performance. XIRR solves sum(cf * (1 + r) ** -(days / 365)) = 0 over the
+investor's cash flows (buys out, sells and income in, the final value in) for the whole
+portfolio and every holding at once: vectorized Newton steps, with bisection for the rows
+Newton does not settle.
+
+Results are memoized per portfolio; the caller supplies a stamp (latest transaction
+timestamp plus whatever else the valuation reads) and a changed stamp recomputes.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+
+from holdings import INCOME_TYPES, opening_position, parse_txn, to_decimal
+from portfolio import number
+
+MEMO_SIZE = 256        # portfolios kept per container
+NEWTON_STEPS = 50
+BISECT_STEPS = 200
+TOLERANCE = 1e-10
+RATE_FLOOR = -0.999999  # XIRR is undefined at -100%
+INTERVALS = ("day", "week", "month")
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def _npv(rates, times, flows):
+    # rates (m,), times (n,), flows (m, n) -> NPV and its derivative per row
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        disc = np.exp(-np.outer(np.log1p(rates), times))
+        value = (flows * disc).sum(axis=1)
+        slope = -(flows * times * disc).sum(axis=1) / (1.0 + rates)
+    return value, slope
+
+
+def xirr(times, flows, guess=0.1):
+    """Annual rate per row of `flows` (m, n) at `times` (n,) years from the first flow.
+
+    NaN where a row has no sign change (no money both in and out) or no root in range."""
+    flows = np.atleast_2d(np.asarray(flows, dtype=float))
+    times = np.asarray(times, dtype=float)
+    rates = np.full(flows.shape[0], np.nan)
+    solvable = (flows > 0).any(axis=1) & (flows < 0).any(axis=1)
+    if not solvable.any():
+        return rates
+    rows = np.flatnonzero(solvable)
+    f = flows[rows]
+    scale = np.abs(f).sum(axis=1)
+
+    r = np.full(rows.size, guess)
+    done = np.zeros(rows.size, dtype=bool)
+    for _ in range(NEWTON_STEPS):
+        value, slope = _npv(r, times, f)
+        done |= np.abs(value) <= TOLERANCE * scale
+        if done.all():
+            break
+        with np.errstate(invalid="ignore", divide="ignore"):
+            step = np.where(done | (slope == 0), 0.0, value / slope)
+        nxt = r - step
+        # Halve towards -100% instead of stepping past it
+        nxt = np.where(nxt <= RATE_FLOOR, (r + RATE_FLOOR) / 2, nxt)
+        bad = ~np.isfinite(nxt)
+        done |= np.abs(step) <= TOLERANCE * np.maximum(1.0, np.abs(r))
+        r = np.where(bad, r, nxt)
+        done &= ~bad
+    value, _ = _npv(r, times, f)
+    settled = np.isfinite(r) & (np.abs(value) <= 1e-6 * scale)
+
+    left = np.flatnonzero(~settled)
+    if left.size:
+        # Bisection on [floor, hi], widening hi until the NPV changes sign
+        fl = f[left]
+        lo = np.full(left.size, RATE_FLOOR)
+        hi = np.ones(left.size)
+        v_lo, _ = _npv(lo, times, fl)
+        v_hi, _ = _npv(hi, times, fl)
+        for _ in range(30):
+            grow = np.sign(v_lo) == np.sign(v_hi)
+            if not grow.any():
+                break
+            hi = np.where(grow, hi * 4, hi)
+            v_hi, _ = _npv(hi, times, fl)
+        bracketed = np.sign(v_lo) != np.sign(v_hi)
+        for _ in range(BISECT_STEPS):
+            mid = (lo + hi) / 2
+            v_mid, _ = _npv(mid, times, fl)
+            same = np.sign(v_mid) == np.sign(v_lo)
+            lo, v_lo = np.where(same, mid, lo), np.where(same, v_mid, v_lo)
+            hi = np.where(same, hi, mid)
+            if np.all(hi - lo <= TOLERANCE * np.maximum(1.0, np.abs(lo))):
+                break
+        r[left] = np.where(bracketed, (lo + hi) / 2, np.nan)
+    rates[rows] = r
+    return rates
+
+
+class _Log:
+    """Transaction log flattened into parallel lists while it streams in."""
+
+    def __init__(self):
+        self.day, self.holding, self.units, self.amount = [], [], [], []
+        self.transactions = 0
+        self.skipped = 0
+        self.legacy = set()   # holdings with trades written before snapshots (holdings.legacy_trade)
+
+    def add(self, item, holding_index):
+        data = item.get("data") or {}
+        self.transactions += 1
+        sk = (item.get("sk") or "").split("#")
+        when = parse_date(data.get("date")) or (parse_date(sk[2]) if len(sk) > 2 else None)
+        step = parse_txn(data)
+        kind = str(data.get("type") or "").strip().lower()
+        if when is None:
+            self.skipped += 1
+            return
+        if step:
+            holding_id, side, units, amount = step
+            self.units.append(float(units) if side == "buy" else -float(units))
+            self.amount.append(float(amount))
+        elif kind in INCOME_TYPES and number(to_decimal(data.get("amount"))):
+            holding_id = data.get("holdingId")
+            self.units.append(0.0)
+            self.amount.append(abs(float(to_decimal(data.get("amount")))))
+        else:
+            self.skipped += 1
+            return
+        h = holding_index(holding_id) if holding_id else -1   # -1: portfolio-level income
+        if step and "holdingId" not in item:
+            self.legacy.add(h)
+        self.day.append(when.toordinal())
+        self.holding.append(h)
+
+
+def _current_price(data):
+    price = number(data.get("price"))
+    if price is not None and price > 0:
+        return price
+    current, units = number(data.get("currentValue")), number(data.get("units"))
+    if current is not None and units:
+        return current / units
+    return None
+
+
+def compute(transactions, holding_items, as_of=None, opened=None):
+    """Performance of one portfolio.
+
+    transactions: TRANSACTION items in date order (any iterable; consumed once), with
+    their top-level holdingId so legacy trades can be told apart
+    holding_items: the portfolio's HOLDING items (opening positions and current prices)
+    as_of: valuation date (default today); opened: portfolio createdAt, the date opening
+    positions count as bought."""
+    as_of = as_of or date.today()
+    ids, rows = [], {}
+
+    def holding_index(holding_id):
+        key = holding_id or ""
+        if key not in rows:
+            rows[key] = len(ids)
+            ids.append(key)
+        return rows[key]
+
+    meta = {}
+    for it in holding_items:
+        hid = it.get("holdingId") or (it.get("sk") or "").split("#")[-1]
+        meta[holding_index(hid)] = it
+    log = _Log()
+    for it in transactions:
+        log.add(it, holding_index)
+
+    n_h = len(ids)
+    opening = np.zeros(n_h)
+    opening_cost = np.zeros(n_h)
+    current = np.full(n_h, np.nan)
+    priced = np.zeros(n_h, dtype=np.int64)   # ordinal of the day the current price is from
+    for h, it in meta.items():
+        pos = opening_position(it, h in log.legacy)
+        opening[h], opening_cost[h] = float(pos["units"]), float(pos["investedAmount"])
+        price = _current_price(it.get("data") or {})
+        # A price newer than as_of (or undated, when as_of is in the past) says nothing about as_of
+        price_day = parse_date((it.get("data") or {}).get("priceAsOf")) or date.today()
+        if price is not None and price_day <= as_of:
+            current[h], priced[h] = price, price_day.toordinal()
+    has_opening = opening > 0
+
+    first = min(log.day) if log.day else None
+    if has_opening.any():
+        opened_day = (parse_date(opened) or as_of).toordinal()
+        first = min(first, opened_day) if first is not None else opened_day
+    if first is None:
+        return None
+    last = max(as_of.toordinal(), max(log.day) if log.day else first)
+    n_d = last - first + 1
+
+    day = np.asarray(log.day, dtype=np.int64) - first
+    hold = np.asarray(log.holding, dtype=np.int64)
+    units_delta = np.asarray(log.units, dtype=float)
+    amount = np.asarray(log.amount, dtype=float)
+    is_trade = units_delta != 0
+    is_income = ~is_trade
+    signed = np.where(units_delta > 0, amount, -amount)  # money into the portfolio
+
+    # Positions and last-known prices over the grid
+    delta = np.zeros((n_h, n_d))
+    np.add.at(delta, (hold[is_trade], day[is_trade]), units_delta[is_trade])
+    units = opening[:, None] + np.cumsum(delta, axis=1)
+    units[np.abs(units) < 1e-9] = 0.0
+
+    price = np.full((n_h, n_d), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        opening_price = np.where(has_opening, opening_cost / np.where(has_opening, opening, 1.0), np.nan)
+    price[:, 0] = opening_price
+    trade_price = amount[is_trade] / np.abs(units_delta[is_trade])
+    price[hold[is_trade], day[is_trade]] = trade_price   # same-day trades: the later one wins
+    quoted = np.flatnonzero(~np.isnan(current))
+    price[quoted, np.clip(priced[quoted] - first, 0, n_d - 1)] = current[quoted]
+    seen = ~np.isnan(price)
+    idx = np.maximum.accumulate(np.where(seen, np.arange(n_d), 0), axis=1)
+    price = price[np.arange(n_h)[:, None], idx]
+    holding_value = np.nan_to_num(units * price)
+    value = holding_value.sum(axis=0)
+
+    flows = np.zeros(n_d)
+    np.add.at(flows, day[is_trade], signed[is_trade])
+    flows[0] += opening_cost[has_opening].sum()
+    income = np.zeros(n_d)
+    np.add.at(income, day[is_income], amount[is_income])
+
+    # Time-weighted: daily returns with flows at the end of the day
+    prev = np.concatenate(([0.0], value[:-1]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        daily = np.where(prev > 0, (value - flows + income) / prev - 1.0, 0.0)
+    growth = np.cumprod(1.0 + daily)
+    twr = growth[-1] - 1.0
+    years = (n_d - 1) / 365.0
+
+    # Money-weighted: portfolio row plus one row per holding over the days anything moved
+    h_flows = np.zeros((n_h, n_d))
+    np.add.at(h_flows, (hold[is_trade], day[is_trade]), -signed[is_trade])
+    own_income = is_income & (hold >= 0)
+    np.add.at(h_flows, (hold[own_income], day[own_income]), amount[own_income])
+    h_flows[has_opening, 0] -= opening_cost[has_opening]
+    h_flows[:, -1] += holding_value[:, -1]
+    all_flows = np.vstack((h_flows.sum(axis=0), h_flows))
+    np.add.at(all_flows[0], day[is_income & (hold < 0)], amount[is_income & (hold < 0)])
+    active = np.flatnonzero(np.abs(all_flows).sum(axis=0) > 0)
+    rates = xirr(active / 365.0, all_flows[:, active]) if active.size else np.full(n_h + 1, np.nan)
+
+    def rate(v):
+        return None if not np.isfinite(v) else round(float(v), 6)
+
+    invested = np.cumsum(flows)
+    total_income = float(income.sum())
+    holdings_out = []
+    for h, hid in enumerate(ids):
+        data = (meta.get(h) or {}).get("data") or {}
+        mine = hold == h
+        holdings_out.append({
+            "id": hid,
+            "symbol": data.get("symbol"),
+            "name": data.get("name"),
+            "units": round(float(units[h, -1]), 6),
+            "value": round(float(holding_value[h, -1]), 2),
+            "netInvested": round(float(signed[mine & is_trade].sum() + (opening_cost[h] if has_opening[h] else 0.0)), 2),
+            "income": round(float(amount[mine & is_income].sum()), 2),
+            "xirr": rate(rates[h + 1]),
+        })
+    start = date.fromordinal(first)
+    return {
+        "start": start.isoformat(),
+        "asOf": date.fromordinal(last).isoformat(),
+        "summary": {
+            "value": round(float(value[-1]), 2),
+            "netInvested": round(float(invested[-1]), 2),
+            "income": round(total_income, 2),
+            "gain": round(float(value[-1] - invested[-1] + total_income), 2),
+            "xirr": rate(rates[0]),
+            "twr": rate(twr),
+            "twrAnnualized": rate(growth[-1] ** (1.0 / years) - 1.0) if years >= 1 and growth[-1] > 0 else None,
+            "days": int(n_d),
+        },
+        "holdings": holdings_out,
+        "transactions": {"count": log.transactions, "used": int(day.size), "income": int(is_income.sum()),
+                         "skipped": log.skipped},
+        "_series": (np.datetime64(start, "D") + np.arange(n_d), value, invested, growth),
+    }
+
+
+def series(result, interval="day"):
+    """Columnar {dates, value, netInvested, twr} of a compute() result, one point per day,
+    or the last day of each week/month."""
+    dates, value, invested, growth = result["_series"]
+    if interval == "day":
+        keep = np.ones(dates.size, dtype=bool)
+    else:
+        period = dates.astype("datetime64[M]") if interval == "month" else (dates + np.timedelta64(3, "D")).astype("datetime64[W]")
+        keep = np.append(period[1:] != period[:-1], True)
+    return {
+        "interval": interval,
+        "dates": [str(d) for d in dates[keep]],
+        "value": np.round(value[keep], 2).tolist(),
+        "netInvested": np.round(invested[keep], 2).tolist(),
+        "twr": np.round(growth[keep] - 1.0, 6).tolist(),
+    }
+
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def memoized(key, stamp, fn):
+    """fn() for `key`, reused while `stamp` is unchanged; least recently used keys drop first."""
+    with _memo_lock:
+        hit = _memo.get(key)
+        if hit is not None and hit[0] == stamp:
+            _memo.move_to_end(key)
+            return hit[1], True
+    result = fn()
+    with _memo_lock:
+        _memo[key] = (stamp, result)
+        _memo.move_to_end(key)
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    return result, False
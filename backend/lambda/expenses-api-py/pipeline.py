@@ -0,0 +1,151 @@
+"""Prioritized lookup stages run concurrently under a latency budget (POST /add).
+
+Stages are listed highest priority first; each either answers (returns a value) or
+misses (returns None). The highest-priority answer wins: a lower stage's answer is used
+once every stage above it has missed, or, if the budget runs out while some are still
+pending, the best answer already in hand is used.
+
+  INLINE    cheap in-process work, run on the caller's thread when its turn comes;
+            leading inline stages run before anything is submitted, so an instant hit
+            costs no pool work at all
+  EAGER     submitted to the shared pool as soon as the leading inline stages miss, so
+            e.g. a DynamoDB get_item, a rule-index load and a speculative Groq call overlap
+  DEFERRED  submitted only when every stage above it has missed
+
+A stage that can no longer win is cancelled if it has not started yet and otherwise
+ignored (its thread finishes in the background). Stage times go into the request's
+metrics record as <prefix><Stage>Time, and the winner, timeouts and wasted (started but
+unused) eager stages as properties, so win rates and budgets can be tuned from logs.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+
+INLINE, EAGER, DEFERRED = "inline", "eager", "deferred"
+
+
+class Stage:
+    __slots__ = ("name", "fn", "mode")
+
+    def __init__(self, name, fn, mode=DEFERRED):
+        self.name = name
+        self.fn = fn
+        self.mode = mode
+
+
+class Outcome:
+    __slots__ = ("winner", "value", "timed_out", "wasted", "timings")
+
+    def __init__(self, winner=None, value=None, timed_out=False, wasted=(), timings=None):
+        self.winner = winner
+        self.value = value
+        self.timed_out = timed_out
+        self.wasted = list(wasted)
+        self.timings = timings or {}
+
+
+class Pipeline:
+    def __init__(self, prefix, workers=8):
+        self.prefix = prefix
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+        self.stats = {"runs": 0, "timeouts": 0, "wins": {}, "started": {}, "wasted": {}}
+
+    def _submit(self, fn):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.prefix.lower())
+        return self._pool.submit(fn)
+
+    def run(self, stages, budget_ms):
+        deadline = time.monotonic() + budget_ms / 1000.0
+        timings = {}
+        results = {}   # stage position -> value (None = miss)
+        futures = {}   # stage position -> Future
+
+        def call(i):
+            stage = stages[i]
+            started = time.perf_counter()
+            try:
+                return stage.fn()
+            except Exception as e:
+                print("PIPELINE_STAGE_ERROR", stage.name, str(e))
+                return None
+            finally:
+                timings[stage.name] = (time.perf_counter() - started) * 1000.0
+
+        def start(i):
+            futures[i] = self._submit(metrics.propagate(lambda: call(i)))
+
+        started_eager = False
+        outcome = None
+        while outcome is None:
+            for i, stage in enumerate(stages):
+                if i in results:
+                    if results[i] is not None:
+                        outcome = Outcome(stage.name, results[i])
+                        break
+                    continue
+                if stage.mode == INLINE:
+                    results[i] = call(i)
+                    if results[i] is not None:
+                        outcome = Outcome(stage.name, results[i])
+                        break
+                    continue
+                if not started_eager:
+                    started_eager = True
+                    for j in range(i, len(stages)):
+                        if stages[j].mode == EAGER:
+                            start(j)
+                if i not in futures:
+                    start(i)
+                break   # highest-priority stage still pending
+            else:
+                outcome = Outcome()   # every stage missed
+            if outcome is not None:
+                break
+            pending = {f: i for i, f in futures.items() if i not in results}
+            remaining = deadline - time.monotonic()
+            done = wait(pending, timeout=max(remaining, 0), return_when=FIRST_COMPLETED)[0] if remaining > 0 else ()
+            for f in done:
+                results[pending[f]] = f.result()
+            if not done:
+                # Out of budget: the best answer already in hand, if any
+                best = next(((stages[i].name, v) for i, v in sorted(results.items()) if v is not None), (None, None))
+                outcome = Outcome(best[0], best[1], timed_out=True)
+
+        win_pos = next((i for i, s in enumerate(stages) if s.name == outcome.winner), len(stages))
+        for i, f in futures.items():
+            if i > win_pos or (outcome.timed_out and i not in results):
+                if not f.cancel():
+                    outcome.wasted.append(stages[i].name)
+        outcome.timings = dict(timings)
+        self._record(outcome, futures, stages)
+        return outcome
+
+    def _record(self, outcome, futures, stages):
+        with self._lock:
+            s = self.stats
+            s["runs"] += 1
+            s["timeouts"] += outcome.timed_out
+            key = outcome.winner or "none"
+            s["wins"][key] = s["wins"].get(key, 0) + 1
+            for i in futures:
+                s["started"][stages[i].name] = s["started"].get(stages[i].name, 0) + 1
+            for name in outcome.wasted:
+                s["wasted"][name] = s["wasted"].get(name, 0) + 1
+        for name, ms in outcome.timings.items():
+            metrics.add_time(f"{self.prefix}{name}", ms)
+        metrics.annotate(f"{self.prefix}Winner", outcome.winner or "none")
+        if outcome.wasted:
+            metrics.annotate(f"{self.prefix}Wasted", outcome.wasted)
+        if outcome.timed_out:
+            metrics.annotate(f"{self.prefix}TimedOut", True)
+
+    def win_rates(self):
+        with self._lock:
+            runs = self.stats["runs"] or 1
+            return {k: round(v / runs, 4) for k, v in sorted(self.stats["wins"].items())}
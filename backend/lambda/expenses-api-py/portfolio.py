@@ -0,0 +1,60 @@
+"""Allocation math shared by the portfolio routes.
+
+Mirrors frontend/src/app/PortfolioManagement/domain/rebalance.ts so the dashboard shows
+the same actual-vs-target numbers the client computes.
+"""
+from decimal import Decimal
+
+DEFAULT_DRIFT_TOLERANCE_PCT = 5.0
+
+
+def number(v):
+    # JSON numbers arrive as int/float, DynamoDB numbers as Decimal; bools are not amounts
+    if isinstance(v, bool) or not isinstance(v, (int, float, Decimal)):
+        return None
+    return float(v)
+
+
+def value_of_holding(h) -> float:
+    """currentValue, else units * price, else investedAmount, else 0."""
+    current = number(h.get("currentValue"))
+    if current is not None:
+        return current
+    units, price = number(h.get("units")), number(h.get("price"))
+    if units is not None and price is not None:
+        return units * price
+    invested = number(h.get("investedAmount"))
+    return invested if invested is not None else 0.0
+
+
+def allocation_drift(holdings, plan, tolerance_pct=DEFAULT_DRIFT_TOLERANCE_PCT):
+    """Actual vs target allocation per asset class.
+
+    Returns {"totalValue", "driftTolerancePct", "classes": [...]} with one entry per class in
+    the plan or held, largest absolute drift first; `outOfTolerance` marks the classes the
+    client's rebalance view would list."""
+    buckets = [b for b in ((plan or {}).get("buckets") or []) if isinstance(b, dict) and b.get("class")]
+    targets = {b["class"]: number(b.get("pct")) or 0.0 for b in buckets}
+    values = {}
+    for h in holdings:
+        cls = h.get("instrumentClass") or "Unclassified"
+        values[cls] = values.get(cls, 0.0) + value_of_holding(h)
+    total = sum(values.values())
+    classes = []
+    for cls in list(dict.fromkeys(list(targets) + list(values))):
+        target = targets.get(cls, 0.0)
+        value = values.get(cls, 0.0)
+        actual = value / total * 100 if total > 0 else 0.0
+        drift = round(actual - target, 2)
+        classes.append({
+            "class": cls,
+            "value": round(value, 2),
+            "targetPct": round(target, 2),
+            "actualPct": round(actual, 2),
+            "driftPct": drift,
+            "amount": round(total * abs(target - actual) / 100, 2),
+            "action": "Increase" if target > actual else "Reduce",
+            "outOfTolerance": abs(drift) >= tolerance_pct,
+        })
+    classes.sort(key=lambda c: -abs(c["driftPct"]))
+    return {"totalValue": round(total, 2), "driftTolerancePct": tolerance_pct, "classes": classes}
@@ -0,0 +1,265 @@
+"""Scheduled price refresh for HOLDING items in the InvestApp table.
+
+index.price_refresh_handler (EventBridge schedule) and `python pricing.py refresh` run the
+same job:
+
+  1. Scan HOLDING items that carry data.symbol in TotalSegments parallel segments, one page
+     (PAGE_SIZE items) at a time, so memory is bounded by segments x page size plus the
+     price cache, however many holdings exist.
+  2. Per page, dedupe symbols and ask the provider only for the ones not already cached.
+     Fetched prices are also written as INSTRUMENT items (pk INSTRUMENT#<symbol>, sk PRICE,
+     lastPrice, asOf).
+  3. Revalue the page as arrays: currentValue = units * price.
+  4. Write changed holdings back with one UpdateItem each, WRITE_WORKERS at a time. Each
+     update is conditional on data.units still being the value read, so a holding moved by
+     POST /transactions in the meantime is skipped (counted as a conflict) and revalued on
+     the next run; the holdings of a page are unrelated, so one failure affects only itself.
+
+Providers are objects with get_prices(symbols) -> {symbol: price}. PRICE_PROVIDER selects
+one: "file:/path/prices.json" (or .csv with symbol,price columns) for local runs and tests,
+or "package.module:factory" for a real market-data client.
+"""
+import argparse
+import csv
+import importlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+
+import holdings
+
+SCAN_SEGMENTS = int(os.environ.get("PRICE_SCAN_SEGMENTS", "4"))
+PAGE_SIZE = 500             # holdings read per Scan page
+PRICE_CACHE_SIZE = 50000    # symbols kept between pages (LRU)
+WRITE_WORKERS = int(os.environ.get("PRICE_WRITE_WORKERS", "8"))
+
+
+class FilePriceProvider:
+    """Prices from a local JSON object ({"RELIANCE": 2931.5, ...}) or CSV (symbol,price)."""
+
+    def __init__(self, path):
+        self.path = path
+        if path.lower().endswith(".csv"):
+            with open(path, encoding="utf-8-sig", newline="") as fh:
+                rows = {(r.get("symbol") or "").strip(): r.get("price") for r in csv.DictReader(fh)}
+        else:
+            with open(path, encoding="utf-8") as fh:
+                rows = json.load(fh)
+        self.prices = {}
+        for symbol, price in rows.items():
+            try:
+                if symbol and price not in (None, ""):
+                    self.prices[symbol.upper()] = Decimal(str(price))
+            except ArithmeticError:
+                continue
+
+    def get_prices(self, symbols):
+        return {s: self.prices[s] for s in symbols if s in self.prices}
+
+
+def load_provider(spec=None):
+    spec = spec or os.environ.get("PRICE_PROVIDER", "")
+    if spec.startswith("file:"):
+        return FilePriceProvider(spec[len("file:"):])
+    if ":" in spec:
+        module, _, attr = spec.partition(":")
+        return getattr(importlib.import_module(module), attr)()
+    raise ValueError(f"Unknown PRICE_PROVIDER {spec!r}; use file:/path or module:factory")
+
+
+class _PriceCache:
+    def __init__(self, provider, table, as_of, dry_run, size=PRICE_CACHE_SIZE):
+        self.provider = provider
+        self.table = table
+        self.as_of = as_of
+        self.dry_run = dry_run
+        self.size = size
+        self.prices = OrderedDict()
+        self.missing = set()  # symbols the provider had no price for; not asked again this run
+        self.fetched = 0
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+    def lookup(self, symbols):
+        # One provider call at a time, so segments sharing symbols do not fetch them twice
+        with self._fetch_lock:
+            with self._lock:
+                wanted = [s for s in symbols if s not in self.prices and s not in self.missing]
+            if wanted:
+                self._fetch(wanted)
+        with self._lock:
+            out = {}
+            for s in symbols:
+                if s in self.prices:
+                    self.prices.move_to_end(s)
+                    out[s] = self.prices[s]
+            while len(self.prices) > self.size:
+                self.prices.popitem(last=False)
+            return out
+
+    def _fetch(self, wanted):
+        fetched = {s.upper(): holdings.to_decimal(p) for s, p in (self.provider.get_prices(wanted) or {}).items()}
+        if fetched and not self.dry_run:
+            with self.table.batch_writer(overwrite_by_pkeys=["pk", "sk"]) as batch:
+                for s, p in fetched.items():
+                    batch.put_item(Item={"pk": f"INSTRUMENT#{s}", "sk": "PRICE", "entityType": "INSTRUMENT",
+                                         "symbol": s, "lastPrice": p, "asOf": self.as_of})
+        with self._lock:
+            self.fetched += len(fetched)
+            self.missing.update(s for s in wanted if s not in fetched)
+            self.prices.update(fetched)
+
+
+def revalue(units, prices):
+    """currentValue per holding, rounded to cents; units and prices are equal-length lists."""
+    values = np.round(np.asarray(units, dtype=float) * np.asarray(prices, dtype=float), 2)
+    return [Decimal(f"{v:.2f}") for v in values.tolist()]
+
+
+def _update_params(item, price, value, as_of):
+    return {
+        "Key": {"pk": item["pk"], "sk": item["sk"]},
+        "UpdateExpression": "SET #d.#p = :p, #d.#cv = :cv, #d.#at = :at",
+        "ConditionExpression": "#d.#u = :u",
+        "ExpressionAttributeNames": {"#d": "data", "#p": "price", "#cv": "currentValue", "#at": "priceAsOf",
+                                     "#u": "units"},
+        "ExpressionAttributeValues": {":p": price, ":cv": value, ":at": as_of, ":u": item["data"]["units"]},
+    }
+
+
+def _update(table, params):
+    """One conditional UpdateItem: "updated", "conflict" (units moved) or "error"."""
+    try:
+        table.update_item(**params)
+        return "updated"
+    except Exception as e:
+        if getattr(e, "response", {}).get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return "conflict"
+        print("PRICE_WRITE_ERROR", params["Key"]["sk"], str(e))
+        return "error"
+
+
+def _write(table, updates, pool):
+    """Apply UpdateItem params on the pool; returns {"updated", "conflict", "error"} counts.
+    Plain conditional updates cost 1 WCU per item (a transaction costs 2)."""
+    counts = {"updated": 0, "conflict": 0, "error": 0}
+    for outcome in pool.map(lambda params: _update(table, params), updates):
+        counts[outcome] += 1
+    return counts
+
+
+def _scan_segment(table, segment, total_segments):
+    from boto3.dynamodb.conditions import Attr
+
+    params = {
+        "Segment": segment,
+        "TotalSegments": total_segments,
+        "Limit": PAGE_SIZE,
+        "FilterExpression": Attr("entityType").eq("HOLDING") & Attr("data.symbol").exists(),
+        "ProjectionExpression": "pk, sk, #d.#s, #d.#u, #d.#p, #d.#cv",
+        "ExpressionAttributeNames": {"#d": "data", "#s": "symbol", "#u": "units", "#p": "price", "#cv": "currentValue"},
+    }
+    start_key = None
+    while True:
+        if start_key:
+            params["ExclusiveStartKey"] = start_key
+        res = table.scan(**params)
+        yield res.get("Items", [])
+        start_key = res.get("LastEvaluatedKey")
+        if not start_key:
+            return
+
+
+def refresh(table, provider, segments=SCAN_SEGMENTS, dry_run=False):
+    started = time.perf_counter()
+    as_of = datetime.utcnow().isoformat()
+    cache = _PriceCache(provider, table, as_of, dry_run)
+    stats = {"scanned": 0, "priced": 0, "updated": 0, "unchanged": 0, "noPrice": 0, "noUnits": 0, "conflicts": 0,
+             "errors": 0}
+    lock = threading.Lock()
+
+    def run_segment(segment):
+        local = dict.fromkeys(stats, 0)
+        for page in _scan_segment(table, segment, segments):
+            local["scanned"] += len(page)
+            rows = []
+            for it in page:
+                data = it.get("data") or {}
+                symbol = str(data.get("symbol") or "").strip().upper()
+                if not symbol:
+                    continue
+                if not isinstance(data.get("units"), Decimal):
+                    local["noUnits"] += 1
+                    continue
+                rows.append((it, symbol))
+            prices = cache.lookup(list(dict.fromkeys(s for _, s in rows)))
+            priced = [(it, prices[s]) for it, s in rows if s in prices]
+            local["noPrice"] += len(rows) - len(priced)
+            local["priced"] += len(priced)
+            if not priced:
+                continue
+            values = revalue([it["data"]["units"] for it, _ in priced], [p for _, p in priced])
+            updates = []
+            for (it, price), value in zip(priced, values):
+                if (holdings.to_decimal(it["data"].get("price")) == price
+                        and holdings.to_decimal(it["data"].get("currentValue")) == value):
+                    local["unchanged"] += 1
+                    continue
+                updates.append(_update_params(it, price, value, as_of))
+            if dry_run:
+                local["updated"] += len(updates)
+                continue
+            counts = _write(table, updates, pool)
+            local["updated"] += counts["updated"]
+            local["conflicts"] += counts["conflict"]
+            local["errors"] += counts["error"]
+        with lock:
+            for k, v in local.items():
+                stats[k] += v
+
+    # Segments and their writes share one pool; the segment tasks occupy at most `segments`
+    # workers and wait on their writes, so the other WRITE_WORKERS always serve the writes
+    with ThreadPoolExecutor(max_workers=segments + WRITE_WORKERS) as pool:
+        for f in [pool.submit(run_segment, s) for s in range(segments)]:
+            f.result()
+    elapsed = time.perf_counter() - started
+    return {
+        **stats,
+        "instrumentsPriced": cache.fetched,
+        "instrumentsMissing": len(cache.missing),
+        "segments": segments,
+        "seconds": round(elapsed, 2),
+        "itemsPerSec": round(stats["scanned"] / elapsed, 1) if elapsed else None,
+        "asOf": as_of,
+        "dryRun": dry_run,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh holding prices in the invest table")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("refresh", help="reprice every HOLDING with a symbol")
+    r.add_argument("--provider", help="file:/path/prices.json or module:factory (default: $PRICE_PROVIDER)")
+    r.add_argument("--segments", type=int, default=SCAN_SEGMENTS, help="parallel scan segments")
+    r.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args(argv)
+
+    import boto3
+
+    region = os.environ.get("AWS_REGION") or os.environ.get("REGION") or "us-east-1"
+    dynamodb = boto3.resource("dynamodb", region_name=region, endpoint_url=os.environ.get("DYNAMODB_ENDPOINT_URL") or None)
+    report = refresh(dynamodb.Table(os.environ.get("INVEST_TABLE", "InvestApp")), load_provider(args.provider),
+                     args.segments, args.dry_run)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
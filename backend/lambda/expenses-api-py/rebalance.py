@@ -0,0 +1,323 @@
+"""Vectorized rebalance proposals over ALLOCATION plans and HOLDING items.
+
+Every portfolio in a run becomes one row of a (portfolios x asset classes) matrix, so a
+single proposal and a batch of thousands go through the same array code:
+
+  value[p, c]   current value per class (portfolio.value_of_holding)
+  frozen[p, c]  value that must not be sold: locked classes entirely, plus holdings whose
+                data has "locked": true
+  target[p, c]  plan bucket pct after the liquid floor from constraints (applyLiquidFloor
+                in frontend domain/rebalancePropose.ts)
+
+Trades move the unlocked value towards target. Deltas inside the drift tolerance or below
+the minimum trade size are dropped, sells are capped by the turnover limit (largest first),
+and buys are funded by the sells unless cash_only. driftScore is the share of the
+portfolio (in %) that sits in the wrong class: sum(|actual - target|) / 2.
+
+Run `python rebalance.py batch [--user SUB] [--top N]` to score every portfolio in the
+invest table in chunks.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from portfolio import number as _num, value_of_holding
+
+DEFAULT_OPTIONS = {
+    "driftTolerancePct": 0.5,   # ignore classes closer than this to target (frontend: 0.5%)
+    "minTradeAmount": 1.0,      # drop trades smaller than this (currency)
+    "minTradePct": 0.0,         # ... or smaller than this % of the portfolio
+    "turnoverLimitPct": None,   # cap sells at this % of the portfolio; None = no cap
+    "cashOnly": False,          # buys only, funded by new contributions
+}
+LIQUID_FLOOR_ORDER = ["Debt", "Stocks", "Mutual Funds", "Gold", "Real Estate"]
+BATCH_CHUNK = 2000  # portfolios per matrix in batch mode
+
+
+def normalize_to_100_ints(m):
+    """Scale to 100 and round with largest remainders (normalizeTo100Ints)."""
+    keys = list(m)
+    if not keys:
+        return {}
+    raw = np.clip(np.array([_num(m[k]) or 0.0 for k in keys]), 0, 100)
+    total = raw.sum()
+    if total == 0:
+        eq = 100 // len(keys)
+        out = {k: eq for k in keys}
+        out[keys[0]] += 100 - eq * len(keys)
+        return out
+    scaled = raw / total * 100
+    ints = np.floor(scaled).astype(int)
+    remain = 100 - int(ints.sum())
+    order = np.argsort(-(scaled - ints), kind="stable")
+    ints[order[:remain]] += 1
+    return {k: int(v) for k, v in zip(keys, ints)}
+
+
+def apply_liquid_floor(target, ef_months=0.0, liquidity_amount=0.0):
+    """Raise Liquid to the emergency-fund floor, taking from Debt, Stocks, ... (applyLiquidFloor)."""
+    out = dict(target)
+    min_liquid = 3 if ef_months >= 6 else (5 if ef_months > 0 else 8)
+    if liquidity_amount > 0:
+        min_liquid = min(12, min_liquid + 2)
+    if round(out.get("Liquid", 0)) >= min_liquid:
+        return out
+    need = min_liquid - round(out.get("Liquid", 0))
+    out["Liquid"] = min_liquid
+    rest = [c for c in out if c != "Liquid" and c not in LIQUID_FLOOR_ORDER]
+    for cls in LIQUID_FLOOR_ORDER + rest:
+        if need <= 0:
+            break
+        have = round(out.get(cls, 0))
+        if have <= 0:
+            continue
+        take = min(have, need)
+        out[cls] = have - take
+        need -= take
+    return normalize_to_100_ints(out)
+
+
+def _options(options):
+    if options is not None and not isinstance(options, dict):
+        raise ValueError("options must be an object")
+    opts = dict(DEFAULT_OPTIONS)
+    for k, v in (options or {}).items():
+        if k in opts:
+            opts[k] = v
+    for k in ("driftTolerancePct", "minTradeAmount", "minTradePct"):
+        opts[k] = max(0.0, _num(opts[k]) or 0.0)
+    limit = _num(opts["turnoverLimitPct"])
+    opts["turnoverLimitPct"] = None if limit is None else min(100.0, max(0.0, limit))
+    opts["cashOnly"] = bool(opts["cashOnly"])
+    return opts
+
+
+def targets_for(plan, constraints=None):
+    buckets = [b for b in ((plan or {}).get("buckets") or []) if isinstance(b, dict) and b.get("class")]
+    target = {b["class"]: _num(b.get("pct")) or 0.0 for b in buckets}
+    if constraints:
+        ef = min(24.0, max(0.0, _num(constraints.get("efMonths")) or 0.0))
+        liq = max(0.0, _num(constraints.get("liquidityAmount")) or 0.0)
+        target = apply_liquid_floor(target, ef, liq)
+    return target
+
+
+class Portfolio:
+    """One row of the matrix: holdings, plan targets and lock constraints."""
+
+    __slots__ = ("key", "holdings", "target", "locks")
+
+    def __init__(self, key, holdings, target, locks=()):
+        self.key = key
+        self.holdings = holdings
+        self.target = target
+        self.locks = set(locks or ())
+
+
+def _matrices(portfolios):
+    classes = {}
+    for p in portfolios:
+        for c in p.target:
+            classes.setdefault(c, len(classes))
+        for h in p.holdings:
+            classes.setdefault(h.get("instrumentClass") or "Unclassified", len(classes))
+    n, k = len(portfolios), max(1, len(classes))
+    value = np.zeros((n, k))
+    frozen = np.zeros((n, k))
+    target = np.zeros((n, k))
+    for i, p in enumerate(portfolios):
+        for c, pct in p.target.items():
+            target[i, classes[c]] = pct
+        for h in p.holdings:
+            j = classes[h.get("instrumentClass") or "Unclassified"]
+            v = value_of_holding(h)
+            value[i, j] += v
+            if h.get("locked") is True:
+                frozen[i, j] += v
+        for c in p.locks:
+            if c in classes:
+                frozen[i, classes[c]] = value[i, classes[c]]
+    return list(classes), value, frozen, target
+
+
+def _greedy_cap(amounts, budget):
+    """Fill each row's budget with the largest amounts first; amounts >= 0, budget per row."""
+    order = np.argsort(-amounts, axis=1, kind="stable")
+    sorted_amt = np.take_along_axis(amounts, order, axis=1)
+    before = np.cumsum(sorted_amt, axis=1) - sorted_amt
+    taken_sorted = np.clip(budget[:, None] - before, 0, sorted_amt)
+    taken = np.empty_like(amounts)
+    np.put_along_axis(taken, order, taken_sorted, axis=1)
+    return taken
+
+
+def propose_many(portfolios, options=None):
+    """Rebalance proposals for many portfolios at once; returns one dict per portfolio."""
+    opts = _options(options)
+    if not portfolios:
+        return []
+    classes, value, frozen, target = _matrices(portfolios)
+    total = value.sum(axis=1)
+    safe_total = np.where(total > 0, total, 1.0)
+    actual = value / safe_total[:, None] * 100
+    drift = np.where(total[:, None] > 0, actual - target, 0.0)  # nothing held, nothing to score
+
+    # Locked value stays put; the tradable remainder is spread over the unlocked targets
+    locked_class = frozen >= value - 1e-9
+    locked_class &= value > 0
+    open_target = np.where(locked_class, 0.0, target)
+    open_sum = open_target.sum(axis=1)
+    tradable = total - np.where(locked_class, value, 0.0).sum(axis=1)
+    share = np.divide(open_target, open_sum[:, None], out=np.zeros_like(open_target), where=open_sum[:, None] > 0)
+    goal = np.where(locked_class, value, share * tradable[:, None])
+    goal = np.where(open_sum[:, None] > 0, goal, value)
+    delta = goal - value
+    # Partly frozen classes can only sell their unfrozen part
+    delta = np.maximum(delta, -(value - frozen))
+
+    threshold = np.maximum(opts["minTradeAmount"], opts["minTradePct"] / 100 * total)
+    small = (np.abs(drift) < opts["driftTolerancePct"]) | (np.abs(delta) < threshold[:, None])
+    delta = np.where(small, 0.0, delta)
+
+    sells = np.where(delta < 0, -delta, 0.0)
+    buys = np.where(delta > 0, delta, 0.0)
+    if opts["cashOnly"]:
+        sells = np.zeros_like(sells)
+    elif opts["turnoverLimitPct"] is not None:
+        sells = _greedy_cap(sells, opts["turnoverLimitPct"] / 100 * total)
+    sells = np.where(sells >= threshold[:, None], sells, 0.0)
+    if not opts["cashOnly"]:
+        # Funded only by the sells that survive the size threshold
+        buys = _greedy_cap(buys, sells.sum(axis=1))
+    buys = np.where(buys >= threshold[:, None], buys, 0.0)
+
+    after = value - sells + buys
+    after_total = after.sum(axis=1)
+    after_pct = after / np.where(after_total > 0, after_total, 1.0)[:, None] * 100
+    drift_score = np.abs(drift).sum(axis=1) / 2
+    after_score = np.where(total > 0, np.abs(after_pct - target).sum(axis=1) / 2, 0.0)
+    turnover = (sells.sum(axis=1) + buys.sum(axis=1)) / safe_total * 100
+
+    out = []
+    for i, p in enumerate(portfolios):
+        present = [j for j, c in enumerate(classes) if value[i, j] > 0 or c in p.target]
+        trades = []
+        for j in present:
+            for amount, action in ((sells[i, j], "Reduce"), (buys[i, j], "Increase")):
+                if amount > 0:
+                    trades.append({
+                        "class": classes[j], "action": action, "amount": round(float(amount), 2),
+                        "actualPct": round(float(actual[i, j]), 2), "targetPct": round(float(target[i, j]), 2),
+                        "driftPct": round(float(drift[i, j]), 2),
+                    })
+        trades.sort(key=lambda t: (t["action"] != "Reduce", -t["amount"]))
+        out.append({
+            "key": p.key,
+            "totalValue": round(float(total[i]), 2),
+            "beforeMix": {classes[j]: round(float(actual[i, j]), 2) for j in present},
+            "targetMix": {classes[j]: round(float(target[i, j]), 2) for j in present},
+            "afterMix": {classes[j]: round(float(after_pct[i, j]), 2) for j in present},
+            "trades": trades,
+            "turnoverPct": round(float(turnover[i]), 2),
+            "driftScore": round(float(drift_score[i]), 2),
+            "driftScoreAfter": round(float(after_score[i]), 2),
+            "maxDriftPct": round(float(np.abs(drift[i]).max()) if present else 0.0, 2),
+            "lockedClasses": sorted(classes[j] for j in range(len(classes)) if locked_class[i, j]),
+        })
+    return out
+
+
+def propose(holdings, plan, options=None, locks=(), constraints=None):
+    return propose_many([Portfolio(None, holdings, targets_for(plan, constraints), locks)], options)[0]
+
+
+def _iter_invest_items(table, user_sub=None):
+    from boto3.dynamodb.conditions import Attr, Key
+
+    params = {
+        "FilterExpression": Attr("entityType").is_in(["ALLOCATION", "HOLDING"]),
+        "ProjectionExpression": "pk, sk, entityType, #p, #d",
+        "ExpressionAttributeNames": {"#p": "plan", "#d": "data"},
+    }
+    if user_sub:
+        params["KeyConditionExpression"] = Key("pk").eq(f"USER#{user_sub}")
+    start_key = None
+    while True:
+        if start_key:
+            params["ExclusiveStartKey"] = start_key
+        res = table.query(**params) if user_sub else table.scan(**params)
+        yield from res.get("Items", [])
+        start_key = res.get("LastEvaluatedKey")
+        if not start_key:
+            return
+
+
+def score_all(table, user_sub=None, options=None, chunk=BATCH_CHUNK, top=20):
+    """Score every portfolio that has a plan, a chunk of portfolios per matrix.
+
+    A user's items share one partition and come back together from Scan, so a chunk is cut
+    only at a user boundary and memory stays bounded by the chunk size."""
+    started = time.perf_counter()
+    plans, holdings = {}, {}
+    current_pk = None
+    scored = []
+    stats = {"portfolios": 0, "holdings": 0, "outOfTolerance": 0}
+
+    def flush():
+        batch = [Portfolio(key, holdings.get(key, []), targets_for(plan)) for key, plan in plans.items() if plan]
+        for r in propose_many(batch, options):
+            stats["portfolios"] += 1
+            if r["trades"]:
+                stats["outOfTolerance"] += 1
+            scored.append((r["driftScore"], r["key"], r["totalValue"], len(r["trades"])))
+        scored.sort(key=lambda s: -s[0])
+        del scored[top:]
+        plans.clear()
+        holdings.clear()
+
+    for it in _iter_invest_items(table, user_sub):
+        if it["pk"] != current_pk:
+            if len(plans) >= chunk:
+                flush()
+            current_pk = it["pk"]
+        parts = it["sk"].split("#")
+        if it.get("entityType") == "ALLOCATION" and len(parts) >= 2:
+            plans[(it["pk"], parts[1])] = it.get("plan")
+        elif it.get("entityType") == "HOLDING" and len(parts) >= 3:
+            stats["holdings"] += 1
+            holdings.setdefault((it["pk"], parts[1]), []).append(it.get("data") or {})
+    flush()
+    elapsed = time.perf_counter() - started
+    return {
+        **stats,
+        "seconds": round(elapsed, 2),
+        "portfoliosPerSec": round(stats["portfolios"] / elapsed, 1) if elapsed else None,
+        "mostDrifted": [{"pk": k[0], "portfolioId": k[1], "driftScore": s, "totalValue": v, "trades": n}
+                        for s, k, v, n in scored],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch rebalance scoring")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("batch", help="score every portfolio in the invest table")
+    b.add_argument("--user", help="limit to one user sub (query instead of full scan)")
+    b.add_argument("--top", type=int, default=20, help="number of most drifted portfolios to list")
+    b.add_argument("--tolerance", type=float, default=DEFAULT_OPTIONS["driftTolerancePct"])
+    args = parser.parse_args(argv)
+
+    import boto3
+
+    region = os.environ.get("AWS_REGION") or os.environ.get("REGION") or "us-east-1"
+    dynamodb = boto3.resource("dynamodb", region_name=region, endpoint_url=os.environ.get("DYNAMODB_ENDPOINT_URL") or None)
+    report = score_all(dynamodb.Table(os.environ.get("INVEST_TABLE", "InvestApp")), args.user,
+                       {"driftTolerancePct": args.tolerance}, top=args.top)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
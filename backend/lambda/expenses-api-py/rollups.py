@@ -0,0 +1,234 @@
+"""Per-user expense rollups kept in step with the Expenses table.
+
+Layout (table keyed by userId + bucket):
+  bucket = "MONTH#YYYY-MM"    one item per user/month, every category of that month
+  bucket = "CATEGORY#<name>"  one item per user/category, all-time
+Each item carries "amt#<category>" (Decimal sum) and "cnt#<category>" (row count)
+attributes, so the write paths can move money between buckets with plain ADD updates
+and a summary is a single get_item.
+
+Run `python rollups.py rebuild [--user USER] [--dry-run]` to recompute rollups from the
+raw Expenses table and report drift.
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+from decimal import Decimal
+
+AMOUNT_PREFIX = "amt#"
+COUNT_PREFIX = "cnt#"
+
+
+def month_bucket(month: str) -> str:
+    return f"MONTH#{month}"
+
+
+def category_bucket(category: str) -> str:
+    return f"CATEGORY#{category}"
+
+
+def _dec(v) -> Decimal:
+    return v if isinstance(v, Decimal) else Decimal(str(v or 0))
+
+
+def _deltas(item, sign):
+    # (bucket, category) -> [amount, count] contributed by one expense row
+    user_id = item.get("userId")
+    date = str(item.get("date") or "")
+    category = item.get("category") or "Other"
+    if not user_id or len(date) < 7:
+        return {}
+    amount = _dec(item.get("amount")) * sign
+    return {
+        (user_id, month_bucket(date[:7]), category): [amount, sign],
+        (user_id, category_bucket(category), category): [amount, sign],
+    }
+
+
+def _merge(*parts):
+    out = {}
+    for part in parts:
+        for k, (amt, cnt) in part.items():
+            cur = out.setdefault(k, [Decimal(0), 0])
+            cur[0] += amt
+            cur[1] += cnt
+    return {k: v for k, v in out.items() if v[0] != 0 or v[1] != 0}
+
+
+def apply_deltas(table, deltas):
+    """Apply merged deltas with one atomic ADD update per (user, bucket)."""
+    by_bucket = {}
+    for (user_id, bucket, category), (amt, cnt) in deltas.items():
+        by_bucket.setdefault((user_id, bucket), []).append((category, amt, cnt))
+    now = datetime.utcnow().isoformat()
+    for (user_id, bucket), entries in by_bucket.items():
+        names = {"#u": "updatedAt"}
+        values = {":now": now}
+        adds = []
+        for i, (category, amt, cnt) in enumerate(entries):
+            names[f"#a{i}"] = AMOUNT_PREFIX + category
+            names[f"#n{i}"] = COUNT_PREFIX + category
+            values[f":a{i}"] = amt
+            values[f":n{i}"] = cnt
+            adds.append(f"#a{i} :a{i}, #n{i} :n{i}")
+        table.update_item(
+            Key={"userId": user_id, "bucket": bucket},
+            UpdateExpression="SET #u = :now ADD " + ", ".join(adds),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+
+
+def record_add(table, item):
+    apply_deltas(table, _deltas(item, 1))
+
+
+def record_many(table, items):
+    # Bulk add (imports): one merged ADD per touched bucket instead of two per item
+    apply_deltas(table, _merge(*(_deltas(it, 1) for it in items)))
+
+
+def record_delete(table, item):
+    apply_deltas(table, _deltas(item, -1))
+
+
+def record_edit(table, old_item, new_item):
+    # Same bucket -> net amount change only; category/date change -> moves between buckets
+    apply_deltas(table, _merge(_deltas(old_item, -1), _deltas(new_item, 1)))
+
+
+def parse_totals(item):
+    """Return {category: (amount, count)} for a rollup item, dropping emptied categories."""
+    out = {}
+    for k, v in (item or {}).items():
+        if not k.startswith(AMOUNT_PREFIX):
+            continue
+        category = k[len(AMOUNT_PREFIX):]
+        count = int(item.get(COUNT_PREFIX + category, 0))
+        if count > 0:
+            out[category] = (_dec(v), count)
+    return out
+
+
+def read_bucket(table, user_id: str, bucket: str):
+    """Single-item read; returns None when the bucket has never been written."""
+    res = table.get_item(Key={"userId": user_id, "bucket": bucket}, ConsistentRead=True)
+    item = res.get("Item")
+    return parse_totals(item) if item is not None else None
+
+
+def _expected_from_expenses(expenses):
+    expected = {}
+    rows = 0
+    for it in expenses:
+        rows += 1
+        for (user_id, bucket, category), (amt, cnt) in _deltas(it, 1).items():
+            cur = expected.setdefault((user_id, bucket), {}).setdefault(category, [Decimal(0), 0])
+            cur[0] += amt
+            cur[1] += cnt
+    return expected, rows
+
+
+def _scan_all(table, **kwargs):
+    start_key = None
+    while True:
+        params = dict(kwargs)
+        if start_key:
+            params["ExclusiveStartKey"] = start_key
+        res = table.scan(**params)
+        for it in res.get("Items", []):
+            yield it
+        start_key = res.get("LastEvaluatedKey")
+        if not start_key:
+            return
+
+
+def _query_user(table, key_name: str, user_id: str, index_name=None):
+    from boto3.dynamodb.conditions import Key
+
+    params = {"KeyConditionExpression": Key(key_name).eq(user_id)}
+    if index_name:
+        params["IndexName"] = index_name
+    start_key = None
+    while True:
+        if start_key:
+            params["ExclusiveStartKey"] = start_key
+        res = table.query(**params)
+        for it in res.get("Items", []):
+            yield it
+        start_key = res.get("LastEvaluatedKey")
+        if not start_key:
+            return
+
+
+def rebuild(expenses_table, rollups_table, user_id=None, dry_run=False, index_name="userId-date-index"):
+    """Recompute rollups from raw expenses, report drift and (unless dry_run) overwrite them.
+
+    Writes that land while a rebuild runs can be lost for the buckets it rewrites; run it
+    for a quiet user or during a maintenance window."""
+    projection = {"ProjectionExpression": "userId, #d, category, amount", "ExpressionAttributeNames": {"#d": "date"}}
+    if user_id:
+        expenses = _query_user(expenses_table, "userId", user_id, index_name)
+        actual_items = _query_user(rollups_table, "userId", user_id)
+    else:
+        expenses = _scan_all(expenses_table, **projection)
+        actual_items = _scan_all(rollups_table)
+    expected, rows = _expected_from_expenses(expenses)
+    actual = {(it["userId"], it["bucket"]): parse_totals(it) for it in actual_items}
+
+    drift = []
+    for key in sorted(set(expected) | set(actual)):
+        want = {c: (v[0], v[1]) for c, v in expected.get(key, {}).items()}
+        have = actual.get(key, {})
+        for category in sorted(set(want) | set(have)):
+            w = want.get(category, (Decimal(0), 0))
+            h = have.get(category, (Decimal(0), 0))
+            if w != h:
+                drift.append({
+                    "userId": key[0], "bucket": key[1], "category": category,
+                    "expected": {"amount": str(w[0]), "count": w[1]},
+                    "actual": {"amount": str(h[0]), "count": h[1]},
+                })
+
+    drifted = {(d["userId"], d["bucket"]) for d in drift}
+    if not dry_run:
+        now = datetime.utcnow().isoformat()
+        with rollups_table.batch_writer() as batch:
+            for uid, bucket in sorted(drifted):
+                cats = expected.get((uid, bucket))
+                if not cats:
+                    batch.delete_item(Key={"userId": uid, "bucket": bucket})
+                    continue
+                item = {"userId": uid, "bucket": bucket, "updatedAt": now}
+                for category, (amt, cnt) in cats.items():
+                    item[AMOUNT_PREFIX + category] = amt
+                    item[COUNT_PREFIX + category] = cnt
+                batch.put_item(Item=item)
+    return {"rows": rows, "buckets": len(expected), "driftedBuckets": len(drifted), "drift": drift, "dryRun": dry_run}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Expense rollup maintenance")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    rb = sub.add_parser("rebuild", help="recompute rollups from the Expenses table and report drift")
+    rb.add_argument("--user", help="limit to one userId (query instead of full scan)")
+    rb.add_argument("--dry-run", action="store_true", help="report drift without writing")
+    args = parser.parse_args(argv)
+
+    import boto3
+
+    region = os.environ.get("AWS_REGION") or os.environ.get("REGION") or "us-east-1"
+    dynamodb = boto3.resource("dynamodb", region_name=region)
+    report = rebuild(
+        dynamodb.Table(os.environ.get("EXPENSES_TABLE", "Expenses")),
+        dynamodb.Table(os.environ.get("ROLLUPS_TABLE", "ExpenseRollups")),
+        user_id=args.user,
+        dry_run=args.dry_run,
+    )
+    print(json.dumps(report, indent=2))
+    return 1 if report["drift"] and args.dry_run else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
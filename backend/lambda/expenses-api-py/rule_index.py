@@ -0,0 +1,233 @@
+"""In-memory inverted token index over CategoryRules for fuzzy (any word order) matching.
+
+Built once per warm container from a paginated scan of the rules table and refreshed
+after a TTL; rules learned by this container are added in place so they are visible
+immediately. One scan runs at a time per container: concurrent callers share it, and once
+an index exists a stale one keeps serving while its replacement is built on a background
+thread.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str):
+    return _TOKEN_RE.findall(str(text or "").lower())
+
+
+def _trigrams(token: str):
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class RuleIndex:
+    """Token -> rule-id postings. A query matches a rule when every query token appears in
+    the rule as a whole token, or (with `prefix`) as a token prefix, or (with `trigrams`)
+    as a substring of a rule token. Ties are broken deterministically: most exact-token
+    hits, then fewest rule tokens, then the rule string itself."""
+
+    def __init__(self, rules=(), prefix=True, trigrams=False):
+        self.prefix = prefix
+        self.trigrams = trigrams
+        self._rules = []          # id -> rule string
+        self._categories = []     # id -> category
+        self._tokens = []         # id -> frozenset of tokens
+        self._by_rule = {}        # rule string -> id
+        self._postings = {}       # token -> set(ids)
+        self._vocab = []          # sorted tokens, for prefix search
+        self._vocab_dirty = False
+        self._grams = {}          # trigram -> set(tokens)
+        for rule, category in rules:
+            self.add(rule, category)
+
+    def __len__(self):
+        return len(self._rules)
+
+    def add(self, rule: str, category: str):
+        rule = str(rule or "").strip().lower()
+        if not rule or not category:
+            return
+        rid = self._by_rule.get(rule)
+        if rid is not None:
+            self._categories[rid] = category
+            return
+        rid = len(self._rules)
+        toks = frozenset(tokenize(rule))
+        self._rules.append(rule)
+        self._categories.append(category)
+        self._tokens.append(toks)
+        self._by_rule[rule] = rid
+        for t in toks:
+            ids = self._postings.get(t)
+            if ids is None:
+                ids = self._postings[t] = set()
+                self._vocab_dirty = True
+                if self.trigrams:
+                    for g in _trigrams(t):
+                        self._grams.setdefault(g, set()).add(t)
+            ids.add(rid)
+
+    def get(self, rule: str):
+        rid = self._by_rule.get(str(rule or "").strip().lower())
+        return self._categories[rid] if rid is not None else None
+
+    def _expand(self, token: str):
+        # Vocabulary tokens a query token may stand for
+        out = {token} if token in self._postings else set()
+        if self.prefix:
+            if self._vocab_dirty:
+                self._vocab = sorted(self._postings)
+                self._vocab_dirty = False
+            i = bisect_left(self._vocab, token)
+            while i < len(self._vocab) and self._vocab[i].startswith(token):
+                out.add(self._vocab[i])
+                i += 1
+        if self.trigrams and len(token) >= 3:
+            grams = [g for g in _trigrams(token) if g[0] != " " and g[-1] != " "] or list(_trigrams(token))
+            cands = None
+            for g in sorted(grams, key=lambda g: len(self._grams.get(g, ()))):
+                toks = self._grams.get(g, set())
+                cands = set(toks) if cands is None else cands & toks
+                if not cands:
+                    break
+            out.update(t for t in (cands or ()) if token in t)
+        return out
+
+    def lookup(self, text: str):
+        """Return (rule, category) for the best rule containing every token of `text`, or None."""
+        q = list(dict.fromkeys(tokenize(text)))
+        if not q:
+            return None
+        per_token = []
+        for t in q:
+            vocab = self._expand(t)
+            if not vocab:
+                return None
+            if len(vocab) == 1:
+                per_token.append(self._postings[next(iter(vocab))])
+            else:
+                per_token.append(set().union(*(self._postings[v] for v in vocab)))
+        per_token.sort(key=len)
+        cands = per_token[0]
+        for ids in per_token[1:]:
+            cands = cands & ids
+            if not cands:
+                return None
+        best = min(
+            cands,
+            key=lambda rid: (-sum(1 for t in q if t in self._tokens[rid]), len(self._tokens[rid]), self._rules[rid]),
+        )
+        return self._rules[best], self._categories[best]
+
+
+def scan_rules(table):
+    """Yield (rule, category) pairs from every page of the CategoryRules table."""
+    params = {"ProjectionExpression": "#r, category", "ExpressionAttributeNames": {"#r": "rule"}}
+    while True:
+        res = table.scan(**params)
+        for it in res.get("Items", []):
+            yield it.get("rule"), it.get("category")
+        if not res.get("LastEvaluatedKey"):
+            return
+        params["ExclusiveStartKey"] = res["LastEvaluatedKey"]
+
+
+class CachedRuleIndex:
+    """Container-scoped holder that (re)builds the index from the table every `ttl` seconds.
+
+    Only the first load blocks, and only callers that ask to wait; every later rebuild
+    happens on a background thread while the previous index keeps answering. A failed
+    rebuild is retried after `retry_after` seconds."""
+
+    def __init__(self, table_getter, ttl=300.0, retry_after=30.0, **index_opts):
+        self._table_getter = table_getter
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self._opts = index_opts
+        self._index = None
+        self._loaded_at = 0.0
+        self._load_lock = threading.Lock()   # held for the duration of a scan
+        self._state_lock = threading.Lock()
+        self._reloading = False
+        self._learned = None                 # rules learned while a scan runs, replayed on swap
+
+    def _load(self):
+        with self._state_lock:
+            self._learned = []
+        started = time.perf_counter()
+        try:
+            index = RuleIndex(scan_rules(self._table_getter()), **self._opts)
+        except Exception:
+            with self._state_lock:
+                self._learned = None
+            raise
+        with self._state_lock:
+            for rule, category in self._learned:
+                index.add(rule, category)
+            self._learned = None
+            self._index = index
+            self._loaded_at = time.monotonic()
+        print("RULE_INDEX_LOADED", len(index), round((time.perf_counter() - started) * 1000, 1), "ms")
+        return index
+
+    def _reload(self):
+        try:
+            with self._load_lock:
+                # A caller that waited may have loaded it while this thread queued for the lock
+                if self._index is None or time.monotonic() - self._loaded_at > self.ttl:
+                    self._load()
+        except Exception as e:
+            print("RULE_INDEX_RELOAD_ERROR", str(e))
+            with self._state_lock:
+                # Keep serving the stale index and try again a little later
+                self._loaded_at = time.monotonic() - self.ttl + self.retry_after
+        finally:
+            with self._state_lock:
+                self._reloading = False
+
+    def _start_reload(self):
+        with self._state_lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload, name="rule-index-reload", daemon=True).start()
+
+    def get(self, wait=True):
+        """The index, loading it on first use. A stale index is returned at once and rebuilt
+        in the background. With wait=False a first load also runs in the background and
+        None is returned until it is ready."""
+        index = self._index
+        if index is not None:
+            if time.monotonic() - self._loaded_at > self.ttl:
+                self._start_reload()
+            return index
+        if not wait:
+            self._start_reload()
+            return None
+        with self._load_lock:
+            # Another caller may have finished the load while this one waited for the lock
+            return self._index if self._index is not None else self._load()
+
+    def loaded(self):
+        """The loaded index (possibly past its ttl), or None; never triggers a load."""
+        return self._index
+
+    def peek(self, rule: str):
+        """Category of `rule` in the loaded index, without loading it; None if unknown."""
+        index = self._index
+        return index.get(rule) if index is not None else None
+
+    def learn(self, rule: str, category: str):
+        # Keep a loaded index in step with rules written by this container
+        with self._state_lock:
+            if self._index is not None:
+                self._index.add(rule, category)
+            if self._learned is not None:
+                self._learned.append((rule, category))
+
+    def invalidate(self):
+        with self._state_lock:
+            self._index = None
@@ -0,0 +1,227 @@
+"""Write-coalescing rule learning for the CategoryRules table.
+
+PUT /add confirms (term, category) pairs on every saved expense, and POST /add proposes
+rules for terms a synonym matched. Instead of a conditional put per request (which almost
+always fails the condition in steady state and still costs a write unit):
+
+  - a bounded per-container seen-set (plus the loaded rule index) says which rules the
+    table already has; a rule missing from both is written on the caller's thread, before
+    the response, so a frozen or recycled container cannot lose it
+  - confirmations of known rules are counted in memory and flushed on a background
+    thread every `flush_seconds` or `flush_max` observations, with one UpdateItem per
+    distinct rule:
+        SET category = if_not_exists(category, :c)      (first writer still wins)
+        ADD hits :n, agree :n                           (when :c is the stored category)
+        ADD hits :n                                     (when it is not)
+    so confidence = agree / hits ranks rules and flags ones users keep overriding.
+    Only confirmations count; POST /add suggestions never add hits.
+
+A container that is recycled before its next flush loses only those counts. Run
+`python rule_learning.py report [--min-hits N] [--max-confidence C]` to list rules by
+confidence for pruning.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class RuleLearner:
+    def __init__(self, table_getter, known=None, on_new=None, flush_seconds=30.0, flush_max=100,
+                 seen_max=50000, pending_max=5000):
+        self._table_getter = table_getter
+        self._known = known        # rule -> category or None, e.g. the loaded rule index
+        self._on_new = on_new      # called with (rule, stored category) once a new rule is written
+        self.flush_seconds = flush_seconds
+        self.flush_max = flush_max
+        self.seen_max = seen_max
+        self.pending_max = pending_max
+        self._seen = set()
+        self._pending = {}         # (rule, category) -> count
+        self._pending_count = 0
+        self._urgent = False
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._pool = None
+        self._inflight = None
+        self.stats = {"observed": 0, "updates": 0, "disagreements": 0, "dropped": 0, "errors": 0, "flushes": 0}
+
+    def _count(self, name, n=1):
+        # stats is written from request threads and the flush thread
+        with self._lock:
+            self.stats[name] += n
+
+    def _is_known(self, rule):
+        if rule in self._seen:
+            return True
+        return bool(self._known and self._known(rule))
+
+    def observe(self, rule: str, category: str, confirmed: bool = True):
+        """Record rule -> category. A confirmed use (PUT /add) counts towards hits/agree; an
+        unconfirmed one (a POST /add suggestion) only creates the rule if it is missing.
+        Unknown rules are written before returning; known ones are counted for a later flush."""
+        if not rule or not category:
+            return
+        with self._lock:
+            new = not self._is_known(rule)
+            if confirmed:
+                self.stats["observed"] += 1
+            if not new and confirmed:
+                key = (rule, category)
+                if key not in self._pending and len(self._pending) >= self.pending_max:
+                    self.stats["dropped"] += 1
+                    return
+                self._pending[key] = self._pending.get(key, 0) + 1
+                self._pending_count += 1
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+        if new:
+            self._write_new(rule, category, 1 if confirmed else 0)
+        self.maybe_flush()
+
+    def _write_new(self, rule, category, n):
+        try:
+            stored = self._update(self._table_getter(), rule, category, n, datetime.utcnow().isoformat())
+        except Exception as e:
+            self._count("errors")
+            print("RULE_LEARN_ERROR", rule, str(e))
+            if n:
+                # Keep the confirmation for the next background flush
+                with self._lock:
+                    self._pending[(rule, category)] = self._pending.get((rule, category), 0) + n
+                    self._pending_count += n
+                    self._oldest = self._oldest or time.monotonic()
+            return
+        self._count("updates")
+        self._mark_seen(rule)
+        # The first writer may have stored a different category; learn what the table has
+        if self._on_new and stored:
+            self._on_new(rule, stored)
+
+    def maybe_flush(self):
+        with self._lock:
+            due = self._pending and (
+                self._urgent
+                or self._pending_count >= self.flush_max
+                or time.monotonic() - self._oldest >= self.flush_seconds
+            )
+            if not due or (self._inflight is not None and not self._inflight.done()):
+                return None
+            batch, self._pending = self._pending, {}
+            self._pending_count, self._urgent, self._oldest = 0, False, None
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rule-learning")
+            self._inflight = self._pool.submit(self._write, batch)
+            return self._inflight
+
+    def flush(self, timeout=None):
+        """Flush everything pending and wait (CLI, tests, shutdown)."""
+        if self._inflight is not None:
+            self._inflight.result(timeout)
+        with self._lock:
+            self._urgent = bool(self._pending)
+        future = self.maybe_flush()
+        if future is not None:
+            future.result(timeout)
+
+    def _write(self, batch):
+        table = self._table_getter()
+        now = datetime.utcnow().isoformat()
+        failed = {}
+        for (rule, category), n in batch.items():
+            try:
+                self._update(table, rule, category, n, now)
+                self._count("updates")
+                self._mark_seen(rule)
+            except Exception as e:
+                self._count("errors")
+                failed[(rule, category)] = n
+                print("RULE_LEARN_ERROR", rule, str(e))
+        with self._lock:
+            self.stats["flushes"] += 1
+            for key, n in failed.items():
+                if key in self._pending or len(self._pending) < self.pending_max:
+                    self._pending[key] = self._pending.get(key, 0) + n
+                    self._pending_count += n
+                    self._oldest = self._oldest or time.monotonic()
+            stats = dict(self.stats)
+        print("RULE_LEARN_FLUSH", json.dumps({"rules": len(batch), "failed": len(failed), **stats}))
+
+    def _update(self, table, rule, category, n, now):
+        """Apply n uses of rule -> category; returns the category the table now stores."""
+        try:
+            res = table.update_item(
+                Key={"rule": rule},
+                UpdateExpression="SET category = if_not_exists(category, :c), createdAt = if_not_exists(createdAt, :now), "
+                                 "lastSeen = :now ADD hits :n, agree :n",
+                ConditionExpression="attribute_not_exists(category) OR category = :c",
+                ExpressionAttributeValues={":c": category, ":n": n, ":now": now},
+                ReturnValues="UPDATED_NEW",
+            )
+            return res.get("Attributes", {}).get("category") or category
+        except Exception as e:
+            if getattr(e, "response", {}).get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+        # The stored category differs: count the use against it without changing it
+        res = table.update_item(
+            Key={"rule": rule},
+            UpdateExpression="SET lastSeen = :now ADD hits :n",
+            ExpressionAttributeValues={":n": n, ":now": now},
+            ReturnValues="ALL_NEW",
+        )
+        self._count("disagreements")
+        return res.get("Attributes", {}).get("category")
+
+    def _mark_seen(self, rule):
+        with self._lock:
+            if len(self._seen) >= self.seen_max:
+                self._seen.clear()
+            self._seen.add(rule)
+
+
+def report(table, min_hits=1, max_confidence=1.0, limit=50):
+    """Rules with at least min_hits uses and agree/hits <= max_confidence, least confident first."""
+    rows = []
+    params = {"ProjectionExpression": "#r, category, hits, agree, lastSeen", "ExpressionAttributeNames": {"#r": "rule"}}
+    total = tracked = 0
+    while True:
+        res = table.scan(**params)
+        for it in res.get("Items", []):
+            total += 1
+            hits = int(it.get("hits") or 0)
+            if not hits:
+                continue
+            tracked += 1
+            confidence = int(it.get("agree") or 0) / hits
+            if hits >= min_hits and confidence <= max_confidence:
+                rows.append({"rule": it["rule"], "category": it.get("category"), "hits": hits,
+                             "confidence": round(confidence, 3), "lastSeen": it.get("lastSeen")})
+        if not res.get("LastEvaluatedKey"):
+            break
+        params["ExclusiveStartKey"] = res["LastEvaluatedKey"]
+    rows.sort(key=lambda r: (r["confidence"], -r["hits"], r["rule"]))
+    return {"rules": total, "tracked": tracked, "matching": len(rows), "items": rows[:limit]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank CategoryRules by learned hit counts and confidence")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("report", help="list rules by confidence (agree / hits)")
+    r.add_argument("--min-hits", type=int, default=5)
+    r.add_argument("--max-confidence", type=float, default=0.6)
+    r.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    import boto3
+
+    region = os.environ.get("AWS_REGION") or os.environ.get("REGION") or "us-east-1"
+    dynamodb = boto3.resource("dynamodb", region_name=region, endpoint_url=os.environ.get("DYNAMODB_ENDPOINT_URL") or None)
+    table = dynamodb.Table(os.environ.get("CATEGORY_RULES_TABLE", "CategoryRules"))
+    print(json.dumps(report(table, args.min_hits, args.max_confidence, args.limit), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""Local expense-category classifier: hashed n-gram features and multinomial naive Bayes.
+
+    python text_classifier.py train --out category_model.bin [--expenses-dir DIR] [--holdout 0.2]
+    python text_classifier.py evaluate category_model.bin [--expenses-dir DIR] [--threshold 0.8]
+
+Training data is what the app already collects: rule -> category pairs in CategoryRules
+(rules users keep overriding, agree/hits < 0.5, are left out), user-confirmed
+rawText/category pairs in the Expenses table (or an exporter.py NDJSON directory), and
+the predefined SYNONYMS. Labels outside ALLOWED_CATEGORIES, and "Other", are skipped.
+
+Features are lowercase words, word bigrams and character 3-grams of each word (so
+"swigy" still shares most features with "swiggy"), hashed with CRC32 into 2**20
+buckets. Only buckets seen in training are stored, one float32 log-likelihood per class,
+so the artifact is a few hundred KB and loads in milliseconds without NumPy.
+
+Naive Bayes scores are overconfident, so `train` fits a softmax temperature on a held-out
+split (lowest negative log-likelihood), reports accuracy and the share of AI-bound
+texts the model would answer at each threshold, then refits on all the data and saves
+the model with that temperature. `evaluate` reruns the report for a saved model, e.g.
+against data collected after it was trained.
+"""
+import argparse
+import glob
+import gzip
+import json
+import math
+import os
+import re
+import time
+import zlib
+from array import array
+from datetime import datetime
+
+DIM_BITS = 20
+_MASK = (1 << DIM_BITS) - 1
+MAGIC = b"FSNB1\n"
+ALPHA = 0.1  # additive smoothing
+THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+
+_WORD = re.compile(r"[a-z]+")
+_STOP = frozenset(["on", "for", "at", "to", "the", "a", "an", "of", "and", "in", "from", "by", "with", "paid",
+                   "spent", "bought", "rs", "inr", "today", "yesterday", "tomorrow", "last", "ago", "days"])
+
+
+def features(text):
+    """Hashed feature ids (with repeats) for one text."""
+    words = [w for w in _WORD.findall((text or "").lower()) if w not in _STOP]
+    out = []
+    crc = zlib.crc32
+    for i, w in enumerate(words):
+        out.append(crc(b"w:" + w.encode()) & _MASK)
+        if i:
+            out.append(crc(f"b:{words[i - 1]} {w}".encode()) & _MASK)
+        padded = f" {w} ".encode()
+        for j in range(len(padded) - 2):
+            out.append(crc(b"c:" + padded[j:j + 3]) & _MASK)
+    return out
+
+
+class CategoryModel:
+    def __init__(self, classes, log_prior, rows, temperature=1.0, meta=None):
+        self.classes = list(classes)
+        self.log_prior = list(log_prior)
+        self.rows = rows                # feature id -> tuple of per-class log P(feature | class)
+        self.temperature = temperature
+        self.meta = meta or {}
+
+    def scores(self, text):
+        """Per-class log scores, or None when no feature of the text was seen in training."""
+        hit = [row for row in map(self.rows.get, features(text)) if row is not None]
+        if not hit:
+            return None
+        # One column-wise pass instead of a per-feature vector add
+        return [sum(col) for col in zip(self.log_prior, *hit)]
+
+    def _proba(self, scores):
+        t = self.temperature
+        top = max(scores)
+        exps = [math.exp((s - top) / t) for s in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def predict(self, text):
+        """(category, calibrated confidence), or None for text with no known features."""
+        scores = self.scores(text)
+        if scores is None:
+            return None
+        proba = self._proba(scores)
+        best = max(range(len(proba)), key=proba.__getitem__)
+        return self.classes[best], proba[best]
+
+    def save(self, path):
+        keys = array("I", self.rows.keys())
+        weights = array("f")
+        for k in keys:
+            weights.extend(self.rows[k])
+        header = {"classes": self.classes, "logPrior": self.log_prior, "temperature": self.temperature,
+                  "dimBits": DIM_BITS, "features": len(keys), "meta": self.meta}
+        with gzip.open(path, "wb", compresslevel=9) as fh:
+            fh.write(MAGIC)
+            fh.write(json.dumps(header).encode("utf-8") + b"\n")
+            fh.write(keys.tobytes())
+            fh.write(weights.tobytes())
+
+    @classmethod
+    def read(cls, path):
+        with gzip.open(path, "rb") as fh:
+            if fh.readline() != MAGIC:
+                raise ValueError(f"{path} is not a category model")
+            header = json.loads(fh.readline())
+            if header.get("dimBits") != DIM_BITS:
+                raise ValueError(f"{path} was trained with {header.get('dimBits')} hash bits, not {DIM_BITS}")
+            n, c = header["features"], len(header["classes"])
+            keys = array("I")
+            keys.frombytes(fh.read(n * keys.itemsize))
+            weights = array("f")
+            weights.frombytes(fh.read(n * c * weights.itemsize))
+        w = weights.tolist()
+        rows = {k: tuple(w[i * c:(i + 1) * c]) for i, k in enumerate(keys)}
+        return cls(header["classes"], header["logPrior"], rows, header["temperature"], header.get("meta"))
+
+
+def load(path):
+    """The model at path, or None when none is bundled or it cannot be read."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        started = time.perf_counter()
+        model = CategoryModel.read(path)
+        print("CATEGORY_MODEL_LOADED", json.dumps({"features": len(model.rows), "classes": len(model.classes),
+                                                  "ms": round((time.perf_counter() - started) * 1000, 1)}))
+        return model
+    except Exception as e:
+        print("CATEGORY_MODEL_LOAD_ERROR", path, str(e))
+        return None
+
+
+def fit(samples, temperature=1.0, alpha=ALPHA):
+    """Multinomial NB over (text, category) samples."""
+    classes = sorted({c for _, c in samples})
+    index = {c: i for i, c in enumerate(classes)}
+    k = len(classes)
+    docs = [0] * k
+    totals = [0] * k
+    counts = {}
+    for text, cat in samples:
+        ci = index[cat]
+        docs[ci] += 1
+        for f in features(text):
+            row = counts.get(f)
+            if row is None:
+                row = counts[f] = [0] * k
+            row[ci] += 1
+            totals[ci] += 1
+    vocab = len(counts)
+    denom = [math.log(totals[i] + alpha * vocab) for i in range(k)]
+    rows = {f: tuple(math.log(row[i] + alpha) - denom[i] for i in range(k)) for f, row in counts.items()}
+    n = sum(docs)
+    log_prior = [math.log(d / n) for d in docs]
+    return CategoryModel(classes, log_prior, rows, temperature)
+
+
+def calibrate(model, samples):
+    """Temperature with the lowest negative log-likelihood on held-out samples."""
+    scored = []
+    for text, cat in samples:
+        scores = model.scores(text)
+        if scores is not None and cat in model.classes:
+            scored.append((scores, model.classes.index(cat)))
+    if not scored:
+        return 1.0
+    best_t, best_nll = 1.0, float("inf")
+    for step in range(61):
+        t = 0.25 * 1.1 ** step   # 0.25 .. ~76
+        model.temperature = t
+        nll = -sum(math.log(max(model._proba(s)[ci], 1e-12)) for s, ci in scored) / len(scored)
+        if nll < best_nll:
+            best_t, best_nll = t, nll
+    model.temperature = best_t
+    return best_t
+
+
+def report(model, samples, ai_bound=None, thresholds=THRESHOLDS):
+    """Accuracy overall and, per threshold, how many AI-bound texts the model would answer
+    (AI calls avoided) and how often it is right when it does. ai_bound(text) says whether
+    the text would have reached Groq (no synonym and no exact rule)."""
+    rows = []
+    started = time.perf_counter()
+    for text, cat in samples:
+        pred = model.predict(text)
+        rows.append((pred, cat, ai_bound(text) if ai_bound else True))
+    us = (time.perf_counter() - started) / max(len(samples), 1) * 1e6
+    correct = sum(1 for p, c, _ in rows if p and p[0] == c)
+    bound = [(p, c) for p, c, b in rows if b]
+    out = {"samples": len(rows), "accuracy": round(correct / max(len(rows), 1), 4),
+           "aiBound": len(bound), "predictUs": round(us, 1), "thresholds": []}
+    for t in thresholds:
+        taken = [(p, c) for p, c in bound if p and p[1] >= t]
+        right = sum(1 for p, c in taken if p[0] == c)
+        out["thresholds"].append({"threshold": t, "aiCallsAvoided": round(len(taken) / max(len(bound), 1), 4),
+                                  "accuracyWhenUsed": round(right / len(taken), 4) if taken else None})
+    # Expected calibration error over 10 confidence bins
+    bins = [[0, 0.0, 0] for _ in range(10)]
+    for p, c, _ in rows:
+        if p:
+            b = bins[min(int(p[1] * 10), 9)]
+            b[0] += 1
+            b[1] += p[1]
+            b[2] += p[0] == c
+    out["ece"] = round(sum(abs(b[1] - b[2]) for b in bins if b[0]) / max(len(rows), 1), 4)
+    return out
+
+
+def split(samples, holdout):
+    """Deterministic split by text, so repeats of a text never straddle train and test."""
+    train, test = [], []
+    for s in samples:
+        (test if zlib.crc32(s[0].lower().encode()) % 1000 < holdout * 1000 else train).append(s)
+    return train, test
+
+
+# ----------------------- training data -----------------------
+
+def _label(index, cat):
+    cat = index.allowed_category(cat)
+    return cat if cat and cat != "Other" else None
+
+
+def _scan(table, **params):
+    while True:
+        res = table.scan(**params)
+        yield from res.get("Items", [])
+        if not res.get("LastEvaluatedKey"):
+            return
+        params["ExclusiveStartKey"] = res["LastEvaluatedKey"]
+
+
+def _expense_files(directory):
+    for path in sorted(glob.glob(os.path.join(directory, "part-*.ndjson*"))):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def load_samples(index, expenses_dir=None, use_rules=True, use_synonyms=True):
+    """(samples, rule terms) from CategoryRules, confirmed expenses and SYNONYMS."""
+    samples = []
+    rules = set()
+    if use_rules:
+        items = _scan(index._table(index.CATEGORY_RULES_TABLE), ProjectionExpression="#r, category, hits, agree",
+                      ExpressionAttributeNames={"#r": "rule"})
+        for it in items:
+            rules.add(it["rule"])
+            hits, agree = int(it.get("hits") or 0), int(it.get("agree") or 0)
+            cat = _label(index, it.get("category"))
+            if cat and not (hits >= 5 and agree / hits < 0.5):
+                samples.append((it["rule"], cat))
+    if expenses_dir:
+        items = _expense_files(expenses_dir)
+    else:
+        items = _scan(index._table(index.EXPENSES_TABLE), ProjectionExpression="rawText, category")
+    for it in items:
+        cat = _label(index, it.get("category"))
+        if cat and it.get("rawText"):
+            samples.append((str(it["rawText"]), cat))
+    if use_synonyms:
+        samples.extend((k, v) for k, v in index.SYNONYMS.items() if v != "Other")
+    return samples, rules
+
+
+def _ai_bound(index, rules):
+    def bound(text):
+        return not index.synonym_matcher.match(text) and index._extract_term(text) not in rules
+    return bound
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train or evaluate the local expense-category classifier")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    t = sub.add_parser("train", help="fit on CategoryRules + Expenses + SYNONYMS and save the model")
+    t.add_argument("--out", default="category_model.bin")
+    t.add_argument("--holdout", type=float, default=0.2, help="share held out to calibrate and report")
+    e = sub.add_parser("evaluate", help="report accuracy and AI calls avoided for a saved model")
+    e.add_argument("model")
+    for p in (t, e):
+        p.add_argument("--expenses-dir", help="exporter.py NDJSON output instead of scanning Expenses")
+        p.add_argument("--no-rules", action="store_true")
+        p.add_argument("--threshold", type=float, help="report only this confidence threshold")
+    args = parser.parse_args(argv)
+    import index
+
+    thresholds = (args.threshold,) if args.threshold else THRESHOLDS
+    samples, rules = load_samples(index, args.expenses_dir, use_rules=not args.no_rules,
+                                  use_synonyms=args.cmd == "train")
+    if args.cmd == "evaluate":
+        started = time.perf_counter()
+        model = CategoryModel.read(args.model)
+        load_ms = (time.perf_counter() - started) * 1000
+        result = report(model, samples, _ai_bound(index, rules), thresholds)
+        result.update(loadMs=round(load_ms, 1), features=len(model.rows), trainedAt=model.meta.get("trainedAt"))
+        print(json.dumps(result, indent=2))
+        return
+
+    train, test = split(samples, args.holdout)
+    if not train:
+        raise SystemExit("no labeled samples to train on")
+    model = fit(train)
+    temperature = calibrate(model, test) if test else 1.0
+    result = report(model, test, _ai_bound(index, rules), thresholds) if test else {}
+    final = fit(samples, temperature)
+    final.meta = {"trainedAt": datetime.utcnow().isoformat(), "samples": len(samples), "holdout": result}
+    final.save(args.out)
+    print(json.dumps({"out": args.out, "bytes": os.path.getsize(args.out), "features": len(final.rows),
+                      "classes": final.classes, "temperature": round(temperature, 3), "holdout": result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Shared fixtures: the expenses-api modules on sys.path and moto-backed DynamoDB tables.
+
+    python -m pytest backend/tests
+
+Tables match terraform/dynamodb.tf closely enough for the handler: Expenses with its
+userId-date-index, CategoryRules, UserBudgets, ExpenseRollups, AiCategoryCache and the
+InvestApp single table with GSI1.
+"""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda", "expenses-api-py"))
+
+os.environ.update(
+    AWS_DEFAULT_REGION="us-east-1",
+    AWS_ACCESS_KEY_ID="testing",
+    AWS_SECRET_ACCESS_KEY="testing",
+    METRICS_ENABLED="0",
+    GROQ_API_KEY="",
+)
+os.environ.pop("AWS_REGION", None)
+
+AI_CACHE_TABLE = "AiCategoryCache"
+
+
+def _strings(*names):
+    return [{"AttributeName": n, "AttributeType": "S"} for n in names]
+
+
+def _create_tables(ddb):
+    ddb.create_table(
+        TableName="Expenses", KeySchema=[{"AttributeName": "expenseId", "KeyType": "HASH"}],
+        AttributeDefinitions=_strings("expenseId", "userId", "date"), BillingMode="PAY_PER_REQUEST",
+        GlobalSecondaryIndexes=[{
+            "IndexName": "userId-date-index",
+            "KeySchema": [{"AttributeName": "userId", "KeyType": "HASH"}, {"AttributeName": "date", "KeyType": "RANGE"}],
+            "Projection": {"ProjectionType": "ALL"},
+        }],
+    )
+    for name, key in (("CategoryRules", "rule"), ("UserBudgets", "userId"), (AI_CACHE_TABLE, "termHash")):
+        ddb.create_table(TableName=name, KeySchema=[{"AttributeName": key, "KeyType": "HASH"}],
+                         AttributeDefinitions=_strings(key), BillingMode="PAY_PER_REQUEST")
+    ddb.create_table(
+        TableName="ExpenseRollups",
+        KeySchema=[{"AttributeName": "userId", "KeyType": "HASH"}, {"AttributeName": "bucket", "KeyType": "RANGE"}],
+        AttributeDefinitions=_strings("userId", "bucket"), BillingMode="PAY_PER_REQUEST",
+    )
+    ddb.create_table(
+        TableName="InvestApp",
+        KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}, {"AttributeName": "sk", "KeyType": "RANGE"}],
+        AttributeDefinitions=_strings("pk", "sk", "GSI1PK", "GSI1SK"), BillingMode="PAY_PER_REQUEST",
+        GlobalSecondaryIndexes=[{
+            "IndexName": "GSI1",
+            "KeySchema": [{"AttributeName": "GSI1PK", "KeyType": "HASH"}, {"AttributeName": "GSI1SK", "KeyType": "RANGE"}],
+            "Projection": {"ProjectionType": "ALL"},
+        }],
+    )
+
+
+@pytest.fixture
+def ddb():
+    from moto import mock_aws
+
+    with mock_aws():
+        import boto3
+
+        resource = boto3.resource("dynamodb", region_name="us-east-1")
+        _create_tables(resource)
+        yield resource
+
+
+@pytest.fixture
+def index(ddb):
+    """The handler module with its per-container state reset for each test."""
+    import index as module
+
+    module._dynamodb = None
+    module._tables.clear()
+    module.rule_index.invalidate()
+    module.rule_learner._seen.clear()
+    module.rule_learner._pending.clear()
+    module.rule_learner._pending_count = 0
+    module.ai_cache.local._data.clear()
+    return module
+
+
+@pytest.fixture
+def call(index):
+    """call("METHOD /path", body, qs=..., sub=..., params=..., headers=...) -> (status, body, headers)."""
+
+    def invoke(route, body=None, qs=None, sub="u1", params=None, headers=None):
+        event = {
+            "requestContext": {"http": {"method": route.split()[0]}, "routeKey": route,
+                               "authorizer": {"jwt": {"claims": {"sub": sub}}}},
+            "body": json.dumps(body) if body is not None else None,
+            "queryStringParameters": qs,
+            "pathParameters": params,
+            "headers": headers or {},
+        }
+        resp = index.handler(event, None)
+        try:
+            payload = json.loads(resp["body"]) if resp.get("body") else None
+        except ValueError:
+            payload = resp["body"]
+        return resp["statusCode"], payload, resp.get("headers") or {}
+
+    return invoke
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from ai_cache import CategorizationCache, LRUCache, term_hash
+from conftest import AI_CACHE_TABLE
+
+
+def test_lru_evicts_oldest_and_expires():
+    lru = LRUCache(maxsize=2, ttl=60)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    lru.get("a")
+    lru.put("c", 3)
+    assert lru.get("b") is None and lru.get("a") == 1 and lru.evictions == 1
+    lru.put("d", 4, ttl=0)
+    assert lru.get("d") is None and lru.expirations == 1
+
+
+def test_shared_tier_serves_other_containers(ddb):
+    table = ddb.Table(AI_CACHE_TABLE)
+    first = CategorizationCache(lambda: table)
+    first.put("Dog  Food", "Pet Care", 0.9, "m")
+
+    second = CategorizationCache(lambda: table)
+    hit = second.get("dog food")
+    assert hit["category"] == "Pet Care" and second.shared_hits == 1
+    # now in the second container's local tier
+    assert second.get("dog food")["category"] == "Pet Care" and second.shared_hits == 1
+    assert table.get_item(Key={"termHash": term_hash("dog food")})["Item"]["expiresAt"] > time.time()
+
+
+def test_negative_entries_stay_local_and_expired_items_miss(ddb):
+    table = ddb.Table(AI_CACHE_TABLE)
+    cache = CategorizationCache(lambda: table, negative_ttl=60)
+    cache.put_negative("flaky", "timeout")
+    assert cache.get("flaky") == {"negative": True, "reason": "timeout"}
+    assert "Item" not in table.get_item(Key={"termHash": term_hash("flaky")})
+    assert CategorizationCache(lambda: table).get("flaky") is None
+
+    table.put_item(Item={"termHash": term_hash("old"), "category": "Food", "confidence": 1, "expiresAt": 1})
+    assert cache.get("old") is None
+
+
+def test_get_many_batches_shared_lookups(ddb, monkeypatch):
+    table = ddb.Table(AI_CACHE_TABLE)
+    writer = CategorizationCache(lambda: table)
+    terms = [f"shop {i}" for i in range(150)]
+    for term in terms:
+        writer.put(term, "Shopping", 0.8, "m")
+
+    reader = CategorizationCache(lambda: table)
+    reader.put_negative("flaky", "timeout")
+    calls = []
+    batch_get = table.meta.client.batch_get_item
+    monkeypatch.setattr(table.meta.client, "batch_get_item",
+                        lambda **kw: calls.append(kw) or batch_get(**kw))
+    monkeypatch.setattr(table, "get_item", lambda **kw: pytest.fail("per-term GetItem"))
+
+    hits = reader.get_many(terms + ["unknown", "flaky"])
+    assert len(calls) == 2
+    assert all(hits[t] == {"category": "Shopping", "confidence": 0.8, "model": "m",
+                           "cachedAt": hits[t]["cachedAt"]} for t in terms)
+    assert hits["unknown"] is None and hits["flaky"]["negative"]
+    assert reader.shared_hits == 150 and reader.shared_misses == 1
+    # Everything found is now served locally
+    assert reader.get_many(terms[:3]) and len(calls) == 2
@@ -0,0 +1,71 @@
+from datetime import date
+
+import pytest
+
+analytics = pytest.importorskip("analytics")
+
+AS_OF = date(2024, 3, 10)
+
+
+def _items():
+    items = [
+        {"expenseId": "f1", "date": "2024-01-15", "category": "Food", "amount": 100},
+        {"expenseId": "f2", "date": "2024-02-15", "category": "Food", "amount": 200},
+        {"expenseId": "f3", "date": "2024-03-01", "category": "Food", "amount": 50},
+        {"expenseId": "f4", "date": "2024-03-05", "category": "Food", "amount": 50},
+        {"expenseId": "t1", "date": "2024-03-02", "category": "Travel", "amount": 300},
+        {"expenseId": "bad", "date": "someday", "category": "Food", "amount": 999},
+        {"expenseId": "old", "date": "2023-12-31", "category": "Food", "amount": 999},
+    ]
+    items += [{"expenseId": f"s{d}", "date": f"2024-02-{d:02d}", "category": "Shopping", "amount": 100}
+              for d in range(1, 21)]
+    items.append({"expenseId": "tv", "date": "2024-02-25", "category": "Shopping", "amount": 1000,
+                  "rawText": "tv 1000"})
+    return items
+
+
+def test_trends_burn_rate_and_outliers():
+    out = analytics.analyze(analytics.Columns(_items()), AS_OF, months=3,
+                            budgets={"Food": 200, "Travel": 250, "Rent": 900})
+    assert out["window"]["months"] == ["2024-01", "2024-02", "2024-03"]
+    assert out["window"]["partialMonth"] and out["window"]["expenses"] == 26
+    assert out["categories"] == ["Shopping", "Food", "Travel"]
+    food = out["categories"].index("Food")
+    assert out["monthly"]["totals"][food] == [100, 200, 100]
+    assert out["monthly"]["rollingAvg"][food] == [100, 150, pytest.approx(133.33)]
+    # Trends use the completed months only
+    assert out["trends"]["changePct"][food] == 100.0
+    assert out["trends"]["slope"][food] == 100.0
+
+    burn = {b["category"]: b for b in out["burn"]["categories"]}
+    # 100 spent by day 10: 10/day, crosses 200 on day 20
+    assert burn["Food"]["status"] == "atRisk" and burn["Food"]["overspendDate"] == "2024-03-20"
+    assert burn["Travel"]["status"] == "over" and burn["Travel"]["overspendDate"] == "2024-03-02"
+    assert burn["Rent"]["spent"] == 0 and burn["Rent"]["status"] == "ok"
+    assert out["burn"]["total"]["budget"] == 1350 and out["burn"]["total"]["spent"] == 400
+
+    assert [o["expenseId"] for o in out["outliers"]] == ["tv"]
+    assert out["outliers"][0]["rawText"] == "tv 1000"
+
+
+def test_budgets_for_merges_month_overrides():
+    item = {"defaultBudgets": {"Food": 500, "Travel": "300"}, "overrides": {"2024-03": {"Food": 800, "Travel": 0}}}
+    assert analytics.budgets_for(item, "2024-03") == {"Food": 800.0}
+    assert analytics.budgets_for(item, "2024-04") == {"Food": 500.0, "Travel": 300.0}
+    assert analytics.budgets_for(None, "2024-03") == {}
+
+
+def test_analytics_route_reads_expenses_and_budgets(call, index):
+    for day, amount in ((1, 50), (5, 50)):
+        call("PUT /add", {"userId": "a", "amount": amount, "category": "Food", "rawText": "lunch",
+                          "date": f"2024-03-{day:02d}"})
+    index._table(index.USER_BUDGETS_TABLE).put_item(Item={"userId": "a", "budgets": {"Food": 200}})
+
+    status, body, _ = call("POST /analytics", {"userId": "a", "months": 2, "asOf": "2024-03-10"})
+    assert status == 200
+    assert body["categories"] == ["Food"] and body["monthly"]["totals"] == [[0, 100]]
+    assert body["burn"]["total"]["overspendDate"] == "2024-03-20"
+
+    assert call("POST /analytics", {"userId": "a", "months": 0})[0] == 200   # 0 means the default
+    assert call("POST /analytics", {"userId": "a", "months": 25})[0] == 400
+    assert call("POST /analytics", {"userId": "a", "asOf": "10/03/2024"})[0] == 400
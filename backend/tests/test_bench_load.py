@@ -0,0 +1,36 @@
+import os
+import random
+import sys
+from argparse import Namespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bench"))
+
+import bench_load  # noqa: E402
+
+
+def test_percentile_is_nearest_rank():
+    values = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    assert [bench_load.percentile(values, p) for p in (50, 95, 99)] == [5, 10, 10]
+    assert bench_load.percentile([7], 99) == 7 and bench_load.percentile([], 50) is None
+
+
+def test_mix_rejects_unknown_routes():
+    assert bench_load.parse_mix("POST /add=3, POST /list=1") == {"POST /add": 3.0, "POST /list": 1.0}
+    with pytest.raises(SystemExit):
+        bench_load.parse_mix("GET /nope=1")
+
+
+def test_every_mixed_route_replays_against_the_seed(index):
+    rng = random.Random(1)
+    args = Namespace(users=2, months=2, expenses=3, rules=20, portfolios=1, holdings=3, transactions=4)
+    data = bench_load.seed(index._ddb(), args, rng)
+    for route in bench_load.DEFAULT_MIX:
+        resp = index.handler(bench_load.make_event(route, data, rng), None)
+        assert resp["statusCode"] == 200, route
+
+    records = [{"Route": "POST /list", "Status": 200, "Latency": ms, "DynamoDBTime": 1.0, "DynamoDBCalls": 1,
+                "GroqTime": 0.0, "ReadCapacityUnits": 0.5, "WriteCapacityUnits": 0.0} for ms in (1.0, 2.0, 30.0)]
+    report = bench_load.summarize(records, 1.0)
+    assert report["routes"]["POST /list"]["p50Ms"] == 2.0 and report["overall"]["rcuTotal"] == 1.5
@@ -0,0 +1,40 @@
+import base64
+import gzip
+import json
+from decimal import Decimal
+
+import codec
+
+
+def test_dumps_handles_dynamodb_values():
+    body = json.loads(codec.dumps({"a": Decimal("1.5"), "n": Decimal(3), "tags": {"b", "a"}}, sort_keys=True))
+    assert body == {"a": 1.5, "n": 3, "tags": ["a", "b"]}
+
+
+def test_compress_negotiates_and_weakens_the_etag():
+    big = {"statusCode": 200, "headers": {"etag": '"abc"'}, "body": "x" * (codec.COMPRESS_MIN_BYTES + 10)}
+    resp = codec.compress(dict(big, headers=dict(big["headers"])), "br;q=0, gzip")
+    assert resp["headers"]["content-encoding"] == "gzip"
+    assert gzip.decompress(base64.b64decode(resp["body"])).decode() == big["body"]
+    assert resp["isBase64Encoded"] and resp["headers"]["etag"] == 'W/"abc"'
+
+    plain = codec.compress(dict(big, headers=dict(big["headers"])), "gzip;q=0")
+    assert plain["body"] == big["body"] and "content-encoding" not in plain["headers"]
+    small = {"statusCode": 200, "headers": {}, "body": "{}"}
+    assert codec.compress(small, "gzip") is small and "vary" not in small["headers"]
+
+
+def test_list_route_compresses_and_revalidates(call):
+    for day in range(1, 29):
+        call("PUT /add", {"userId": "a", "amount": 10, "category": "Food", "rawText": "lunch with the team " * 3,
+                          "date": f"2024-03-{day:02d}"})
+    status, body, headers = call("GET /budgets", qs={"userId": "a"})
+    assert status == 200 and headers["etag"].startswith('"')
+    assert call("GET /budgets", qs={"userId": "a"}, headers={"If-None-Match": headers["etag"]})[0] == 304
+
+    import index
+
+    event = {"requestContext": {"http": {"method": "POST"}, "routeKey": "POST /list"},
+             "body": json.dumps({"userId": "a"}), "headers": {"accept-encoding": "gzip"}}
+    resp = index.handler(event, None)
+    assert resp["headers"]["content-encoding"] in ("gzip", "br") and resp["isBase64Encoded"]
@@ -0,0 +1,23 @@
+import json
+import os
+import subprocess
+import sys
+
+HANDLER_DIR = os.path.join(os.path.dirname(__file__), "..", "lambda", "expenses-api-py")
+
+PROBE = """
+import json, sys
+import index
+loaded = lambda: sorted(m for m in ("boto3", "botocore", "http.client", "ssl") if m in sys.modules)
+at_import = loaded()
+resp = index.handler({"requestContext": {"http": {"method": "OPTIONS"}}}, None)
+print(json.dumps({"import": at_import, "options": loaded(), "status": resp["statusCode"]}))
+"""
+
+
+def test_import_and_preflight_do_not_load_boto3_or_http_stacks():
+    env = {**os.environ, "METRICS_ENABLED": "0"}
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=HANDLER_DIR, env=env, check=True,
+                         capture_output=True, text=True).stdout
+    report = json.loads(out.strip().splitlines()[-1])
+    assert report == {"import": [], "options": [], "status": 200}
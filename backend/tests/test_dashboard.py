@@ -0,0 +1,33 @@
+def _portfolio(call, sub="u1"):
+    _, body, _ = call("POST /portfolio", {"name": "Core"}, sub=sub)
+    return body["portfolioId"]
+
+
+def test_dashboard_composes_state_recent_log_and_drift(call):
+    pid = _portfolio(call)
+    call("PUT /portfolio/plan", {"portfolioId": pid, "plan": {"buckets": [
+        {"class": "Equity", "pct": 60}, {"class": "Debt", "pct": 40}]}})
+    call("POST /holdings", {"portfolioId": pid, "holding": {"id": "eq", "instrumentClass": "Equity", "currentValue": 900}})
+    call("POST /holdings", {"portfolioId": pid, "holding": {"id": "dt", "instrumentClass": "Debt", "currentValue": 100}})
+    for i in range(3):
+        call("POST /transactions", {"portfolioId": pid, "txn": {"id": f"t{i}", "type": "dividend",
+                                                              "date": f"2024-01-0{i + 1}", "amount": 5}})
+
+    status, body, headers = call("GET /portfolio/{id}/dashboard", params={"id": pid}, qs={"recent": "2"})
+    assert status == 200
+    assert body["portfolio"]["name"] == "Core" and len(body["plan"]["buckets"]) == 2
+    assert sorted(h["id"] for h in body["holdings"]) == ["dt", "eq"]
+    assert [t["id"] for t in body["recentTransactions"]] == ["t2", "t1"]
+    classes = {c["class"]: c for c in body["allocation"]["classes"]}
+    assert body["allocation"]["totalValue"] == 1000
+    assert (classes["Equity"]["driftPct"], classes["Equity"]["action"]) == (30.0, "Reduce")
+    assert classes["Debt"]["outOfTolerance"]
+
+    status, _, _ = call("GET /portfolio/{id}/dashboard", params={"id": pid}, qs={"recent": "2"},
+                        headers={"if-none-match": headers["etag"]})
+    assert status == 304
+
+
+def test_dashboard_is_scoped_to_the_caller(call):
+    pid = _portfolio(call)
+    assert call("GET /portfolio/{id}/dashboard", params={"id": pid}, sub="u2")[0] == 404
@@ -0,0 +1,46 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+import expense_text
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bench"))
+
+from bench_parser import CORPUS, TODAY, old_extract_term  # noqa: E402
+
+
+@pytest.mark.parametrize("text,amount,day,merchant", CORPUS, ids=[c[0] for c in CORPUS])
+def test_corpus(text, amount, day, merchant):
+    p = expense_text.parse(text, TODAY)
+    assert (p.amount, p.date or TODAY.isoformat(), p.merchant) == (amount, day or TODAY.isoformat(), merchant)
+    # CategoryRules and the AI cache are keyed by the old term
+    assert p.term == old_extract_term(text) == expense_text.extract_term(text)
+
+
+@pytest.mark.parametrize("text,amount,currency", [
+    ("tea 15 x 2", 30, None),
+    ("₹15×2 chai", 30, "INR"),
+    ("12,5 lunch", 12.5, None),
+    ("€1.200,50 hotel", 1200.5, "EUR"),
+    ("rent 1,20,000", 120000, None),
+    ("$ 12.99 netflix", 12.99, "USD"),
+    ("dinner 9 pm 450", 450, None),
+    ("2x coffee 150", 150, None),
+])
+def test_amount_shapes(text, amount, currency):
+    p = expense_text.parse(text, date(2024, 5, 10))
+    assert (p.amount, p.currency) == (amount, currency)
+
+
+@pytest.mark.parametrize("text", [
+    "coffee for  my team yesterday",        # odd spacing
+    "gift to a",                            # a phrase of one letter
+    "paid 500/-for rent",                   # preposition glued to the amount
+    "for verylongwordnumberone anotherverylongword third",  # cut at 41 characters
+    "lunch at mcdonald's 299",
+    "tip\tfor\nthe driver",
+])
+def test_term_matches_extract_term_on_odd_shapes(text):
+    assert expense_text.parse(text, TODAY).term == expense_text.extract_term(text)
@@ -0,0 +1,46 @@
+import csv
+import gzip
+import io
+import json
+import time
+
+import pytest
+
+import exporter
+
+
+def _rows(directory, manifest):
+    out = []
+    for part in manifest["parts"]:
+        with open(directory / part["name"], encoding="utf-8") as fh:
+            out += [json.loads(line) for line in fh]
+    return out
+
+
+def test_expense_export_stops_at_the_deadline_and_resumes(call, tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter, "PAGE_SIZE", 2)
+    for day in range(1, 6):
+        call("PUT /add", {"userId": "a", "amount": day, "category": "Food", "rawText": "x", "date": f"2024-03-0{day}"})
+    call("PUT /add", {"userId": "b", "amount": 9, "category": "Food", "rawText": "x", "date": "2024-03-01"})
+
+    first = exporter.run_export("expenses", str(tmp_path), "a", part_rows=3, deadline=time.monotonic() - 1)
+    assert (first["complete"], first["rows"]) == (False, 2)
+
+    done = exporter.run_export("expenses", str(tmp_path), "a", part_rows=3)
+    assert done["complete"] and done["rows"] == 5 and [p["rows"] for p in done["parts"]] == [2, 3]
+    assert [r["date"] for r in _rows(tmp_path, done)] == [f"2024-03-0{d}" for d in range(1, 6)]
+    # A finished export is returned as is; other parameters are refused
+    assert exporter.run_export("expenses", str(tmp_path), "a")["rows"] == 5
+    with pytest.raises(SystemExit):
+        exporter.run_export("expenses", str(tmp_path), "b")
+
+
+def test_transaction_export_as_gzipped_csv(call, tmp_path):
+    for i in range(3):
+        call("POST /transactions", {"portfolioId": "p1", "txn": {
+            "id": f"t{i}", "type": "buy", "holdingId": "h1", "units": 1, "price": 10, "date": f"2024-01-0{i + 1}"}})
+    manifest = exporter.run_export("transactions", str(tmp_path), "u1", "p1", fmt="csv", compress=True)
+    with gzip.open(tmp_path / manifest["parts"][0]["name"], "rt", encoding="utf-8") as fh:
+        rows = list(csv.DictReader(io.StringIO(fh.read())))
+    assert [r["transactionId"] for r in rows] == ["t0", "t1", "t2"]
+    assert rows[0]["holdingId"] == "h1" and rows[0]["units"] == "1"
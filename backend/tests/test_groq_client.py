@@ -0,0 +1,79 @@
+import socket
+import time
+
+import pytest
+
+from groq_client import CircuitBreaker, GroqClient, UpstreamError
+
+
+def _client(responses, threshold=1, cooldown=0.05, max_retries=0):
+    """GroqClient whose _send replays `responses`: (status, body) tuples or exceptions."""
+    client = GroqClient("http://stub.invalid", max_retries=max_retries, backoff_base=0.0,
+                        breaker=CircuitBreaker(threshold, cooldown))
+    replies = iter(responses)
+
+    def send(path, body, headers, read_timeout, deadline=None):
+        reply = next(replies)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply[0], None, reply[1]
+
+    client._send = send
+    return client
+
+
+def _reason(client):
+    with pytest.raises(UpstreamError) as err:
+        client.post_json("/v1/chat", {})
+    return err.value.reason
+
+
+def test_malformed_2xx_fails_the_half_open_trial():
+    client = _client([(503, b"down"), (200, b"<html>gateway</html>"), (200, b'{"ok": true}')])
+    assert _reason(client) == "http_503"
+    assert client.breaker.state == "open"
+    assert _reason(client) == "circuit_open"
+
+    time.sleep(0.06)
+    assert _reason(client) == "invalid_json"
+    assert client.breaker.state == "open"     # the trial ended and re-opened the circuit
+
+    time.sleep(0.06)
+    assert client.post_json("/v1/chat", {}) == {"ok": True}
+    assert client.breaker.state == "closed"
+
+
+def test_retries_5xx_but_not_timeouts_or_client_errors():
+    client = _client([(502, b""), (200, b"{}")], threshold=5, max_retries=2)
+    assert client.post_json("/v1/chat", {}) == {}
+    assert client.stats["retries"] == 1
+
+    client = _client([socket.timeout(), (200, b"{}")], threshold=5, max_retries=2)
+    assert _reason(client) == "timeout"
+    assert client.stats["requests"] == 1
+
+    client = _client([(400, b"bad"), (200, b"{}")], threshold=1, max_retries=2)
+    assert _reason(client) == "http_400"
+    assert client.breaker.state == "closed"
+
+
+def test_deadline_caps_the_read_timeout_and_skips_late_attempts():
+    # Accepts connections (the kernel completes the handshake) but never answers
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(4)
+    try:
+        client = GroqClient(f"http://127.0.0.1:{server.getsockname()[1]}", read_timeout=5, max_retries=0,
+                            breaker=CircuitBreaker(5, 1))
+        started = time.monotonic()
+        with pytest.raises(UpstreamError) as err:
+            client.post_json("/v1/chat", {}, deadline=started + 0.2)
+        assert err.value.reason == "timeout"
+        assert time.monotonic() - started < 1.5
+
+        with pytest.raises(UpstreamError) as err:
+            client.post_json("/v1/chat", {}, deadline=time.monotonic() - 0.01)
+        assert err.value.reason == "timeout"
+        assert client.stats["connects"] == 1
+    finally:
+        server.close()
@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+import holdings
+
+PK = "USER#u1"
+
+
+def _buy(call, date, units, price=100, tid=None, kind="buy", holding="h1"):
+    txn = {"type": kind, "holdingId": holding, "units": units, "price": price, "date": date}
+    if tid:
+        txn["id"] = tid
+    return call("POST /transactions", {"portfolioId": "p1", "txn": txn})
+
+
+def _snapshot(index, holding="h1"):
+    item = index.table(index.INVEST_TABLE).get_item(Key={"pk": PK, "sk": f"HOLDING#p1#{holding}"})["Item"]
+    return item["data"]["units"], item["data"]["investedAmount"], item.get("opening")
+
+
+def _legacy_holding(index):
+    """A holding kept by the client (data.units already counts its one logged buy of 10)
+    and that buy, both written before snapshots existed."""
+    table = index.table(index.INVEST_TABLE)
+    table.put_item(Item={"pk": PK, "sk": "HOLDING#p1#h1", "entityType": "HOLDING", "portfolioId": "p1",
+                         "holdingId": "h1", "data": {"id": "h1", "units": 10, "investedAmount": 1000}})
+    table.put_item(Item={"pk": PK, "sk": "TRANSACTION#p1#2024-01-10#old", "entityType": "TRANSACTION",
+                         "portfolioId": "p1", "transactionId": "old",
+                         "data": {"holdingId": "h1", "type": "buy", "units": 10, "price": 100}})
+    return table
+
+
+def test_forward_backdated_and_duplicate_transactions(call, index):
+    assert _buy(call, "2024-01-10", 10, tid="a")[0] == 200
+    status, body, _ = _buy(call, "2024-02-01", 4, price=150, kind="sell")
+    assert status == 200 and body["holding"]["units"] == 6
+    # Backdated buy replays the sell after it: avg cost (1000 + 200) / 12, 4 sold
+    status, body, _ = _buy(call, "2024-01-05", 2)
+    assert body["holding"]["units"] == 8
+    assert _snapshot(index)[:2] == (8, Decimal(800))
+    assert _buy(call, "2024-01-10", 1, tid="a")[0] == 409
+    assert _buy(call, "2024-03-01", 9, kind="sell")[0] == 400
+    assert holdings.rebuild(index.table(index.INVEST_TABLE), dry_run=True)["drifted"] == 0
+
+
+def test_legacy_holding_is_not_double_counted(call, index):
+    table = _legacy_holding(index)
+    status, body, _ = _buy(call, "2024-02-01", 5)
+    assert status == 200 and body["holding"]["units"] == 15
+    units, invested, opening = _snapshot(index)
+    assert (units, invested) == (15, 1500) and opening == {"units": 0, "investedAmount": 0}
+    assert holdings.rebuild(table, dry_run=True)["drifted"] == 0
+
+    # Backdated before the legacy buy: replays it and the new one on top of the new entry
+    _buy(call, "2024-01-01", 1)
+    assert _snapshot(index)[0] == 16
+    assert holdings.rebuild(table, dry_run=True)["drifted"] == 0
+
+
+def test_rebuild_ignores_an_opening_stored_from_legacy_data(index):
+    table = _legacy_holding(index)
+    # Snapshot written before the fix: opening copied from data, which counted the legacy buy
+    table.update_item(Key={"pk": PK, "sk": "HOLDING#p1#h1"},
+                      UpdateExpression="SET opening = :o, lastTxnSk = :sk, #d.units = :u",
+                      ExpressionAttributeNames={"#d": "data"},
+                      ExpressionAttributeValues={":o": {"units": 10, "investedAmount": 1000},
+                                                 ":sk": "TRANSACTION#p1#2024-01-10#old", ":u": 20})
+    report = holdings.rebuild(table, dry_run=True)
+    assert report["drifted"] == 1 and report["drift"][0]["expected"]["units"] == "10"
+
+    holdings.rebuild(table)
+    units, _, opening = _snapshot(index)
+    assert units == 10 and opening["units"] == 0
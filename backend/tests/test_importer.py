@@ -0,0 +1,37 @@
+import importer
+
+
+def test_amounts_with_currency_marks():
+    assert importer.signed_amount("Rs. 500") == 500
+    assert importer.signed_amount("Rs.500") == 500
+    assert importer.signed_amount("INR 1,200.50") == 1200.50
+    assert importer.signed_amount("₹ 75") == 75
+    assert importer.signed_amount("$12.5") == 12.5
+    assert importer.signed_amount("") is None
+
+
+def test_credit_markers():
+    assert importer.signed_amount("(1,200.00)") == -1200
+    assert importer.signed_amount("Rs. 300 Cr") == -300
+    assert importer.parse_amount("Rs. 300 Cr") is None
+    assert importer.parse_amount("-40", debits_negative=True) == 40
+
+
+def test_import_skips_credits_and_reimported_rows(index, tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text(
+        "Txn Date,Narration,Withdrawal Amt.,Deposit Amt.\n"
+        "01/03/2024,Uber cab ride,Rs. 250,\n"
+        "01/03/2024,Salary,,50000\n"
+        "02/03/2024,Uber cab ride,Rs.250,\n"
+        "02/03/2024,Uber cab ride,Rs.250,\n",
+        encoding="utf-8",
+    )
+    report = importer.run_import(str(path), "a", progress_every=0)
+    assert (report["rows"], report["written"], report["credits"]) == (4, 3, 1)
+    items = index.table(index.EXPENSES_TABLE).scan()["Items"]
+    assert sorted(it["amount"] for it in items) == [250, 250, 250]
+    assert {it["category"] for it in items} == {"Travel"}
+
+    again = importer.run_import(str(path), "a", progress_every=0)
+    assert (again["written"], again["duplicates"]) == (0, 3)
@@ -0,0 +1,39 @@
+def _txn(call, pid, date, tid, **extra):
+    status, _, _ = call("POST /transactions", {"portfolioId": pid, "txn": {
+        "id": tid, "type": "dividend", "date": date, "amount": 10, **extra}})
+    assert status == 200
+
+
+def test_transactions_by_date_range_pages_in_order(call):
+    for i, date in enumerate(["2024-01-05", "2024-02-10", "2024-02-20", "2024-03-01"]):
+        _txn(call, "p1", date, f"t{i}")
+    _txn(call, "p2", "2024-02-15", "other")
+
+    _, body, _ = call("GET /transactions", qs={"portfolioId": "p1", "start": "2024-02", "end": "2024-02"})
+    assert [t["id"] for t in body["items"]] == ["t1", "t2"]
+
+    ids, cursor = [], None
+    while True:
+        qs = {"portfolioId": "p1", "limit": "3", "order": "desc", **({"cursor": cursor} if cursor else {})}
+        _, body, _ = call("GET /transactions", qs=qs)
+        ids += [t["id"] for t in body["items"]]
+        cursor = body["nextCursor"]
+        if not cursor:
+            break
+    assert ids == ["t3", "t2", "t1", "t0"]
+
+    status, _, _ = call("GET /transactions", qs={"portfolioId": "p1", "start": "2024-03", "end": "2024-01"})
+    assert status == 400
+
+
+def test_cursor_and_fields_stay_inside_the_queried_range(call):
+    for i in range(3):
+        call("POST /holdings", {"portfolioId": "p1", "holding": {"id": f"h{i}", "name": f"Fund {i}", "units": i}})
+    call("POST /holdings", {"portfolioId": "p2", "holding": {"id": "x", "name": "Other"}})
+
+    _, body, _ = call("GET /holdings", qs={"portfolioId": "p1", "limit": "2", "fields": "name"})
+    assert body["items"] == [{"id": "h0", "name": "Fund 0"}, {"id": "h1", "name": "Fund 1"}]
+    # A p1 cursor cannot be replayed against p2's range, nor against another user's
+    assert call("GET /holdings", qs={"portfolioId": "p2", "cursor": body["nextCursor"]})[0] == 400
+    assert call("GET /holdings", qs={"portfolioId": "p1", "cursor": body["nextCursor"]}, sub="u2")[0] == 400
+    assert call("GET /holdings", qs={"portfolioId": "p1", "fields": "a-b"})[0] == 400
@@ -0,0 +1,29 @@
+from keyword_matcher import KeywordMatcher
+
+
+def _matcher():
+    return KeywordMatcher({"gas": "Utilities", "gas bill": "Utilities-Bill", "uber": "Travel",
+                           "ubereats": "Food", "pizza": "Food", "cab": "Travel"})
+
+
+def test_longest_word_bounded_keyword_wins():
+    m = _matcher()
+    assert m.match("paid gas bill 900") == ("gas bill", "Utilities-Bill")
+    assert m.match("ubereats dinner") == ("ubereats", "Food")
+    assert m.match("uber to office") == ("uber", "Travel")
+
+
+def test_words_inside_other_words_do_not_match():
+    m = _matcher()
+    assert m.match("vegas trip") is None
+    assert m.match("scabbard") is None
+    # a single plural "s" is tolerated
+    assert m.match("2 pizzas") == ("pizza", "Food")
+
+
+def test_ties_do_not_depend_on_insertion_order():
+    a = KeywordMatcher({"cab": "Travel", "pizza": "Food"})
+    b = KeywordMatcher({"pizza": "Food", "cab": "Travel"})
+    text = "pizza then cab"
+    assert a.match(text) == b.match(text) == ("pizza", "Food")
+    assert [h[2] for h in _matcher().find_all("GAS bill")] == ["gas", "gas bill"]
@@ -0,0 +1,46 @@
+def _add(call, user, day, amount=10, category="Travel", text="cab"):
+    status, body, _ = call("PUT /add", {"userId": user, "amount": amount, "category": category,
+                                        "rawText": text, "date": f"2024-03-{day:02d}"})
+    assert status == 200
+    return body["expenseId"]
+
+
+def test_list_pages_newest_first_with_cursor(call):
+    for day in range(1, 6):
+        _add(call, "a", day)
+    _add(call, "b", 3)
+
+    dates, cursor = [], None
+    while True:
+        status, body, _ = call("POST /list", {"userId": "a", "limit": 2, "cursor": cursor})
+        assert status == 200
+        assert len(body["items"]) <= 2
+        dates += [it["date"] for it in body["items"]]
+        cursor = body["nextCursor"]
+        if not cursor:
+            break
+    assert dates == [f"2024-03-{d:02d}" for d in range(5, 0, -1)]
+
+
+def test_list_date_range_and_category(call):
+    for day in range(1, 6):
+        _add(call, "a", day)
+    _add(call, "a", 4, category="Food", text="lunch")
+
+    _, body, _ = call("POST /list", {"userId": "a", "start": "2024-03-02", "end": "2024-03-04", "order": "asc"})
+    assert [it["date"] for it in body["items"]] == ["2024-03-02", "2024-03-03", "2024-03-04", "2024-03-04"]
+
+    _, body, _ = call("POST /list", {"userId": "a", "category": "Food"})
+    assert [it["rawText"] for it in body["items"]] == ["lunch"]
+
+
+def test_list_rejects_another_users_cursor(call):
+    for day in range(1, 4):
+        _add(call, "a", day)
+    _, body, _ = call("POST /list", {"userId": "a", "limit": 1})
+    assert body["nextCursor"]
+
+    status, _, _ = call("POST /list", {"userId": "b", "cursor": body["nextCursor"]})
+    assert status == 400
+    status, _, _ = call("POST /list", {"userId": "a", "cursor": "not-a-cursor"})
+    assert status == 400
@@ -0,0 +1,36 @@
+import json
+
+import metrics
+
+
+def _records(capsys):
+    lines = capsys.readouterr().out.splitlines()
+    return [json.loads(line) for line in lines if line.startswith('{"Route"')]
+
+
+def test_one_emf_record_per_request_with_dynamodb_timing(call, monkeypatch, capsys):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    call("PUT /add", {"userId": "a", "amount": 10, "category": "Food", "rawText": "lunch", "date": "2024-03-01"})
+    call("GET /nope")
+    call("OPTIONS /add")
+
+    add, unmatched, options = _records(capsys)
+    assert (add["Route"], add["Status"], add["Errors"]) == ("PUT /add", 200, 0)
+    assert add["DynamoDBCalls"] >= 1 and add["DynamoDBTime"] > 0
+    assert add["WriteCapacityUnits"] > 0 and "Expenses" in add["ConsumedCapacity"]
+    names = {m["Name"] for m in add["_aws"]["CloudWatchMetrics"][0]["Metrics"]}
+    assert {"Latency", "DynamoDBTime", "GroqCalls", "ReadCapacityUnits"} <= names
+    assert (unmatched["Route"], unmatched["Status"]) == ("UNMATCHED", 404)
+    assert options["Route"] == "OPTIONS" and options["DynamoDBCalls"] == 0
+
+
+def test_propagate_counts_work_done_on_pool_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    metrics.begin("POST /add/batch")
+    timed = metrics.propagate(lambda: metrics.add_time("Groq", 5.0))
+    with ThreadPoolExecutor(2) as pool:
+        list(pool.map(lambda _: timed(), range(3)))
+    record = metrics.end(200)
+    assert (record["GroqCalls"], record["GroqTime"]) == (3, 15.0)
+    assert metrics.current() is None
@@ -0,0 +1,33 @@
+from datetime import date
+
+import pytest
+
+performance = pytest.importorskip("performance")
+
+
+def _txn(day, units, legacy=False):
+    item = {"sk": f"TRANSACTION#p1#{day}#{units}",
+            "data": {"holdingId": "h1", "type": "buy", "units": units, "price": 100, "date": day}}
+    if not legacy:
+        item["holdingId"] = "h1"
+    return item
+
+
+def test_legacy_trades_are_not_counted_twice_in_a_stored_opening():
+    # A legacy holding of 10 whose buy is in the log, then a new buy of 5: the opening
+    # record_transaction stored before the fix already counts the logged buy
+    holding = {"sk": "HOLDING#p1#h1", "holdingId": "h1", "opening": {"units": 10, "investedAmount": 1000},
+               "data": {"units": 15, "investedAmount": 1500, "price": 100}}
+    txns = [_txn("2024-01-10", 10, legacy=True), _txn("2024-02-01", 5)]
+    out = performance.compute(txns, [holding], as_of=date(2024, 3, 1))
+    h = out["holdings"][0]
+    assert (h["units"], h["netInvested"]) == (15, 1500)
+    assert out["summary"]["netInvested"] == 1500
+
+
+def test_opening_without_legacy_trades_counts_once():
+    holding = {"sk": "HOLDING#p1#h1", "holdingId": "h1", "opening": {"units": 10, "investedAmount": 1000},
+               "data": {"units": 15, "investedAmount": 1500, "price": 120, "priceAsOf": "2024-02-15"}}
+    out = performance.compute([_txn("2024-02-01", 5)], [holding], as_of=date(2024, 3, 1), opened="2024-01-01")
+    h = out["holdings"][0]
+    assert (h["units"], h["netInvested"], h["value"]) == (15, 1500, 1800)
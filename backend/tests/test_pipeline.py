@@ -0,0 +1,24 @@
+import time
+
+import pipeline
+
+
+def test_higher_stage_wins_and_deferred_stage_is_not_started():
+    ran = []
+    p = pipeline.Pipeline("Test", workers=2)
+    stages = [
+        pipeline.Stage("Slow", lambda: time.sleep(0.05) or "slow", pipeline.EAGER),
+        pipeline.Stage("Fast", lambda: "fast", pipeline.EAGER),
+        pipeline.Stage("Late", lambda: ran.append(1) or "late", pipeline.DEFERRED),
+    ]
+    outcome = p.run(stages, 1000)
+    assert (outcome.winner, outcome.value) == ("Slow", "slow")
+    assert ran == []
+
+
+def test_add_gives_groq_only_what_is_left_of_the_budget(call, index, monkeypatch):
+    seen = []
+    monkeypatch.setattr(index, "_get_category_from_ai_cached",
+                        lambda text, **kw: seen.append(kw["deadline"] - time.monotonic()) or {"category": ""})
+    call("POST /add", {"userId": "u1", "rawText": "biryani 250"})
+    assert 0 < seen[0] < index.CATEGORIZE_BUDGET_MS / 1000
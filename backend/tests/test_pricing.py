@@ -0,0 +1,42 @@
+import json
+from decimal import Decimal
+
+import pricing
+
+
+class MovingProvider(pricing.FilePriceProvider):
+    """File prices; the first lookup also moves one holding's units, as a concurrent
+    POST /transactions would between the scan and the write."""
+
+    def __init__(self, path, table):
+        super().__init__(path)
+        self.table = table
+
+    def get_prices(self, symbols):
+        self.table.update_item(Key={"pk": "USER#a", "sk": "HOLDING#p1#h0"}, UpdateExpression="SET #d.units = :u",
+                               ExpressionAttributeNames={"#d": "data"}, ExpressionAttributeValues={":u": 3})
+        return super().get_prices(symbols)
+
+
+def test_refresh_revalues_each_holding_on_its_own(ddb, tmp_path):
+    table = ddb.Table("InvestApp")
+    for i, (symbol, units) in enumerate([("INFY", 2), ("INFY", 5), ("TCS", 1), ("NOPE", 4)]):
+        table.put_item(Item={"pk": "USER#a", "sk": f"HOLDING#p1#h{i}", "entityType": "HOLDING",
+                             "data": {"symbol": symbol, "units": units}})
+    table.put_item(Item={"pk": "USER#a", "sk": "HOLDING#p1#cash", "entityType": "HOLDING", "data": {"units": 1}})
+    prices = tmp_path / "prices.json"
+    prices.write_text(json.dumps({"infy": 1500.25, "TCS": 3900}), encoding="utf-8")
+
+    report = pricing.refresh(table, MovingProvider(str(prices), table), segments=2)
+    assert (report["scanned"], report["priced"], report["noPrice"]) == (4, 3, 1)
+    assert (report["updated"], report["conflicts"], report["errors"]) == (2, 1, 0)
+
+    def data(i):
+        return table.get_item(Key={"pk": "USER#a", "sk": f"HOLDING#p1#h{i}"})["Item"]["data"]
+
+    assert "currentValue" not in data(0)     # units moved: left for the next run
+    assert data(1)["currentValue"] == Decimal("7501.25") and data(2)["currentValue"] == 3900
+    assert table.get_item(Key={"pk": "INSTRUMENT#INFY", "sk": "PRICE"})["Item"]["lastPrice"] == Decimal("1500.25")
+
+    again = pricing.refresh(table, pricing.FilePriceProvider(str(prices)), segments=2)
+    assert (again["updated"], again["unchanged"]) == (1, 2)
@@ -0,0 +1,44 @@
+import rebalance
+
+PLAN = {"buckets": [{"class": "Equity", "pct": 50}, {"class": "Debt", "pct": 50}]}
+
+
+def _holdings(**values):
+    return [{"instrumentClass": c, "currentValue": v} for c, v in values.items()]
+
+
+def _totals(result):
+    out = {"Reduce": 0.0, "Increase": 0.0}
+    for t in result["trades"]:
+        out[t["action"]] += t["amount"]
+    return out
+
+
+def test_buys_never_exceed_the_sells_left_after_thresholds():
+    # Gold's 5 is below the minimum trade, so only Equity's 100 funds Debt's 105 shortfall
+    result = rebalance.propose(_holdings(Equity=600, Debt=395, Gold=5), PLAN, {"minTradeAmount": 10})
+    totals = _totals(result)
+    assert totals == {"Reduce": 100.0, "Increase": 100.0}
+    assert not any(t["class"] == "Gold" for t in result["trades"])
+
+
+def test_turnover_cap_locks_and_cash_only():
+    capped = rebalance.propose(_holdings(Equity=800, Debt=200), PLAN, {"turnoverLimitPct": 10})
+    assert _totals(capped) == {"Reduce": 100.0, "Increase": 100.0}
+
+    locked = rebalance.propose(_holdings(Equity=800, Debt=200), PLAN, locks=["Equity"])
+    assert locked["trades"] == [] and locked["lockedClasses"] == ["Equity"]
+
+    cash = rebalance.propose(_holdings(Equity=800, Debt=200), PLAN, {"cashOnly": True})
+    assert _totals(cash)["Reduce"] == 0 and cash["driftScore"] == 30.0
+
+
+def test_batch_cli_scores_portfolios_and_exits_zero(ddb, monkeypatch, capsys):
+    table = ddb.Table("InvestApp")
+    table.put_item(Item={"pk": "USER#a", "sk": "ALLOCATION#p1", "entityType": "ALLOCATION", "plan": PLAN})
+    for cls, value in (("Equity", 900), ("Debt", 100)):
+        table.put_item(Item={"pk": "USER#a", "sk": f"HOLDING#p1#{cls}", "entityType": "HOLDING",
+                             "data": {"instrumentClass": cls, "currentValue": value}})
+    monkeypatch.setenv("INVEST_TABLE", "InvestApp")
+    assert rebalance.main(["batch", "--user", "a"]) == 0
+    assert '"driftScore": 40.0' in capsys.readouterr().out
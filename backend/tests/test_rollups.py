@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+import rollups
+
+
+def _add(call, amount, category, day, user="a"):
+    _, body, _ = call("PUT /add", {"userId": user, "amount": amount, "category": category, "rawText": "x",
+                                   "date": f"2024-03-{day:02d}"})
+    return body["expenseId"]
+
+
+def test_summaries_follow_add_edit_delete(call, index):
+    _add(call, 100, "Food", 1)
+    cab = _add(call, 40, "Travel", 2)
+    _add(call, 60, "Food", 3)
+
+    _, body, _ = call("POST /summary/monthly", {"userId": "a", "month": "2024-03"})
+    assert body["totals"] == {"Food": 160, "Travel": 40}
+
+    # Moving an expense to another category moves its amount between buckets
+    call("POST /edit", {"expenseId": cab, "updates": {"category": "Food", "amount": 50}})
+    _, body, _ = call("POST /summary/monthly", {"userId": "a", "month": "2024-03"})
+    assert body["totals"]["Food"] == 210
+    assert body["totals"].get("Travel", 0) == 0
+
+    call("POST /delete", {"expenseId": cab})
+    _, body, _ = call("POST /summary/category", {"userId": "a", "category": "Food"})
+    assert body["total"] == 160
+
+    table = index._table(index.ROLLUPS_TABLE)
+    assert rollups.read_bucket(table, "a", rollups.month_bucket("2024-03"))["Food"][1] == 2
+
+
+def test_rebuild_reports_and_repairs_drift(call, index):
+    _add(call, 100, "Food", 1)
+    _add(call, 25, "Food", 2)
+    expenses, table = index._table(index.EXPENSES_TABLE), index._table(index.ROLLUPS_TABLE)
+    month = rollups.month_bucket("2024-03")
+    # A write that never reached the rollups
+    rollups.apply_deltas(table, {("a", month, "Food"): [Decimal(-25), -1]})
+
+    report = rollups.rebuild(expenses, table, user_id="a", dry_run=True)
+    assert report["driftedBuckets"] == 1
+    assert rollups.read_bucket(table, "a", month)["Food"] == (100, 1)
+
+    rollups.rebuild(expenses, table, user_id="a")
+    assert rollups.read_bucket(table, "a", month)["Food"] == (125, 2)
+    assert rollups.rebuild(expenses, table, user_id="a", dry_run=True)["driftedBuckets"] == 0
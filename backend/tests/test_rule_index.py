@@ -0,0 +1,91 @@
+import threading
+import time
+
+from rule_index import CachedRuleIndex, RuleIndex
+
+
+class SlowRulesTable:
+    """scan() over in-memory rules, one page per call, sleeping `delay` per page."""
+
+    def __init__(self, rules, delay=0.0, page=2):
+        self.rules = list(rules.items())
+        self.delay = delay
+        self.page = page
+        self.scans = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def scan(self, **params):
+        start = int(params.get("ExclusiveStartKey", {}).get("i", 0))
+        if start == 0:
+            self.scans += 1
+        self.release.wait(5)
+        time.sleep(self.delay)
+        items = [{"rule": r, "category": c} for r, c in self.rules[start:start + self.page]]
+        out = {"Items": items}
+        if start + self.page < len(self.rules):
+            out["LastEvaluatedKey"] = {"i": start + self.page}
+        return out
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_lookup_matches_any_word_order_and_prefixes():
+    index = RuleIndex([("laptop repair", "Shopping"), ("dog food", "Pet Care"), ("repair", "Other")])
+    assert index.lookup("repair laptop") == ("laptop repair", "Shopping")
+    assert index.lookup("lap repair") == ("laptop repair", "Shopping")
+    assert index.lookup("repair") == ("repair", "Other")
+    assert index.lookup("cat food") is None
+
+
+def test_concurrent_cold_callers_share_one_scan():
+    table = SlowRulesTable({"dog food": "Pet Care", "cab ride": "Travel", "rent": "Housing"}, delay=0.05)
+    cached = CachedRuleIndex(lambda: table, ttl=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cached.get())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert table.scans == 1
+    assert all(r is results[0] for r in results) and len(results[0]) == 3
+
+
+def test_stale_index_keeps_serving_while_rebuilt_in_background():
+    rules = {"dog food": "Pet Care"}
+    table = SlowRulesTable(rules)
+    cached = CachedRuleIndex(lambda: table, ttl=0.05)
+    old = cached.get()
+    rules["cab ride"] = "Travel"
+    table.rules = list(rules.items())
+    table.release.clear()          # the rebuild blocks until released
+    time.sleep(0.1)
+
+    assert cached.get() is old     # stale: answered at once, rebuild started
+    assert cached.get() is old     # still one rebuild in flight
+    cached.learn("metro card", "Travel")
+    table.release.set()
+    assert _wait_for(lambda: cached.loaded() is not old)
+    assert table.scans == 2
+    fresh = cached.loaded()
+    assert fresh.get("cab ride") == "Travel"
+    # A rule learned while the scan ran survives the swap
+    assert fresh.get("metro card") == "Travel"
+
+
+def test_no_wait_misses_until_the_background_load_lands():
+    table = SlowRulesTable({"dog food": "Pet Care"})
+    table.release.clear()
+    cached = CachedRuleIndex(lambda: table, ttl=60)
+    assert cached.get(wait=False) is None
+    table.release.set()
+    assert _wait_for(lambda: cached.loaded() is not None)
+    assert cached.get(wait=False).get("dog food") == "Pet Care"
+    assert table.scans == 1
@@ -0,0 +1,56 @@
+import threading
+
+from rule_learning import RuleLearner
+
+
+def _learner(ddb, **opts):
+    table = ddb.Table("CategoryRules")
+    learned = []
+    learner = RuleLearner(lambda: table, on_new=lambda r, c: learned.append((r, c)), **opts)
+    return table, learner, learned
+
+
+def test_new_rules_are_written_before_returning(ddb):
+    table, learner, learned = _learner(ddb)
+    learner.observe("dog food", "Pet Care")
+    learner.observe("cab ride", "Travel", confirmed=False)
+    assert table.get_item(Key={"rule": "dog food"})["Item"]["hits"] == 1
+    assert table.get_item(Key={"rule": "cab ride"})["Item"]["hits"] == 0
+    assert learned == [("dog food", "Pet Care"), ("cab ride", "Travel")]
+
+    # The first writer wins; a later writer learns the stored category
+    _, other, other_learned = _learner(ddb)
+    other.observe("dog food", "Shopping")
+    assert other_learned == [("dog food", "Pet Care")] and other.stats["disagreements"] == 1
+
+
+def test_known_rules_are_coalesced_into_one_update(ddb):
+    table, learner, _ = _learner(ddb, flush_seconds=3600, flush_max=1000)
+    learner.observe("dog food", "Pet Care")
+    for _ in range(3):
+        learner.observe("dog food", "Pet Care")
+    learner.observe("dog food", "Shopping")
+    assert table.get_item(Key={"rule": "dog food"})["Item"]["hits"] == 1
+    learner.flush(timeout=5)
+    item = table.get_item(Key={"rule": "dog food"})["Item"]
+    assert (item["hits"], item["agree"], item["category"]) == (5, 4, "Pet Care")
+    assert learner.stats["updates"] == 3 and learner.stats["flushes"] == 1
+
+
+def test_counts_survive_concurrent_requests_and_flushes(ddb):
+    table, learner, _ = _learner(ddb, flush_seconds=3600, flush_max=50)
+    learner.observe("metro card", "Travel")
+
+    def requests():
+        for _ in range(200):
+            learner.observe("metro card", "Travel")
+
+    threads = [threading.Thread(target=requests) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    learner.flush(timeout=10)
+    assert table.get_item(Key={"rule": "metro card"})["Item"]["hits"] == 1601
+    assert learner.stats["observed"] == 1601 and learner.stats["errors"] == 0
+    assert learner.stats["updates"] == learner.stats["flushes"] + 1
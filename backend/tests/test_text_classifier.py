@@ -0,0 +1,61 @@
+import text_classifier
+
+SAMPLES = [
+    ("swiggy order", "Food"), ("zomato biryani", "Food"), ("swiggy instamart", "Food"),
+    ("chai and samosa", "Food"), ("zomato gold", "Food"),
+    ("ola ride", "Travel"), ("rapido bike", "Travel"), ("ola outstation", "Travel"),
+    ("irctc ticket", "Travel"), ("rapido auto", "Travel"),
+]
+
+
+def test_predict_and_artifact_round_trip(tmp_path):
+    model = text_classifier.fit(SAMPLES)
+    cat, conf = model.predict("swiggy dinner")
+    assert cat == "Food" and 0.5 < conf <= 1
+    assert model.predict("rapido to office")[0] == "Travel"
+    # Misspellings share character 3-grams with the trained word
+    assert model.predict("swigy")[0] == "Food"
+    assert model.predict("qqq") is None
+
+    path = tmp_path / "category_model.bin"
+    model.save(path)
+    loaded = text_classifier.load(str(path))
+    assert loaded.classes == model.classes
+    assert loaded.predict("swiggy dinner")[0] == "Food"
+    assert abs(loaded.predict("swiggy dinner")[1] - conf) < 1e-4
+    assert text_classifier.load(str(tmp_path / "missing.bin")) is None
+
+
+def test_report_counts_ai_calls_avoided_per_threshold():
+    model = text_classifier.fit(SAMPLES)
+    text_classifier.calibrate(model, [("swiggy lunch", "Food"), ("ola airport", "Travel")])
+    out = text_classifier.report(model, [("swiggy lunch", "Food"), ("ola airport", "Travel"), ("qqq", "Food")],
+                                 ai_bound=lambda t: t != "ola airport", thresholds=(0.0, 1.01))
+    assert out["samples"] == 3 and out["aiBound"] == 2
+    assert out["accuracy"] == round(2 / 3, 4)
+    assert [t["aiCallsAvoided"] for t in out["thresholds"]] == [0.5, 0.0]
+
+
+def _no_ai(*args, **kwargs):
+    raise AssertionError("Groq must not be called for a confident prediction")
+
+
+def test_add_uses_confident_model_before_groq(call, index, monkeypatch):
+    monkeypatch.setattr(index, "category_model", text_classifier.fit(SAMPLES))
+    monkeypatch.setattr(index, "_get_category_from_ai_cached", _no_ai)
+    monkeypatch.setattr(index, "CATEGORY_MODEL_MIN_CONFIDENCE", 0.5)
+    status, body, _ = call("POST /add", {"userId": "u1", "rawText": "biryani 250"})
+    assert status == 200
+    assert body["category"] == "Food" and body["ModelConfidence"] >= 0.5
+
+
+def test_add_below_threshold_falls_back_with_the_guess(call, index, monkeypatch):
+    calls = []
+    monkeypatch.setattr(index, "category_model", text_classifier.fit(SAMPLES))
+    monkeypatch.setattr(index, "CATEGORY_MODEL_MIN_CONFIDENCE", 1.01)
+    monkeypatch.setattr(index, "_get_category_from_ai_cached",
+                        lambda text, **kw: calls.append(text) or {"category": "", "confidence": 0.0})
+    status, body, _ = call("POST /add", {"userId": "u1", "rawText": "biryani 250"})
+    assert status == 200 and calls == ["biryani 250"]
+    # Groq had no answer, so the unsure model pick is the suggestion
+    assert body["category"] == "Food" and "ModelConfidence" not in body
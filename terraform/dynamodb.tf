@@ -24,6 +24,18 @@ variable "invest_table_name" {
   default     = "InvestApp"
 }
 
+variable "rollups_table_name" {
+  description = "DynamoDB table name for per-user monthly/category expense rollups"
+  type        = string
+  default     = "ExpenseRollups"
+}
+
+variable "ai_cache_table_name" {
+  description = "DynamoDB table name for the shared AI categorization cache"
+  type        = string
+  default     = "CategorizationCache"
+}
+
 resource "aws_dynamodb_table" "expenses" {
   name         = var.expenses_table_name
   billing_mode = "PAY_PER_REQUEST"
@@ -78,6 +90,41 @@ resource "aws_dynamodb_table" "user_budgets" {
   }
 }
 
+# Rollups: bucket = MONTH#YYYY-MM or CATEGORY#<name>, maintained by the expense write paths
+resource "aws_dynamodb_table" "expense_rollups" {
+  name         = var.rollups_table_name
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "userId"
+  range_key    = "bucket"
+
+  attribute {
+    name = "userId"
+    type = "S"
+  }
+
+  attribute {
+    name = "bucket"
+    type = "S"
+  }
+}
+
+# Shared tier of the Groq categorization cache; entries expire via DynamoDB TTL
+resource "aws_dynamodb_table" "ai_cache" {
+  name         = var.ai_cache_table_name
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "termHash"
+
+  attribute {
+    name = "termHash"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expiresAt"
+    enabled        = true
+  }
+}
+
 resource "aws_dynamodb_table" "invest" {
   name         = var.invest_table_name
   billing_mode = "PAY_PER_REQUEST"
@@ -127,6 +174,14 @@ output "user_budgets_table_name" {
   value = aws_dynamodb_table.user_budgets.name
 }
 
+output "rollups_table_name" {
+  value = aws_dynamodb_table.expense_rollups.name
+}
+
+output "ai_cache_table_name" {
+  value = aws_dynamodb_table.ai_cache.name
+}
+
 output "invest_table_name" {
   value = aws_dynamodb_table.invest.name
 }
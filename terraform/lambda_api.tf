@@ -23,6 +23,12 @@ variable "cognito_audience" {
   default     = []
 }
 
+variable "lambda_layers" {
+  type        = list(string)
+  description = "Lambda layer ARNs (e.g. a NumPy layer for the rebalance route)"
+  default     = []
+}
+
 data "archive_file" "lambda_zip" {
   type        = "zip"
   source_dir  = "${path.root}/../backend/lambda/expenses-api-py"
@@ -54,12 +60,16 @@ resource "aws_iam_role_policy" "lambda_ddb_access" {
     Statement: [{
       Effect: "Allow",
       Action: [
-        "dynamodb:PutItem","dynamodb:GetItem","dynamodb:UpdateItem","dynamodb:DeleteItem","dynamodb:Scan","dynamodb:Query"
+        "dynamodb:PutItem","dynamodb:GetItem","dynamodb:UpdateItem","dynamodb:DeleteItem","dynamodb:Scan","dynamodb:Query",
+        "dynamodb:BatchGetItem","dynamodb:BatchWriteItem"
       ],
       Resource: [
         aws_dynamodb_table.expenses.arn,
+        "${aws_dynamodb_table.expenses.arn}/index/*",
         aws_dynamodb_table.category_rules.arn,
         aws_dynamodb_table.user_budgets.arn,
+        aws_dynamodb_table.expense_rollups.arn,
+        aws_dynamodb_table.ai_cache.arn,
         aws_dynamodb_table.invest.arn,
         "${aws_dynamodb_table.invest.arn}/index/*"
       ]
@@ -67,27 +77,131 @@ resource "aws_iam_role_policy" "lambda_ddb_access" {
   })
 }
 
+variable "export_bucket" {
+  type        = string
+  description = "S3 bucket index.export_handler may write exports to (empty: no S3 access)"
+  default     = ""
+}
+
+resource "aws_iam_role_policy" "lambda_export_bucket" {
+  count = length(var.export_bucket) > 0 ? 1 : 0
+  name  = "${var.lambda_name}-export-bucket"
+  role  = aws_iam_role.lambda_exec.id
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement: [{
+      Effect: "Allow",
+      Action: ["s3:PutObject","s3:GetObject","s3:AbortMultipartUpload"],
+      Resource: ["arn:aws:s3:::${var.export_bucket}/*"]
+    }]
+  })
+}
+
 resource "aws_lambda_function" "expenses" {
   function_name = var.lambda_name
   role          = aws_iam_role.lambda_exec.arn
   handler       = "index.handler"
   runtime       = "python3.12"
+  layers        = var.lambda_layers
   filename      = data.archive_file.lambda_zip.output_path
   source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+  # POST /add answers within CATEGORIZE_BUDGET_MS; the rest is headroom for DynamoDB and
+  # the heavier reads (analytics, performance)
+  timeout       = 10
 
   environment {
     variables = {
       REGION                   = var.aws_region
       EXPENSES_TABLE           = aws_dynamodb_table.expenses.name
       GROQ_API_KEY             = var.groq_api_key
+      CATEGORIZE_BUDGET_MS     = "1500"
       CATEGORY_RULES_TABLE     = aws_dynamodb_table.category_rules.name
       USER_BUDGETS_TABLE       = aws_dynamodb_table.user_budgets.name
       GROQ_MODEL               = "llama-3.1-8b-instant"
       INVEST_TABLE             = aws_dynamodb_table.invest.name
+      ROLLUPS_TABLE            = aws_dynamodb_table.expense_rollups.name
+      AI_CACHE_TABLE           = aws_dynamodb_table.ai_cache.name
+    }
+  }
+}
+
+# On-demand export job (index.export_handler): invoke with { kind, dest, user, ... }; a run
+# stops a minute before this timeout and the same event resumes it
+resource "aws_lambda_function" "export" {
+  function_name    = "${var.lambda_name}-export"
+  role             = aws_iam_role.lambda_exec.arn
+  handler          = "index.export_handler"
+  runtime          = "python3.12"
+  layers           = var.lambda_layers
+  timeout          = 900
+  memory_size      = 512
+  filename         = data.archive_file.lambda_zip.output_path
+  source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+
+  environment {
+    variables = {
+      REGION          = var.aws_region
+      EXPENSES_TABLE  = aws_dynamodb_table.expenses.name
+      INVEST_TABLE    = aws_dynamodb_table.invest.name
+      METRICS_ENABLED = "0"
     }
   }
 }
 
+variable "price_provider" {
+  type        = string
+  description = "PRICE_PROVIDER for the price refresh job (module:factory, or file:/path for a bundled price file)"
+  default     = ""
+}
+
+variable "price_refresh_schedule" {
+  type        = string
+  description = "EventBridge schedule for the price refresh job (empty disables it)"
+  default     = "cron(30 12 ? * MON-FRI *)"
+}
+
+resource "aws_lambda_function" "price_refresh" {
+  function_name    = "${var.lambda_name}-price-refresh"
+  role             = aws_iam_role.lambda_exec.arn
+  handler          = "index.price_refresh_handler"
+  runtime          = "python3.12"
+  layers           = var.lambda_layers
+  timeout          = 900
+  memory_size      = 512
+  filename         = data.archive_file.lambda_zip.output_path
+  source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+
+  environment {
+    variables = {
+      REGION          = var.aws_region
+      INVEST_TABLE    = aws_dynamodb_table.invest.name
+      PRICE_PROVIDER  = var.price_provider
+      METRICS_ENABLED = "0"
+    }
+  }
+}
+
+resource "aws_cloudwatch_event_rule" "price_refresh" {
+  count               = length(var.price_refresh_schedule) > 0 ? 1 : 0
+  name                = "${var.lambda_name}-price-refresh"
+  schedule_expression = var.price_refresh_schedule
+}
+
+resource "aws_cloudwatch_event_target" "price_refresh" {
+  count = length(var.price_refresh_schedule) > 0 ? 1 : 0
+  rule  = aws_cloudwatch_event_rule.price_refresh[0].name
+  arn   = aws_lambda_function.price_refresh.arn
+}
+
+resource "aws_lambda_permission" "price_refresh_schedule" {
+  count         = length(var.price_refresh_schedule) > 0 ? 1 : 0
+  statement_id  = "AllowEventBridgeInvoke"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.price_refresh.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.price_refresh[0].arn
+}
+
 resource "aws_apigatewayv2_api" "http" {
   name          = "expenses-http-api"
   protocol_type = "HTTP"
@@ -120,12 +234,14 @@ resource "aws_apigatewayv2_integration" "lambda" {
 resource "aws_apigatewayv2_route" "routes_public" {
   for_each = toset([
     "POST /add",
+    "POST /add/batch",
     "PUT /add",
     "POST /list",
     "POST /edit",
     "POST /delete",
     "POST /summary/monthly",
     "POST /summary/category",
+    "POST /analytics",
     "GET /budgets",
     "PUT /budgets"
   ])
@@ -140,6 +256,9 @@ resource "aws_apigatewayv2_route" "routes_protected" {
     "GET /portfolio",
     "PUT /portfolio/plan",
     "GET /portfolio/plan",
+    "GET /portfolio/{id}/dashboard",
+    "GET /portfolio/{id}/performance",
+    "POST /portfolio/rebalance/propose",
     "POST /holdings",
     "GET /holdings",
     "POST /transactions",